@@ -0,0 +1,82 @@
+"""
+Data access for the dashboard figures, with interchangeable storage backends.
+
+- "sqlite" (default) reads rqmData.db through the query cache;
+- "parquet" reads raw rows from the columnar export (see app.columnar),
+  memory mapped and column by column, and needs pyarrow. Weekly and monthly
+  rollups are small and are still read from SQLite.
+
+Both return NumPy-ready columns rather than rows: radar_series() gives the
+dates and one array per statistic of a radar, stat_columns() the radar,
+value and date columns of one statistic, ready for pivot.pivot_columns().
+Control limits and anomalies (see app.control) are always read from SQLite.
+"""
+
+from app import control
+from app.pivot import stat_table
+from app.rollups import RAW, ROLLUP_STATS, radar_series, stat_rows
+
+DEFAULT_BACKEND = "sqlite"
+
+
+class SQLiteBackend:
+    """Reads the SQLite database through a QueryCache."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def radar_series(self, source, radar, date_range, resolution=RAW):
+        """(dates, [(statistic, values)]) of every statistic of a radar in a table."""
+        return radar_series(self.cache, source, radar, date_range, resolution)
+
+    def stat_columns(self, stat, date_range, resolution=RAW):
+        """(radars, values, dates) columns of one statistic."""
+        rows = stat_rows(self.cache, stat, date_range, resolution)
+        return ([row[0] for row in rows], [row[1] for row in rows],
+                [row[2] for row in rows])
+
+    def control_limits(self, source, radar, date_range):
+        """[(stat, antenna type, dates, lower, upper)] of a radar in a table."""
+        return control.limit_series(self.cache, source, radar, date_range)
+
+    def anomalies(self, source, radar, date_range, limit=100):
+        """(date, antenna type, stat, value, lower, upper) rows, newest first."""
+        return control.anomalies(self.cache, source, radar, date_range, limit)
+
+
+class ParquetBackend(SQLiteBackend):
+    """Reads raw rows from the Parquet export, rollups from SQLite."""
+
+    def __init__(self, cache, root):
+        # pyarrow is only needed by this backend
+        from app.columnar import ParquetStore
+
+        super().__init__(cache)
+        self.store = ParquetStore(root)
+
+    def radar_series(self, source, radar, date_range, resolution=RAW):
+        if resolution != RAW:
+            return super().radar_series(source, radar, date_range, resolution)
+
+        stats = list(ROLLUP_STATS[source])
+        dates, *values = self.store.read_arrays(
+            source, ["Job_Date"] + stats, date_range, radar=radar)
+        return dates, list(zip(stats, values))
+
+    def stat_columns(self, stat, date_range, resolution=RAW):
+        if resolution != RAW:
+            return super().stat_columns(stat, date_range, resolution)
+
+        return tuple(self.store.read_arrays(
+            stat_table(stat), ["radar", stat, "Job_Date"], date_range))
+
+
+def create_backend(name, cache, parquet_dir=None):
+    """The backend called `name` ("sqlite" or "parquet")."""
+    if name == "sqlite":
+        return SQLiteBackend(cache)
+    if name == "parquet":
+        if not parquet_dir:
+            raise ValueError("The parquet backend needs the export directory")
+        return ParquetBackend(cache, parquet_dir)
+    raise ValueError(f"Unknown backend: {name}")
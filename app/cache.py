@@ -0,0 +1,277 @@
+"""
+Bounded LRU cache for the dashboard's query results and figures.
+
+Entries are tied to the data version of the SQLite database (the write
+counter bumped by every writer, see storage.bump_data_version), so the whole
+cache is invalidated as soon as new data is ingested.
+
+When the dashboard runs as several worker processes, a SharedStore (a small
+SQLite file next to the data) sits behind each process's LRU, so a figure
+computed by one worker is reused by the others.
+"""
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from app.metrics import CACHE_LOOKUPS, SQL_SECONDS, query_label
+from app.storage import connect_read_only, read_data_version
+
+DEFAULT_MAXSIZE = 256
+DEFAULT_SHARED_MAXSIZE = 2048
+# Seconds a worker waits for another one writing the shared store
+SHARED_TIMEOUT = 5.0
+# The shared store drops stale and excess entries every this many writes
+SHARED_PRUNE_EVERY = 64
+
+
+class ThreadConnections:
+    """One SQLite connection per thread and process.
+
+    Connections are never shared between threads, nor reused after a fork
+    (e.g. by a preforking server that imported the app first).
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._local = threading.local()
+
+    def get(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+
+class DataVersion:
+    """Reads the data version of a database, cheaply when nothing changed.
+
+    PRAGMA data_version on a long-lived connection only changes when another
+    connection commits, so the write counter itself is only re-read then.
+    """
+
+    def __init__(self, path, immutable=False):
+        self.path = path
+        self.immutable = immutable
+        self._connection = None
+        self._pid = None
+        self._pragma = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._connection is None or self._pid != os.getpid():
+                try:
+                    self._connection = connect_read_only(
+                        self.path, self.immutable, check_same_thread=False)
+                except sqlite3.OperationalError:
+                    # Not created yet
+                    return 0
+                self._pid = os.getpid()
+                self._pragma = None
+            pragma = self._connection.execute(
+                "PRAGMA data_version").fetchone()[0]
+            if pragma != self._pragma:
+                self._pragma = pragma
+                self._version = read_data_version(self._connection)
+            return self._version
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._pragma = None
+
+
+class SharedStore:
+    """Cache entries shared by every process, in a SQLite file.
+
+    Values are pickled, so the file must only be writable by the dashboard.
+    """
+
+    def __init__(self, path, maxsize=DEFAULT_SHARED_MAXSIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self._connections = ThreadConnections(self._connect)
+        self._writes = 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=SHARED_TIMEOUT)
+        connection.execute("PRAGMA journal_mode = WAL")
+        # Losing the store on a crash only costs recomputing it
+        connection.execute("PRAGMA synchronous = OFF")
+        with connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    value BLOB NOT NULL,
+                    stored_at REAL NOT NULL
+                )""")
+        return connection
+
+    def get(self, key, version):
+        """Returns (True, value) if key is stored for this data version."""
+        try:
+            row = self._connections.get().execute(
+                "SELECT value FROM entries WHERE key = ? AND version = ?",
+                (key, version)).fetchone()
+        except sqlite3.OperationalError:
+            # Busy beyond the timeout: a miss is cheaper than waiting
+            return False, None
+        if row is None:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def put(self, key, version, value):
+        connection = self._connections.get()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, version, value, stored_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, version, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                     time.time()))
+                self._writes += 1
+                if self._writes % SHARED_PRUNE_EVERY == 0:
+                    self._prune(connection, version)
+        except sqlite3.OperationalError:
+            pass
+
+    def _prune(self, connection, version):
+        connection.execute("DELETE FROM entries WHERE version != ?", (version,))
+        connection.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries "
+            "ORDER BY stored_at DESC LIMIT -1 OFFSET ?)", (self.maxsize,))
+
+
+class QueryCache:
+    """LRU cache of query results and computed values, keyed by the data version.
+
+    Queries run on read-only connections, one per thread. With shared_path,
+    misses are looked up in (and results written to) a SharedStore.
+    """
+
+    def __init__(self, path, maxsize=DEFAULT_MAXSIZE, shared_path=None,
+                 immutable=False):
+        self.path = path
+        self.maxsize = maxsize
+        self.data_version = DataVersion(path, immutable)
+        self.shared = SharedStore(shared_path) if shared_path else None
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._connections = ThreadConnections(
+            lambda: connect_read_only(path, immutable))
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _current_version(self):
+        version = self.data_version.get()
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+        return version
+
+    def _store(self, version, key, value):
+        with self._lock:
+            # Drop results computed from data that changed in the meantime
+            if version == self._version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value for `key`, calling `compute()` on a miss."""
+        version = self._current_version()
+        with self._lock:
+            hit = key in self._entries
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = self._entries[key]
+        if hit:
+            CACHE_LOOKUPS.labels("hit").inc()
+            return value
+
+        shared_key = None
+        if self.shared is not None:
+            shared_key = hashlib.sha1(repr(key).encode()).hexdigest()
+            found, value = self.shared.get(shared_key, version)
+            if found:
+                with self._lock:
+                    self.shared_hits += 1
+                CACHE_LOOKUPS.labels("shared_hit").inc()
+                self._store(version, key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        CACHE_LOOKUPS.labels("miss").inc()
+        value = compute()
+        self._store(version, key, value)
+        if shared_key is not None:
+            self.shared.put(shared_key, version, value)
+        return value
+
+    def query(self, sql, params=()):
+        """Runs a read query, returning (column names, rows) as tuples."""
+        def run():
+            label = query_label(sql)
+            started = time.perf_counter()
+            cursor = self._connections.get().execute(sql, params)
+            try:
+                fetch_started = time.perf_counter()
+                SQL_SECONDS.labels(label, "execute").observe(
+                    fetch_started - started)
+                columns = tuple(desc[0] for desc in cursor.description)
+                rows = tuple(cursor.fetchall())
+                SQL_SECONDS.labels(label, "fetch").observe(
+                    time.perf_counter() - fetch_started)
+                return columns, rows
+            finally:
+                cursor.close()
+
+        return self.get_or_compute(("query", sql, tuple(params)), run)
+
+    def memoize(self, func):
+        """Caches the results of a function by its (hashable) arguments."""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args,
+                   tuple(sorted(kwargs.items())))
+            return self.get_or_compute(key, lambda: func(*args, **kwargs))
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'data_version': self._version,
+                'shared': self.shared is not None,
+            }
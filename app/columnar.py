@@ -0,0 +1,190 @@
+"""
+Columnar copy of the data tables, as Parquet files partitioned by radar and year.
+
+    <root>/biases/radar=EBBE/year=2023/data.parquet
+    <root>/detection_rates/radar=EBBE/year=2023/data.parquet
+
+The export rewrites whole (radar, year) partitions from SQLite, so after an
+ingest only the years of the new jobs need exporting. Reads are memory
+mapped, only touch the partitions and columns asked for, and hand Arrow
+buffers to NumPy without copying where the types allow it.
+
+Requires pyarrow.
+"""
+
+import os
+import shutil
+from datetime import date
+from urllib.parse import quote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from app.storage import RADAR_COLUMNS, bump_data_version
+
+# Column types of the files; the radar and the year are in the path
+PARQUET_SCHEMAS = {
+    "biases": pa.schema(
+        [("Antenna_Type", pa.string())]
+        + [(column, pa.float64()) for column in (
+            "Time_Bias", "Range_Bias", "Range_Gain", "Azimuth_Bias",
+            "Range_Noise", "Azimuth_Noise", "Ecc_Value", "Ecc_Angle")]
+        + [("Job_Date", pa.date32())]),
+    "detection_rates": pa.schema(
+        [("ds_type", pa.int64())]
+        + [(column, pa.float64()) for column in (
+            "pdP", "pdS", "pdM", "pdPS", "pdPM")]
+        + [("Job_Date", pa.date32())]),
+}
+
+PARTITION_SCHEMA = pa.schema([("radar", pa.string()), ("year", pa.int32())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+# What a read sees: the file columns and the partition fields
+DATASET_SCHEMAS = {
+    table: pa.unify_schemas([schema, PARTITION_SCHEMA])
+    for table, schema in PARQUET_SCHEMAS.items()
+}
+
+DATA_FILE = "data.parquet"
+
+
+def partition_dir(root, table, radar, year):
+    return os.path.join(root, table, f"radar={quote(radar, safe='')}",
+                        f"year={year}")
+
+
+def _rows_to_table(table, rows):
+    schema = PARQUET_SCHEMAS[table]
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.type == pa.date32():
+            arrays.append(pa.array(values, pa.string()).cast(pa.date32()))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _write_partition(directory, table):
+    os.makedirs(directory, exist_ok=True)
+    temporary = os.path.join(directory, DATA_FILE + ".tmp")
+    pq.write_table(table, temporary)
+    os.replace(temporary, os.path.join(directory, DATA_FILE))
+
+
+def export_parquet(connection, root, years=None):
+    """Rewrites the Parquet partitions of the given years (all by default).
+
+    Bumps the data version afterwards, so figures cached from the previous
+    files are dropped. Returns the number of partitions written.
+    """
+    if years is not None:
+        years = sorted({str(year) for year in years})
+        if not years:
+            return 0
+
+    written = 0
+    for table, schema in PARQUET_SCHEMAS.items():
+        radar = RADAR_COLUMNS[table]
+        year_filter, params = "", ()
+        if years is not None:
+            year_filter = (f"WHERE substr(Job_Date, 1, 4) IN "
+                           f"({', '.join('?' * len(years))})")
+            params = tuple(years)
+        partitions = connection.execute(
+            f"SELECT DISTINCT {radar}, substr(Job_Date, 1, 4) FROM {table} "
+            f"{year_filter}", params).fetchall()
+
+        exported = set()
+        for radar_name, year in partitions:
+            if radar_name is None or year is None:
+                continue
+            rows = connection.execute(
+                f"SELECT {', '.join(schema.names)} FROM {table} "
+                f"WHERE {radar} = ? AND Job_Date BETWEEN ? AND ? "
+                f"ORDER BY Job_Date",
+                (radar_name, f"{year}-01-01", f"{year}-12-31")).fetchall()
+            directory = partition_dir(root, table, radar_name, int(year))
+            _write_partition(directory, _rows_to_table(table, rows))
+            exported.add(directory)
+            written += 1
+
+        _remove_stale_partitions(root, table, years, exported)
+
+    with connection:
+        bump_data_version(connection)
+    return written
+
+
+def _remove_stale_partitions(root, table, years, exported):
+    # Partitions of exported years whose rows are gone from SQLite
+    table_dir = os.path.join(root, table)
+    if not os.path.isdir(table_dir):
+        return
+    for radar_entry in os.scandir(table_dir):
+        for year_entry in os.scandir(radar_entry.path):
+            year = year_entry.name.partition("=")[2]
+            if years is not None and year not in years:
+                continue
+            if year_entry.path not in exported:
+                shutil.rmtree(year_entry.path)
+
+
+class ParquetStore:
+    """Memory-mapped reads of the exported Parquet files."""
+
+    def __init__(self, root):
+        self.root = root
+        self._filesystem = fs.LocalFileSystem(use_mmap=True)
+
+    def _dataset(self, table):
+        return ds.dataset(os.path.join(self.root, table), format="parquet",
+                          partitioning=PARTITIONING, filesystem=self._filesystem,
+                          schema=DATASET_SCHEMAS[table])
+
+    def read(self, table, columns, date_range, radar=None):
+        """Arrow table of some columns of a table between two dates.
+
+        Only the partitions of the radar (if given) and of the years in the
+        range are opened.
+        """
+        start, end = date_range
+        condition = ((ds.field("year") >= int(start[:4]))
+                     & (ds.field("year") <= int(end[:4]))
+                     & (ds.field("Job_Date") >= _date_scalar(start))
+                     & (ds.field("Job_Date") <= _date_scalar(end)))
+        if radar is not None:
+            condition &= ds.field("radar") == radar
+        if not os.path.isdir(os.path.join(self.root, table)):
+            return DATASET_SCHEMAS[table].empty_table().select(list(columns))
+        return self._dataset(table).to_table(columns=list(columns),
+                                             filter=condition)
+
+    def read_arrays(self, table, columns, date_range, radar=None):
+        """read() as a list of NumPy arrays, one per column, in date order."""
+        result = self.read(table, columns, date_range, radar)
+        if "Job_Date" in columns:
+            result = result.sort_by("Job_Date")
+        return [to_numpy(result.column(column)) for column in columns]
+
+
+def _date_scalar(day):
+    # MIN_DATE ("0000-01-01") is not a valid date, so years are clamped
+    year = min(max(int(day[:4]), 1), 9999)
+    return pa.scalar(date.fromisoformat(f"{year:04d}{day[4:10]}"), pa.date32())
+
+
+def to_numpy(column):
+    """NumPy view of an Arrow column, copied only when it has nulls or chunks."""
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+    if pa.types.is_floating(column.type) or pa.types.is_integer(column.type):
+        if column.null_count:
+            # Nulls become NaN, which needs a float copy
+            return column.to_numpy(zero_copy_only=False).astype(np.float64)
+        return column.to_numpy(zero_copy_only=True)
+    return column.to_numpy(zero_copy_only=False)
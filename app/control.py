@@ -0,0 +1,295 @@
+"""
+EWMA control limits of every statistic, kept up to date by the ingester.
+
+Each series (one statistic of one radar and antenna type, in date order) has
+an exponentially weighted moving mean and standard deviation. Every point is
+checked against the limits of the points before it,
+
+    mean ± CONTROL_SIGMAS * std
+
+and flagged as out of control when it falls outside them, once the series has
+WARM_UP points. The running state of every series after its last point
+(control_state), the flagged points (control_anomalies) and the limits of
+every point (control_bands, one row per radar, antenna type and date holding
+the limits of all its statistics) are stored, so the dashboard only reads the
+anomalies and bands of the dates it shows.
+
+refresh_control() picks each series up from its state, so an ingested job
+only costs its own rows. A radar whose state is already past the refreshed
+date (a job ingested out of order, or again) is recomputed from its first
+row. Backfills run the same recurrences over whole series with NumPy, a block
+of points at a time.
+"""
+
+import functools
+import itertools
+
+import numpy as np
+
+from app.storage import ANTENNA_COLUMNS, RADAR_COLUMNS, ROLLUP_STATS
+
+# Weight of the newest point in the moving mean and variance (a span of
+# about 2 / ALPHA - 1 = 9 jobs)
+ALPHA = 0.2
+CONTROL_SIGMAS = 3.0
+# Points of a series before its limits are trusted
+WARM_UP = 10
+
+# Points filtered at once; decay ** BLOCK must stay well above float underflow
+BLOCK = 256
+
+# Before any job
+FIRST_DATE = "0000-01-01"
+
+STATE_QUERY = """
+    SELECT antenna_type, stat, Job_Date, n, mean, std FROM control_state
+    WHERE source = ? AND radar = ?
+"""
+
+UPSERT_STATE = """
+    INSERT OR REPLACE INTO control_state (source, radar, antenna_type, stat,
+        Job_Date, n, mean, std)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_ANOMALY = """
+    INSERT OR REPLACE INTO control_anomalies (source, radar, antenna_type,
+        stat, Job_Date, value, lower, upper)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_BANDS = """
+    INSERT OR REPLACE INTO control_bands (source, radar, Job_Date,
+        antenna_type, limits)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+BANDS_QUERY = """
+    SELECT antenna_type, Job_Date, limits FROM control_bands
+    WHERE source = ? AND radar = ? AND Job_Date BETWEEN ? AND ?
+    ORDER BY antenna_type, Job_Date
+"""
+
+# Limits are only drawn, so single precision halves the stored bands
+BAND_DTYPE = np.float32
+
+ANOMALIES_QUERY = """
+    SELECT Job_Date, antenna_type, stat, value, lower, upper
+    FROM control_anomalies
+    WHERE source = ? AND radar = ? AND Job_Date BETWEEN ? AND ?
+    ORDER BY Job_Date DESC, antenna_type, stat LIMIT ?
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _filter_weights(alpha, size):
+    """Lower triangular weights alpha * (1 - alpha) ** (i - k) for k <= i."""
+    index = np.arange(size)
+    lags = np.subtract.outer(index, index)
+    return np.where(lags >= 0, alpha * (1 - alpha) ** np.maximum(lags, 0), 0.0)
+
+
+def ewma(values, alpha=ALPHA, initial=0.0):
+    """y[i] = (1 - alpha) * y[i - 1] + alpha * values[i], with y[-1] = initial.
+
+    The recurrence is unrolled into a matrix product per block of points.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.empty_like(values)
+    weights = _filter_weights(alpha, min(BLOCK, len(values)))
+    carry = (1 - alpha) ** np.arange(1, len(weights) + 1)
+    previous = initial
+    for start in range(0, len(values), BLOCK):
+        block = values[start:start + BLOCK]
+        size = len(block)
+        result[start:start + size] = (weights[:size, :size] @ block
+                                      + carry[:size] * previous)
+        previous = result[start + size - 1]
+    return result
+
+
+def control_limits(values, state=None, alpha=ALPHA, sigmas=CONTROL_SIGMAS,
+                   warm_up=WARM_UP):
+    """Limits of a series continuing from `state`, the (n, mean, std) after
+    its previous point (None for a new series).
+
+    Returns the arrays n, mean, std (after each point), lower, upper (before
+    each point; NaN during the warm-up) and flagged.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if state is None:
+        # The first point is its own mean
+        state = (0, values[0] if len(values) else 0.0, 0.0)
+    count, mean, std = state
+
+    means = ewma(values, alpha, mean)
+    before = np.concatenate(([mean], means[:-1]))
+    # Exponentially weighted variance around the moving mean
+    deviations = values - before
+    variances = ewma((1 - alpha) * deviations ** 2, alpha, std ** 2)
+    spread = sigmas * np.sqrt(np.concatenate(([std ** 2], variances[:-1])))
+
+    n = count + np.arange(1, len(values) + 1)
+    trusted = n - 1 >= warm_up
+    lower = np.where(trusted, before - spread, np.nan)
+    upper = np.where(trusted, before + spread, np.nan)
+    flagged = trusted & ((values < lower) | (values > upper))
+    return n, means, np.sqrt(variances), lower, upper, flagged
+
+
+def _antenna(source):
+    return f"COALESCE(CAST({ANTENNA_COLUMNS[source]} AS TEXT), '')"
+
+
+def _source_rows(connection, source, first_date):
+    """(radar, antenna type, date, *statistics) rows from first_date on."""
+    radar = RADAR_COLUMNS[source]
+    # Ordered like the unique key, so the scan needs no sort
+    return connection.execute(
+        f"SELECT {radar}, {_antenna(source)}, Job_Date, "
+        f"{', '.join(ROLLUP_STATS[source].values())} FROM {source} "
+        f"WHERE Job_Date >= ? AND {radar} IS NOT NULL "
+        f"ORDER BY {radar}, Job_Date, COALESCE({ANTENNA_COLUMNS[source]}, '')",
+        (first_date,))
+
+
+def radar_query(source):
+    """(radar, antenna type, date, *statistics) rows of a radar up to a date."""
+    radar = RADAR_COLUMNS[source]
+    return (f"SELECT {radar}, {_antenna(source)}, Job_Date, "
+            f"{', '.join(ROLLUP_STATS[source].values())} FROM {source} "
+            f"WHERE {radar} = ? AND Job_Date <= ? "
+            f"ORDER BY Job_Date, COALESCE({ANTENNA_COLUMNS[source]}, '')")
+
+
+def series_limits(rows, stats, states=None):
+    """Yields (antenna type, stat, dates, values, limits) for every series in
+    the rows of one radar, limits being the arrays of control_limits().
+
+    `states` maps (antenna type, stat) to the (n, mean, std) the series
+    continues from.
+    """
+    states = states or {}
+    # Sorting keeps the date order within each antenna type
+    rows = sorted(rows, key=lambda row: row[1])
+    for antenna_type, series in itertools.groupby(rows, key=lambda row: row[1]):
+        series = list(series)
+        dates = np.array([row[2] for row in series])
+        values = np.array([row[3:] for row in series], dtype=np.float64)
+        for index, stat in enumerate(stats):
+            present = ~np.isnan(values[:, index])
+            if not present.any():
+                continue
+            yield (antenna_type, stat, dates[present], values[present, index],
+                   control_limits(values[present, index],
+                                  states.get((antenna_type, stat))))
+
+
+def _bands(source, radar, series):
+    """control_bands rows of the (antenna type, stat, dates, lower, upper)
+    series of a radar, leaving out the dates without any limit."""
+    stats = list(ROLLUP_STATS[source])
+    series = sorted(series, key=lambda limits: limits[0])
+    for antenna_type, limits in itertools.groupby(series,
+                                                  key=lambda limits: limits[0]):
+        limits = list(limits)
+        dates = np.unique(np.concatenate([dates for _, _, dates, _, _ in limits]))
+        bands = np.full((len(dates), 2, len(stats)), np.nan, dtype=BAND_DTYPE)
+        for _, stat, stat_dates, lower, upper in limits:
+            at = np.searchsorted(dates, stat_dates)
+            bands[at, 0, stats.index(stat)] = lower
+            bands[at, 1, stats.index(stat)] = upper
+        for index in np.flatnonzero(~np.isnan(bands).all(axis=(1, 2))):
+            yield (source, radar, str(dates[index]), antenna_type,
+                   bands[index].tobytes())
+
+
+def _refresh_radar(connection, source, radar, rows, states, first_date):
+    """Continues every series of a radar and stores its states, anomalies
+    and bands with one statement each."""
+    for table in ("control_anomalies", "control_bands"):
+        connection.execute(
+            f"DELETE FROM {table} WHERE source = ? AND radar = ? "
+            f"AND Job_Date >= ?", (source, radar, first_date))
+    updated, flagged_points, bands = [], [], []
+    for antenna_type, stat, dates, values, limits in series_limits(
+            rows, list(ROLLUP_STATS[source]), states):
+        n, means, stds, lower, upper, flagged = limits
+        updated.append((source, radar, antenna_type, stat, str(dates[-1]),
+                        int(n[-1]), float(means[-1]), float(stds[-1])))
+        flagged_points.extend(
+            (source, radar, antenna_type, stat, str(dates[index]),
+             float(values[index]), float(lower[index]), float(upper[index]))
+            for index in np.flatnonzero(flagged))
+        bands.append((antenna_type, stat, dates, lower, upper))
+    connection.executemany(UPSERT_STATE, updated)
+    connection.executemany(INSERT_ANOMALY, flagged_points)
+    connection.executemany(INSERT_BANDS, _bands(source, radar, bands))
+
+
+def refresh_control(connection, first_date=FIRST_DATE):
+    """Extends the control state of every series with its rows from
+    first_date on, and flags their out of control points.
+
+    Each series continues from its stored state, so refreshing the day of a
+    new job reads that day only; radars already refreshed past first_date
+    are recomputed from their first row. Call inside the transaction that
+    changed the data.
+    """
+    if first_date is None:
+        return
+    for source in ROLLUP_STATS:
+        rows = _source_rows(connection, source, first_date)
+        # One radar's rows in memory at a time
+        for radar, radar_rows in itertools.groupby(rows, key=lambda row: row[0]):
+            states = {}
+            start = first_date
+            for antenna_type, stat, job_date, *state in connection.execute(
+                    STATE_QUERY, (source, radar)):
+                states[antenna_type, stat] = state
+                if job_date >= first_date:
+                    start = FIRST_DATE
+            if start == FIRST_DATE:
+                connection.execute(
+                    "DELETE FROM control_state WHERE source = ? AND radar = ?",
+                    (source, radar))
+                # Only the rows up to first_date are left to read
+                radar_rows = connection.execute(
+                    radar_query(source), (radar, first_date)).fetchall() + [
+                        row for row in radar_rows if row[2] > first_date]
+                states = {}
+            _refresh_radar(connection, source, radar, radar_rows, states, start)
+
+
+def rebuild_control(connection):
+    """Recomputes every control state, anomaly and band; call inside a
+    transaction."""
+    for table in ("control_state", "control_anomalies", "control_bands"):
+        connection.execute(f"DELETE FROM {table}")
+    refresh_control(connection)
+
+
+def limit_series(cache, source, radar, date_range):
+    """[(stat, antenna type, dates, lower, upper)] of a radar, read from the
+    stored bands of the dates in a range."""
+    stats = list(ROLLUP_STATS[source])
+    _, rows = cache.query(BANDS_QUERY, (source, radar) + tuple(date_range))
+    series = []
+    for antenna_type, bands in itertools.groupby(rows, key=lambda row: row[0]):
+        bands = list(bands)
+        dates = np.array([row[1] for row in bands])
+        limits = np.frombuffer(b"".join(row[2] for row in bands),
+                               dtype=BAND_DTYPE).reshape(len(bands), 2, len(stats))
+        for index, stat in enumerate(stats):
+            shown = ~np.isnan(limits[:, 0, index])
+            if shown.any():
+                series.append((stat, antenna_type, dates[shown].tolist(),
+                               limits[shown, 0, index], limits[shown, 1, index]))
+    return sorted(series, key=lambda limits: limits[:2])
+
+
+def anomalies(cache, source, radar, date_range, limit=100):
+    """Latest out of control points of a radar: (date, antenna type, stat,
+    value, lower, upper) rows, newest first."""
+    return cache.query(ANOMALIES_QUERY,
+                       (source, radar) + tuple(date_range) + (limit,))[1]
@@ -0,0 +1,97 @@
+"""
+Downsampling of long time series before they are sent to the browser.
+
+Both methods return the indices of the points to keep, in their original
+order, and always keep the first and last point:
+
+- "minmax" keeps the lowest and highest point of every bucket, so spikes
+  always stay visible;
+- "lttb" (Largest-Triangle-Three-Buckets) keeps the point of every bucket
+  that best preserves the visual shape of the line.
+"""
+
+import numpy as np
+
+DEFAULT_METHOD = "minmax"
+
+
+def to_numeric_x(x):
+    """Converts yyyy-mm-dd dates to day numbers; other x values to positions."""
+    try:
+        return np.asarray(x, dtype="datetime64[D]").astype(np.float64)
+    except (TypeError, ValueError):
+        return np.arange(len(x), dtype=np.float64)
+
+
+def minmax_indices(y, max_points):
+    """Indices of the minimum and maximum of each of max_points / 2 buckets."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    n_buckets = max(max_points // 2, 1)
+    bucket = (np.arange(n) * n_buckets) // n
+    first = np.searchsorted(bucket, np.arange(n_buckets), side="left")
+    last = np.searchsorted(bucket, np.arange(n_buckets), side="right") - 1
+
+    # Within each bucket, sort by value; NaNs must never win
+    missing = np.isnan(y)
+    by_min = np.lexsort((np.where(missing, np.inf, y), bucket))
+    by_max = np.lexsort((np.where(missing, -np.inf, y), bucket))
+
+    keep = np.concatenate(([0, n - 1], by_min[first], by_max[last]))
+    return np.unique(keep)
+
+
+def lttb_indices(x, y, max_points):
+    """Indices picked by Largest-Triangle-Three-Buckets."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    # Points 1 .. n-2 are split into max_points - 2 buckets
+    n_buckets = max_points - 2
+    edges = np.linspace(1, n - 1, n_buckets + 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # The point after the last bucket is the last point itself
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_buckets):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_indices(x, y, max_points, method=DEFAULT_METHOD):
+    """Indices of at most about max_points points of the series to keep."""
+    n = len(y)
+    if not max_points or n <= max_points:
+        return np.arange(n)
+    if method == "minmax":
+        return minmax_indices(y, max_points)
+    if method == "lttb":
+        y = np.asarray(y, dtype=np.float64)
+        finite = np.flatnonzero(~np.isnan(y))
+        picked = lttb_indices(to_numeric_x(x)[finite], y[finite], max_points)
+        return finite[picked]
+    raise ValueError(f"Unknown downsampling method: {method}")
+
+
+def downsample(x, y, max_points, method=DEFAULT_METHOD):
+    """Returns the downsampled (x, y) arrays."""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    keep = downsample_indices(x, y, max_points, method)
+    return x[keep], y[keep]
@@ -0,0 +1,146 @@
+"""
+Streaming exports of the data tables, as CSV or Parquet.
+
+The rows of a table for a set of radars and a date range are read in chunks
+from a read-only connection and encoded chunk by chunk, so an export of
+millions of rows starts at once and never holds more than CHUNK_ROWS rows.
+Parquet exports (one row group per chunk) need pyarrow.
+
+    GET /export/biases.csv?radar=EBBE&radar=EBLG&start=2023-01-01&end=2023-12-31
+"""
+
+import csv
+import importlib.util
+import io
+import itertools
+
+from app.storage import (BIASES_COLUMNS, DETECTION_RATES_COLUMNS, RADAR_COLUMNS,
+                         connect_read_only)
+
+CHUNK_ROWS = 50_000
+
+TABLE_COLUMNS = {
+    "biases": BIASES_COLUMNS,
+    "detection_rates": DETECTION_RATES_COLUMNS,
+}
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_query(table, radars):
+    """SELECT of a table's rows between two dates, for some radars or all."""
+    radar = RADAR_COLUMNS[table]
+    where = "Job_Date BETWEEN ? AND ?"
+    if radars:
+        where += f" AND {radar} IN ({', '.join('?' * len(radars))})"
+    # Served in key order by the unique index
+    return (f"SELECT {', '.join(TABLE_COLUMNS[table])} FROM {table} "
+            f"WHERE {where} ORDER BY {radar}, Job_Date")
+
+
+def export_chunks(path, table, radars, date_range, chunk_rows=CHUNK_ROWS):
+    """Yields the rows to export, chunk_rows at a time."""
+    radars = sorted(radars or [])
+    connection = connect_read_only(path)
+    try:
+        cursor = connection.execute(export_query(table, radars),
+                                    tuple(date_range) + tuple(radars))
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+    finally:
+        connection.close()
+
+
+def stream_csv(chunks, columns):
+    """Yields the CSV header, then the text of every chunk of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for rows in itertools.chain([[]], chunks):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what the Parquet writer emits, to be drained."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def parquet_schema(table):
+    """Arrow schema of a table, with Job_Date as a date."""
+    import pyarrow as pa
+
+    columns = TABLE_COLUMNS[table]
+    types = {RADAR_COLUMNS[table]: pa.string(), "Antenna_Type": pa.string(),
+             "ds_type": pa.int64(), "Job_Date": pa.date32()}
+    return pa.schema([(column, types.get(column, pa.float64()))
+                      for column in columns])
+
+
+def stream_parquet(chunks, table):
+    """Yields a Parquet file holding one row group per chunk of rows."""
+    # pyarrow is only needed by Parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(table)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in chunks:
+            columns = zip(*rows)
+            batch = pa.record_batch([
+                pa.array(values, type=pa.string()).cast(pa.date32())
+                if field.name == "Job_Date" else pa.array(values, type=field.type)
+                for field, values in zip(schema, columns)], schema=schema)
+            # write_table() ends a row group per call; write_batch() would
+            # buffer rows until the row group is full
+            writer.write_table(pa.Table.from_batches([batch]))
+            # An empty chunk would end a chunked HTTP response
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    # The footer
+    yield sink.drain()
+
+
+def stream_export(path, table, file_format, radars, date_range,
+                  chunk_rows=CHUNK_ROWS):
+    """Encoded chunks of an export of a table in "csv" or "parquet"."""
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    chunks = export_chunks(path, table, radars, date_range, chunk_rows)
+    if file_format == "csv":
+        return stream_csv(chunks, TABLE_COLUMNS[table])
+    if file_format == "parquet":
+        return stream_parquet(chunks, table)
+    raise ValueError(f"Unknown format: {file_format}")
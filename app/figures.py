@@ -0,0 +1,173 @@
+"""
+Builds the Plotly traces of the dashboard, downsampled to what the plot can show.
+
+Traces are plain dicts whose x and y are base64 typed arrays ({"dtype",
+"bdata"}), which plotly.js decodes straight into Float64Array/Float32Array,
+instead of JSON lists of numbers. Dates are sent as milliseconds since the
+epoch, so figures must use a date x axis (DATE_XAXIS). Dense figures are
+drawn with WebGL.
+"""
+
+import base64
+
+import dash
+import numpy as np
+import plotly.graph_objs as go
+
+from app.downsample import DEFAULT_METHOD, downsample
+
+LINES_MARKERS = 'lines+markers'
+DATE_XAXIS = {'type': 'date'}
+
+# Figures with more points than this are drawn with Scattergl. Browsers only
+# allow a few WebGL contexts per page, so sparse figures stay SVG.
+WEBGL_MIN_POINTS = 5000
+
+# Points per trace when the width of the plot is unknown
+DEFAULT_MAX_POINTS = 1500
+MIN_MAX_POINTS = 200
+MAX_MAX_POINTS = 5000
+# Widths are rounded up to this step so similar screens share cached figures
+WIDTH_STEP = 250
+
+
+def max_points_for_width(width, fraction=1.0):
+    """Points per trace for a plot `fraction` of a `width` pixels wide window."""
+    if not width:
+        return DEFAULT_MAX_POINTS
+    width = -(-int(width * fraction) // WIDTH_STEP) * WIDTH_STEP
+    return min(max(width, MIN_MAX_POINTS), MAX_MAX_POINTS)
+
+
+def visible_range(relayout_data):
+    """The (start, end) dates of a zoomed x axis, or None for the full range."""
+    if not relayout_data:
+        return None
+    if 'xaxis.range[0]' in relayout_data:
+        start, end = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        start, end = relayout_data['xaxis.range']
+    else:
+        return None
+    # Plotly reports "yyyy-mm-dd hh:mm:ss.fff"; Job_Date only has the day
+    return str(start)[:10], str(end)[:10]
+
+
+def typed_array(values, dtype):
+    """plotly.js typed array spec of the values, e.g. dtype "f4" or "f8"."""
+    array = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {'dtype': dtype, 'bdata': base64.b64encode(array.tobytes()).decode('ascii')}
+
+
+def epoch_ms(dates):
+    """Milliseconds since the epoch of yyyy-mm-dd strings or datetime64 values."""
+    return np.asarray(dates, dtype='datetime64[ms]').astype(np.int64).astype(np.float64)
+
+
+def line_traces(dates, series, max_points=DEFAULT_MAX_POINTS,
+                method=DEFAULT_METHOD):
+    """Builds one lines+markers trace per (name, values) pair in `series`."""
+    dates = np.asarray(dates)
+    downsampled = [
+        (name, *downsample(dates, np.asarray(values, dtype=np.float64),
+                           max_points, method))
+        for name, values in series
+    ]
+    points = sum(len(x) for _, x, _ in downsampled)
+    trace_type = 'scattergl' if points > WEBGL_MIN_POINTS else 'scatter'
+    # Float32 keeps ~7 significant digits, plenty to draw statistics
+    return [
+        {'type': trace_type, 'x': typed_array(epoch_ms(x), 'f8'),
+         'y': typed_array(y, 'f4'), 'mode': LINES_MARKERS, 'name': name}
+        for name, x, y in downsampled
+    ]
+
+
+def _band_trace(name, stat, dates, lower, upper, max_points, method):
+    upper_x, upper_y = downsample(dates, upper, max_points, method)
+    lower_x, lower_y = downsample(dates, lower, max_points, method)
+    # Both limits in one trace, split by a gap
+    x = np.concatenate((epoch_ms(upper_x), [np.nan], epoch_ms(lower_x)))
+    y = np.concatenate((upper_y, [np.nan], lower_y))
+    return {'type': 'scattergl' if len(x) > WEBGL_MIN_POINTS else 'scatter',
+            'x': typed_array(x, 'f8'), 'y': typed_array(y, 'f4'),
+            'mode': 'lines', 'name': name, 'legendgroup': stat,
+            'line': {'dash': 'dot', 'width': 1}, 'visible': 'legendonly'}
+
+
+def control_traces(limits, anomalies, max_points=DEFAULT_MAX_POINTS,
+                   method=DEFAULT_METHOD):
+    """Control band traces, hidden until picked in the legend, and markers
+    on the out of control points.
+
+    `limits` are (stat, antenna type, dates, lower, upper) series and
+    `anomalies` (date, antenna type, stat, value, lower, upper) rows, as read
+    by app.control.
+    """
+    traces = [
+        _band_trace(f"{stat} limits ({antenna_type})" if antenna_type
+                    else f"{stat} limits", stat, np.asarray(dates),
+                    lower, upper, max_points, method)
+        for stat, antenna_type, dates, lower, upper in limits
+    ]
+    if len(anomalies):
+        dates, antenna_types, stats, values = zip(*(row[:4] for row in anomalies))
+        traces.append({
+            'type': 'scatter', 'x': typed_array(epoch_ms(dates), 'f8'),
+            'y': typed_array(values, 'f4'), 'mode': 'markers',
+            'name': 'Out of control',
+            'text': [f"{stat} ({antenna_type})" if antenna_type else stat
+                     for stat, antenna_type in zip(stats, antenna_types)],
+            'marker': {'symbol': 'x', 'size': 9, 'color': 'red'}})
+    return traces
+
+
+def column_scores(values):
+    """Each column of a 2-D array in standard deviations from its mean."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, values, 0).sum(axis=0) / count
+        std = np.sqrt(np.where(valid, (values - mean) ** 2, 0).sum(axis=0) / count)
+        return np.where(std > 0, (values - mean) / std, 0.0)
+
+
+def heatmap_trace(rows, columns, values, colors, hover_periods):
+    """Radar × statistic heatmap showing `values`, coloured by `colors`
+    (in standard deviations, centred on 0)."""
+    values = np.asarray(values, dtype=np.float64)
+    text = [['' if np.isnan(value) else f"{value:.3g}" for value in row]
+            for row in values]
+    colors = np.where(np.isnan(values), np.nan, colors)
+    # Plotly wants None for the gaps of a heatmap
+    return {
+        'type': 'heatmap', 'x': list(columns), 'y': list(rows),
+        'z': np.where(np.isnan(colors), None, colors).tolist(),
+        'text': text, 'texttemplate': '%{text}',
+        'customdata': np.asarray(hover_periods).tolist(),
+        'hovertemplate': '%{y} %{x}: %{text} (%{customdata})<extra></extra>',
+        'colorscale': 'RdBu', 'reversescale': True, 'zmid': 0,
+        'colorbar': {'title': {'text': 'σ'}},
+    }
+
+
+def base_figure(**layout):
+    """Empty figure with the app's template, to be filled by figure_patch()."""
+    return go.Figure(layout=dict(xaxis=DATE_XAXIS, **layout))
+
+
+def figure_patch(figure, *layout_keys):
+    """dash.Patch sending only the traces and the given layout properties.
+
+    The layout and its template stay in the browser, so a radar or statistic
+    change only sends the new traces.
+    """
+    patch = dash.Patch()
+    patch['data'] = list(figure['data'])
+    layout = figure['layout']
+    for key in layout_keys:
+        value = layout[key]
+        patch['layout'][key] = (value.to_plotly_json()
+                                if hasattr(value, 'to_plotly_json') else value)
+    return patch
@@ -0,0 +1,101 @@
+"""
+Radar-by-statistic matrices of the whole fleet, as shown in the Fleet tab.
+
+One grouped pass over the rollups gives the mean of every statistic of every
+radar per period; NumPy then lays them out as a radar × statistic × period
+cube and reduces it to:
+
+- "latest": the mean of the latest period with data;
+- "delta": its change from the period before;
+- "zscore": how far it lies from the radar's own periods in the range, in
+  standard deviations.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from app.rollups import RAW, WEEK
+from app.storage import ROLLUP_STATS, period_bounds
+
+METRICS = ("latest", "delta", "zscore")
+
+FLEET_QUERY = """
+    SELECT radar, stat, period, SUM(total) / SUM(count) FROM rollups
+    WHERE source IN ({sources}) AND resolution = ? AND period BETWEEN ? AND ?
+    GROUP BY radar, stat, period
+""".format(sources=", ".join(f"'{source}'" for source in ROLLUP_STATS))
+
+FleetMatrix = namedtuple(
+    "FleetMatrix", "radars stats periods latest delta zscore latest_periods")
+
+
+def fleet_resolution(resolution):
+    """Period compared by the fleet view: weeks for spans shown raw."""
+    return WEEK if resolution == RAW else resolution
+
+
+def fleet_rows(cache, date_range, resolution):
+    """(radar, stat, period, mean) rows of every statistic over a date range."""
+    resolution = fleet_resolution(resolution)
+    start, end = date_range
+    try:
+        # Periods are named after their first day, which can precede the range
+        start = period_bounds(start, resolution)[0]
+    except ValueError:
+        pass
+    return cache.query(FLEET_QUERY, (resolution, start, end))[1]
+
+
+def _last_valid(valid):
+    """Index of the last True along the last axis; -1 where there is none."""
+    last = valid.shape[-1] - 1 - np.argmax(valid[..., ::-1], axis=-1)
+    return np.where(valid.any(axis=-1), last, -1)
+
+
+def _take(cube, index):
+    values = np.take_along_axis(cube, np.maximum(index, 0)[..., None], -1)[..., 0]
+    return np.where(index >= 0, values, np.nan)
+
+
+def fleet_matrix(rows, radars, stats):
+    """Builds the FleetMatrix of the given radars and statistics.
+
+    latest, delta and zscore are len(radars) × len(stats) arrays, NaN where a
+    radar has too few periods; latest_periods holds the period of each latest
+    value ('' where there is none).
+    """
+    radars, stats = list(radars), list(stats)
+    radar_of = {radar: index for index, radar in enumerate(radars)}
+    stat_of = {stat: index for index, stat in enumerate(stats)}
+    rows = [row for row in rows
+            if row[0] in radar_of and row[1] in stat_of and row[3] is not None]
+    if not rows:
+        empty = np.full((len(radars), len(stats)), np.nan)
+        return FleetMatrix(radars, stats, [], empty, empty.copy(), empty.copy(),
+                           np.full(empty.shape, ""))
+
+    periods, period_index = np.unique(
+        np.array([row[2] for row in rows], dtype=str), return_inverse=True)
+
+    cube = np.full((len(radars), len(stats), len(periods)), np.nan)
+    cube[[radar_of[row[0]] for row in rows], [stat_of[row[1]] for row in rows],
+         period_index] = [row[3] for row in rows]
+    valid = ~np.isnan(cube)
+
+    last = _last_valid(valid)
+    latest = _take(cube, last)
+    # The period before: the last one once the latest is masked out
+    earlier = valid & (np.arange(len(periods)) != last[..., None])
+    delta = latest - _take(cube, _last_valid(earlier))
+
+    count = valid.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, cube, 0).sum(axis=-1) / count
+        std = np.sqrt(np.where(valid, (cube - mean[..., None]) ** 2, 0)
+                      .sum(axis=-1) / count)
+        zscore = np.where(std > 0, (latest - mean) / std, np.nan)
+
+    latest_periods = np.where(last >= 0, np.append(periods, "")[last], "")
+    return FleetMatrix(radars, stats, periods.tolist(), latest, delta, zscore,
+                       latest_periods)
@@ -0,0 +1,388 @@
+"""
+Fetches radar biases and detection rates from SASS-C job databases and
+stores them in the local SQLite database.
+
+Job databases are queried in parallel by a pool of worker threads, each
+holding one pooled MySQL connection at a time. Results are streamed in chunks
+through a bounded queue and written by the calling thread, so the SQLite
+database only ever sees a single writer and memory stays flat.
+
+Every ingested job is recorded in the "ingested_jobs" ledger together with a
+fingerprint of its source tables' metadata and a checksum of their contents.
+Later runs only checksum the jobs whose fingerprint changed, and only query
+those whose checksum changed too.
+"""
+
+import hashlib
+import itertools
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from app import control, metrics, storage
+from app.utils import job_date_from_name, to_iso_date, validate_date
+
+JOB_DATABASE_PATTERN = "job_verifsassuser_%"
+
+# Tables read by the job queries; their checksums identify a job's contents
+SOURCE_TABLES = (
+    "AN_RADAR_BIASES", "AN_RADAR_NOISES", "LE_DS", "AN_TR_RT_ASSOCIATIONS",
+    "AN_ACTIONS_OTR", "SD_RADAR", "DS_RADAR",
+)
+
+# One pass over information_schema lists the source tables of every job, with
+# the metadata fingerprinting them
+JOB_TABLES_QUERY = f"""
+    SELECT TABLE_SCHEMA, TABLE_NAME, CREATE_TIME, UPDATE_TIME, TABLE_ROWS
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA LIKE '{JOB_DATABASE_PATTERN}'
+        AND UPPER(TABLE_NAME) IN ({", ".join(f"'{t}'" for t in SOURCE_TABLES)})
+    ORDER BY TABLE_SCHEMA, TABLE_NAME;
+    """
+
+
+def checksum_query(database, tables):
+    """CHECKSUM TABLE of a job's source tables.
+
+    Unlike the row estimates and update times of information_schema, the
+    checksums only change with the contents of the tables, but they read
+    every row of them.
+    """
+    return "CHECKSUM TABLE " + ", ".join(
+        f"`{database}`.`{table}`" for table in tables)
+
+
+# A job database as seen on the server; the checksum is only known once
+# checksum_jobs() ran
+JobMetadata = namedtuple("JobMetadata",
+                         ["database", "created", "fingerprint", "tables",
+                          "checksum"], defaults=((), None))
+
+# A job database scheduled for ingest
+Job = namedtuple("Job", ["database", "job_date", "checksum", "fingerprint"],
+                 defaults=(None,))
+
+DEFAULT_WORKERS = 4
+
+# Rows fetched from MySQL and written to SQLite at a time
+DEFAULT_CHUNK_SIZE = 5000
+
+# Chunks that may wait for the writer, per worker
+QUEUE_CHUNKS_PER_WORKER = 2
+
+QUEUE_POLL_SECONDS = 0.5
+
+# Kinds of messages sent from the workers to the writer
+CHUNK, DONE, FAILED = "chunk", "done", "failed"
+
+# Provided SQL queries
+BIASES_QUERY = """
+    SELECT
+        d.DS_NAME AS "Radar Name",
+        b.RADAR_MODE AS "Antenna Type",
+        ROUND(COALESCE(b.TIME_OFFSET_CALC_S, -1), 5) AS "Time Bias",
+        ROUND(COALESCE(b.RANGE_BIAS_CALC_M, -1), 5) AS "Range Bias",
+        ROUND(COALESCE((b.RANGE_GAIN_CALC - 1) * 1852, -1), 5) AS "Range Gain",
+        ROUND(COALESCE(b.AZIMUTH_BIAS_CALC_DEG, -1), 5) AS "Azimuth Bias",
+        ROUND(COALESCE(n.RANGE_ERROR_SD_CALC_M, -1), 5) AS "Range Noise",
+        ROUND(COALESCE(n.AZIMUTH_ERROR_SD_CALC_DEG, -1), 5) AS "Azimuth Noise",
+        ROUND(COALESCE(b.ECC_VALUE_CALC_DEG, -1), 5) AS "Ecc Value",
+        ROUND(COALESCE(b.ECC_ANGLE_CALC_DEG, -1), 5) AS "Ecc Angle"
+    FROM AN_RADAR_BIASES b
+    LEFT JOIN AN_RADAR_NOISES n
+        ON  b.DS_ID = n.DS_ID
+        AND b.RADAR_MODE = n.RADAR_MODE
+        AND b.ACTION_ID = n.ACTION_ID
+    INNER JOIN LE_DS d ON b.DS_ID = d.DS_ID
+    WHERE b.ACTION_ID = 2;
+
+    """
+
+DETECTION_RATE_QUERY = """
+        SELECT
+        d.DS_NAME AS ds_name,
+        r.radar_type_id AS ds_type,
+        COUNT(CASE WHEN tra.detection_P = 1 THEN 1 ELSE NULL END) /
+        COUNT(CASE WHEN tra.detection_P IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdP,
+        COUNT(CASE WHEN tra.detection_S = 1 THEN 1 ELSE NULL END) /
+        COUNT(CASE WHEN tra.detection_S IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdS,
+        COUNT(CASE WHEN tra.detection_M = 1 THEN 1 ELSE NULL END) /
+        COUNT(CASE WHEN tra.detection_M IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdM,
+        COUNT(CASE WHEN tra.detection_PS = 1 THEN 1 ELSE NULL END) /
+        COUNT(CASE WHEN tra.detection_PS IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdPS,
+        COUNT(CASE WHEN tra.detection_PM = 1 THEN 1 ELSE NULL END) /
+        COUNT(CASE WHEN tra.detection_PM IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdPM
+    FROM
+        an_tr_rt_associations tra
+    JOIN
+        an_actions_otr a ON tra.ds_id = a.ds_id AND a.action_id = 2
+    JOIN
+        sd_radar s ON tra.REC_NUM = s.REC_NUM
+    JOIN
+        le_ds d ON s.ds_id = d.ds_id
+    JOIN
+        ds_radar r ON s.ds_id = r.ds_id
+    GROUP BY
+        d.DS_NAME
+    ORDER BY
+        d.DS_NAME;
+    """
+
+# Queries run against every job database, with the table they feed
+JOB_QUERIES = (
+    ("biases", BIASES_QUERY),
+    ("detection_rates", DETECTION_RATE_QUERY),
+)
+
+
+def list_jobs(connection):
+    """Returns the metadata of every database that begins with "job_verifsassuser_".
+
+    Only information_schema is read: the fingerprint of a job hashes the
+    creation and update times and row estimates of its source tables.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(JOB_TABLES_QUERY)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    jobs = []
+    for database, tables in itertools.groupby(rows, key=lambda row: row[0]):
+        tables = list(tables)
+        created = min((row[2] for row in tables if row[2] is not None),
+                      default=None)
+        fingerprint = "|".join(f"{table}={created_at},{updated_at},{count}"
+                               for _, table, created_at, updated_at, count
+                               in tables)
+        jobs.append(JobMetadata(database, created,
+                                hashlib.sha1(fingerprint.encode()).hexdigest(),
+                                tuple(row[1] for row in tables)))
+    return jobs
+
+
+def checksum_job(pool, metadata):
+    """Returns the metadata of a job with the checksum of its source tables."""
+    connection = pool.get_connection()
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(checksum_query(metadata.database, metadata.tables))
+            checksums = "|".join(f"{table}={checksum}"
+                                 for table, checksum in cursor.fetchall())
+        finally:
+            cursor.close()
+    finally:
+        connection.close()
+    return metadata._replace(
+        checksum=hashlib.sha1(checksums.encode()).hexdigest())
+
+
+def checksum_jobs(pool, jobs_metadata, workers=DEFAULT_WORKERS):
+    """Checksums the source tables of jobs, `workers` job databases at once."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda metadata: checksum_job(pool, metadata),
+                                 jobs_metadata))
+
+
+def resolve_job_date(database, created=None):
+    """Returns the "yyyy-mm-dd" date of a job, or None if it can't be resolved.
+
+    The date embedded in the database name wins; otherwise the creation time
+    of the job's tables is used.
+    """
+    job_date_str = job_date_from_name(database)
+    if job_date_str is None and isinstance(created, datetime):
+        job_date_str = created.strftime("%d/%m/%Y")
+    if job_date_str is not None and validate_date(job_date_str):
+        return to_iso_date(job_date_str)
+    return None
+
+
+def pending_jobs(jobs_metadata, ledger, full=False):
+    """Returns the jobs that look new or changed since they were last ingested.
+
+    `ledger` is storage.load_ledger(). Jobs whose fingerprint changed but not
+    their checksum are told apart by changed_jobs() once checksummed.
+    """
+    return [
+        metadata for metadata in jobs_metadata
+        if full or metadata.database not in ledger
+        or ledger[metadata.database].fingerprint != metadata.fingerprint
+    ]
+
+
+def changed_jobs(jobs_metadata, ledger, full=False):
+    """Splits checksummed jobs into those whose contents changed since they
+    were last ingested and those that only look changed."""
+    changed, unchanged = [], []
+    for metadata in jobs_metadata:
+        entry = ledger.get(metadata.database)
+        if full or entry is None or entry.checksum != metadata.checksum:
+            changed.append(metadata)
+        else:
+            unchanged.append(metadata)
+    return changed, unchanged
+
+
+def fetch_chunks(cursor, query, chunk_size):
+    """Yields the results of a query in chunks of at most `chunk_size` rows."""
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _put(results, item, stop):
+    """Queues an item, giving up once the writer has stopped consuming."""
+    while not stop.is_set():
+        try:
+            results.put(item, timeout=QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def stream_job(pool, job, chunk_size, results, stop):
+    """Streams the results of both job queries for one job into `results`.
+
+    Runs on a worker thread. Each chunk is queued as soon as it is fetched, so
+    the worker fetches the next chunk while the writer stores the previous one.
+    The time spent waiting for MySQL is sent along with the row counts.
+    """
+    counts = {}
+    fetch_seconds = 0.0
+    try:
+        connection = pool.get_connection()
+        try:
+            # An unbuffered cursor reads rows off the wire as they are fetched
+            cursor = connection.cursor(buffered=False)
+            try:
+                cursor.execute(f"USE `{job.database}`")
+                for table, query in JOB_QUERIES:
+                    counts[table] = 0
+                    started = time.perf_counter()
+                    for rows in fetch_chunks(cursor, query, chunk_size):
+                        # Time blocked on a full queue is the writer's
+                        fetch_seconds += time.perf_counter() - started
+                        counts[table] += len(rows)
+                        if not _put(results, (CHUNK, job, table, rows), stop):
+                            return
+                        started = time.perf_counter()
+                    fetch_seconds += time.perf_counter() - started
+            finally:
+                cursor.close()
+        finally:
+            # Closing a pooled connection hands it back to the pool
+            connection.close()
+    except Exception as e:  # pylint: disable=broad-except
+        _put(results, (FAILED, job, None, e), stop)
+        return
+    _put(results, (DONE, job, None, (counts, fetch_seconds)), stop)
+
+
+def write_chunk(sqlite_connection, job, table, rows):
+    """Stores one chunk of a job's results in a single transaction.
+
+    Rows are upserted on their radar, antenna type and date, so re-ingesting
+    a job replaces its rows instead of duplicating them, and rows that didn't
+    change aren't written at all. Returns the number of rows changed.
+    """
+    with sqlite_connection:
+        sqlite_cursor = sqlite_connection.cursor()
+        try:
+            before = sqlite_connection.total_changes
+            storage.insert_rows(sqlite_cursor, table,
+                                storage.with_job_date(rows, job.job_date))
+            changed = sqlite_connection.total_changes - before
+            if changed:
+                storage.bump_data_version(sqlite_cursor)
+        finally:
+            sqlite_cursor.close()
+    return changed
+
+
+def finish_job(sqlite_connection, job, counts, changed=True):
+    """Records the job in the ledger, refreshing its rollups and control
+    limits if it changed rows."""
+    with sqlite_connection:
+        if changed:
+            storage.refresh_rollups(sqlite_connection, job.job_date,
+                                    job.job_date)
+            control.refresh_control(sqlite_connection, job.job_date)
+            storage.bump_data_version(sqlite_connection)
+        storage.record_job(
+            sqlite_connection, job.database, job.job_date, job.checksum,
+            job.fingerprint, counts["biases"], counts["detection_rates"],
+            datetime.now(timezone.utc).isoformat(timespec="seconds"))
+
+
+def ingest_jobs(pool, jobs, sqlite_connection, workers=DEFAULT_WORKERS,
+                chunk_size=DEFAULT_CHUNK_SIZE, timings=None):
+    """Streams every job in parallel and writes the chunks as they arrive.
+
+    `jobs` is a list of Job tuples. At most `workers` job databases are queried
+    at once; the pool should hold at least that many connections. The schema
+    must already exist (see storage.connect_for_ingest).
+
+    Workers hand chunks of at most `chunk_size` rows to the calling thread
+    through a bounded queue, so memory stays flat however large a job is. A
+    job only enters the ledger once all of its chunks are written; if the run
+    is interrupted part-way, the next run re-ingests it and upserts over the
+    partial rows. Returns the names of the ingested databases.
+
+    The MySQL fetch and SQLite write times of every job are recorded in
+    app.metrics, and in `timings` as {database: (fetch, write)} seconds if
+    given.
+    """
+    results = queue.Queue(maxsize=QUEUE_CHUNKS_PER_WORKER * workers)
+    stop = threading.Event()
+    # Rows changed and seconds spent writing, of each job so far
+    changed = {}
+    written = {}
+    ingested = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(stream_job, pool, job, chunk_size, results, stop)
+            for job in jobs
+        ]
+        try:
+            remaining = len(futures)
+            while remaining:
+                kind, job, table, payload = results.get()
+                if kind == CHUNK:
+                    started = time.perf_counter()
+                    changed[job.database] = (
+                        changed.get(job.database, 0)
+                        + write_chunk(sqlite_connection, job, table, payload))
+                    written[job.database] = (written.get(job.database, 0.0)
+                                             + time.perf_counter() - started)
+                    continue
+
+                remaining -= 1
+                if kind == FAILED:
+                    raise payload
+                counts, fetch_seconds = payload
+                started = time.perf_counter()
+                finish_job(sqlite_connection, job, counts,
+                           changed.pop(job.database, 0) > 0)
+                write_seconds = (written.pop(job.database, 0.0)
+                                 + time.perf_counter() - started)
+                metrics.observe_ingest(fetch_seconds, write_seconds, counts)
+                if timings is not None:
+                    timings[job.database] = (fetch_seconds, write_seconds)
+                ingested.append(job.database)
+        finally:
+            # Unblock the workers and don't start jobs that are still queued
+            stop.set()
+            for future in futures:
+                future.cancel()
+
+    return ingested
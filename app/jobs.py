@@ -0,0 +1,149 @@
+"""
+Background generation of PDF reports.
+
+Reports are built in a small process pool so a long report neither blocks a
+server worker nor the browser request that asked for it. Finished PDFs are
+kept on disk, named after their date range and the data version they were
+built from, so asking again for the same range is answered at once until
+new data is ingested. Workers write their progress next to the PDF being
+built, where any server process can follow it.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from app.report import write_report
+
+DEFAULT_WORKERS = 2
+# A progress file untouched for this long belongs to a job that died
+STALE_PROGRESS_SECONDS = 600
+# Finished reports kept on disk, oldest removed first
+MAX_REPORTS = 20
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def report_key(start_date, end_date, data_version):
+    """Name of the report of a date range at a data version."""
+    # Also rejects anything that could escape the reports directory
+    start_date = date.fromisoformat(start_date).isoformat()
+    end_date = date.fromisoformat(end_date).isoformat()
+    return f"report_{start_date}_{end_date}_v{data_version}"
+
+
+def _write_progress(progress_path, fraction):
+    temporary = progress_path + ".tmp"
+    with open(temporary, "w") as progress_file:
+        progress_file.write(f"{fraction:.3f}")
+    os.replace(temporary, progress_path)
+
+
+def run_report(path, start_date, end_date, pdf_path, progress_path):
+    """Builds a report into pdf_path; runs in a worker process."""
+    temporary = pdf_path + ".tmp"
+    try:
+        with open(temporary, "wb") as output:
+            write_report(path, start_date, end_date, output,
+                         lambda fraction: _write_progress(progress_path, fraction))
+        os.replace(temporary, pdf_path)
+    finally:
+        for leftover in (temporary, progress_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+class ReportJobs:
+    """Queue of report jobs, with the finished reports cached on disk."""
+
+    def __init__(self, path, reports_dir, data_version, workers=DEFAULT_WORKERS):
+        self.path = path
+        self.reports_dir = reports_dir
+        self.data_version = data_version
+        self.workers = workers
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def pdf_path(self, key):
+        return os.path.join(self.reports_dir, key + ".pdf")
+
+    def _progress_path(self, key):
+        return os.path.join(self.reports_dir, key + ".progress")
+
+    def submit(self, start_date, end_date):
+        """Starts the report of a date range unless it is cached or running.
+
+        Returns the key of the job, to follow it with status().
+        """
+        key = report_key(start_date, end_date, self.data_version.get())
+        with self._lock:
+            if os.path.exists(self.pdf_path(key)):
+                return key
+            future = self._futures.get(key)
+            if future is not None and not future.done():
+                return key
+            if future is None and self._progress(key) is not None:
+                # Being built by another server process
+                return key
+            os.makedirs(self.reports_dir, exist_ok=True)
+            self._prune()
+            # Tells the other server processes the report is on its way
+            _write_progress(self._progress_path(key), 0.0)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._futures[key] = self._executor.submit(
+                run_report, self.path, start_date, end_date,
+                self.pdf_path(key), self._progress_path(key))
+        return key
+
+    def status(self, key):
+        """{'state', 'progress', 'error'} of a job."""
+        if os.path.exists(self.pdf_path(key)):
+            return {'state': DONE, 'progress': 1.0, 'error': None}
+
+        with self._lock:
+            future = self._futures.get(key)
+        if future is not None and future.done():
+            error = future.exception()
+            if error is None and os.path.exists(self.pdf_path(key)):
+                return {'state': DONE, 'progress': 1.0, 'error': None}
+            return {'state': FAILED, 'progress': 0.0,
+                    'error': str(error) if error else "The report was removed"}
+
+        progress = self._progress(key)
+        if progress is not None:
+            return {'state': RUNNING, 'progress': progress, 'error': None}
+        if future is None:
+            return {'state': FAILED, 'progress': 0.0, 'error': "Unknown report"}
+        return {'state': QUEUED, 'progress': 0.0, 'error': None}
+
+    def _progress(self, key):
+        """Progress of a job, from any process; None if nobody is building it."""
+        try:
+            path = self._progress_path(key)
+            if time.time() - os.path.getmtime(path) > STALE_PROGRESS_SECONDS:
+                return None
+            with open(path) as progress_file:
+                return float(progress_file.read())
+        except (OSError, ValueError):
+            return None
+
+    def _prune(self):
+        reports = sorted(
+            (entry for entry in os.scandir(self.reports_dir)
+             if entry.name.endswith(".pdf")),
+            key=lambda entry: entry.stat().st_mtime)
+        for entry in reports[:max(len(reports) - MAX_REPORTS + 1, 0)]:
+            os.remove(entry.path)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
@@ -0,0 +1,51 @@
+"""
+Points of newly ingested jobs, pushed to the open figures in live mode.
+
+Each page remembers the data version, the latest Job_Date its figures show
+and the end of the date range they were extended under. A poll compares them
+with the database, which costs a PRAGMA while nothing changes. Once a job has
+been ingested, only the rows of the days after the latest one shown are sent,
+and assets/live.js appends them to the traces of the open figures in the
+browser. Rows changed on earlier days show up the next time a figure is built.
+Nothing is appended while the picked range ends before the latest data.
+"""
+
+from app.figures import epoch_ms
+from app.storage import ANTENNA_COLUMNS, RADAR_COLUMNS, ROLLUP_STATS
+
+# How often pages in live mode look for new data
+LIVE_POLL_MS = 30_000
+
+
+def live_query(source):
+    """Rows of a table after a date, in the order of the raw figures."""
+    return (f"SELECT {RADAR_COLUMNS[source]}, Job_Date, "
+            f"{', '.join(ROLLUP_STATS[source])} FROM {source} "
+            f"WHERE Job_Date > ? AND {RADAR_COLUMNS[source]} IS NOT NULL "
+            f"ORDER BY {RADAR_COLUMNS[source]}, Job_Date, "
+            f"{ANTENNA_COLUMNS[source]}")
+
+
+def new_points(cache, since):
+    """{source: {radar: {"x": [epoch ms], "y": {stat: [values]}}}} of the
+    rows after the date `since`."""
+    points = {}
+    for source, stats in ROLLUP_STATS.items():
+        _, rows = cache.query(live_query(source), (since,))
+        radars = points[source] = {}
+        for radar, job_date, *values in rows:
+            radar_points = radars.setdefault(
+                radar, {"x": [], "y": {stat: [] for stat in stats}})
+            radar_points["x"].append(job_date)
+            for stat, value in zip(stats, values):
+                radar_points["y"][stat].append(value)
+        for radar_points in radars.values():
+            radar_points["x"] = epoch_ms(radar_points["x"]).tolist()
+    return points
+
+
+def live_state(version, latest_date, end_date):
+    """What a page has seen: the data version, the latest Job_Date its
+    figures show (None if not the latest data) and the end of the date range
+    they are extended under."""
+    return {"version": version, "latest": latest_date, "end": end_date}
@@ -0,0 +1,66 @@
+"""
+What the dashboard needs to know about the data before plotting any of it:
+radar names, date bounds and available statistics.
+
+Every answer is a small aggregate served from the indexes, cached by the
+QueryCache and so refreshed as soon as new data is ingested.
+"""
+
+from app.pivot import stat_table
+from app.storage import DATE_BOUNDS_QUERY, RADAR_COLUMNS
+
+# Statistics offered in the Comparison tab, in display order
+STATS = (
+    ("pdP", "pdP"),
+    ("pdS", "pdS"),
+    ("pdM", "pdM"),
+    ("pdPS", "pdPS"),
+    ("pdPM", "pdPM"),
+    ("Range_Bias", "Range Bias"),
+    ("Azimuth_Bias", "Azimuth Bias"),
+    ("Time_Bias", "Time Bias"),
+)
+
+# Jumps from one radar name to the next through the (radar, date) index, so
+# listing radars costs one index lookup per radar rather than a pass over
+# every row
+DISTINCT_RADARS_QUERY = """
+    WITH RECURSIVE radar(name) AS (
+        SELECT MIN({radar}) FROM {table}
+        UNION ALL
+        SELECT (SELECT MIN({radar}) FROM {table} WHERE {radar} > radar.name)
+        FROM radar WHERE radar.name IS NOT NULL
+    )
+    SELECT name FROM radar WHERE name IS NOT NULL
+"""
+
+
+class Metadata:
+    """Cached radar lists, date bounds and statistics of the database."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def radars(self, table="biases"):
+        """Sorted names of the radars with data in a table."""
+        _, rows = self.cache.query(DISTINCT_RADARS_QUERY.format(
+            radar=RADAR_COLUMNS[table], table=table))
+        return [row[0] for row in rows]
+
+    def date_bounds(self):
+        """(earliest, latest) Job_Date of the database; (None, None) when empty."""
+        _, rows = self.cache.query(DATE_BOUNDS_QUERY)
+        return rows[0]
+
+    def tables_with_data(self):
+        """Names of the data tables holding at least one row."""
+        return [
+            table for table in RADAR_COLUMNS
+            if self.cache.query(f"SELECT EXISTS (SELECT 1 FROM {table})")[1][0][0]
+        ]
+
+    def stats(self):
+        """(column, label) of the statistics whose table holds data."""
+        tables = set(self.tables_with_data())
+        return [(stat, label) for stat, label in STATS
+                if stat_table(stat) in tables]
@@ -0,0 +1,123 @@
+"""
+Timings of the hot paths of the ingester and the dashboard, in Prometheus
+format.
+
+- Dashboard callbacks: latency and response size, per callback output;
+- SQLite queries: execute and fetch time, per query (cache misses only);
+- Ingest: MySQL fetch and SQLite write time of every job database.
+
+The dashboard serves them at /metrics and main.py with --metrics-port. When
+PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py), the values of every
+worker process are collected there and served added up.
+
+Set RADAR_PROFILE_DIR to a directory to also dump a cProfile of every
+dashboard request, or of a whole ingest run, for snakeviz or pstats.
+"""
+
+import cProfile
+import os
+import re
+import time
+from contextlib import contextmanager
+
+import flask
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                               Counter, Histogram, generate_latest, multiprocess)
+
+PROFILE_DIR_VARIABLE = "RADAR_PROFILE_DIR"
+# Dash posts every callback here
+CALLBACK_PATH = "/_dash-update-component"
+# Queries are labelled with their start, whitespace collapsed
+QUERY_LABEL_LENGTH = 120
+
+CALLBACK_SECONDS = Histogram(
+    "radar_callback_seconds", "Time spent answering a dashboard callback.",
+    ["callback"])
+CALLBACK_RESPONSE_BYTES = Histogram(
+    "radar_callback_response_bytes", "Size of a dashboard callback response.",
+    ["callback"],
+    buckets=(1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, float("inf")))
+SQL_SECONDS = Histogram(
+    "radar_sql_seconds", "Time spent executing a query and fetching its rows.",
+    ["query", "phase"])
+CACHE_LOOKUPS = Counter(
+    "radar_cache_lookups", "Lookups in the query and figure cache.", ["result"])
+INGEST_SECONDS = Histogram(
+    "radar_ingest_job_seconds",
+    "Time spent fetching a job database from MySQL and writing it to SQLite.",
+    ["phase"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float("inf")))
+INGEST_ROWS = Counter(
+    "radar_ingest_rows", "Rows ingested from the job databases.", ["table"])
+
+
+def query_label(sql):
+    """Short, stable label of a query."""
+    return re.sub(r"\s+", " ", sql).strip()[:QUERY_LABEL_LENGTH]
+
+
+def observe_ingest(fetch_seconds, write_seconds, counts):
+    """Records the timings and row counts of one ingested job."""
+    INGEST_SECONDS.labels("fetch").observe(fetch_seconds)
+    INGEST_SECONDS.labels("write").observe(write_seconds)
+    for table, rows in counts.items():
+        INGEST_ROWS.labels(table).inc(rows)
+
+
+def render_metrics():
+    """(body, content type) of every metric, in Prometheus text format."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def instrument_callbacks(server):
+    """Times the Dash callbacks served by a Flask server."""
+    @server.before_request
+    def start_timer():
+        flask.g.metrics_started = time.perf_counter()
+
+    @server.after_request
+    def observe_callback(response):
+        started = flask.g.pop("metrics_started", None)
+        if started is not None and flask.request.path.endswith(CALLBACK_PATH):
+            body = flask.request.get_json(silent=True) or {}
+            callback = str(body.get("output", "unknown"))
+            CALLBACK_SECONDS.labels(callback).observe(
+                time.perf_counter() - started)
+            CALLBACK_RESPONSE_BYTES.labels(callback).observe(
+                response.content_length or 0)
+        return response
+
+
+def profile_requests(server):
+    """Dumps a cProfile of every request if RADAR_PROFILE_DIR is set."""
+    profile_dir = os.environ.get(PROFILE_DIR_VARIABLE)
+    if not profile_dir:
+        return
+    from werkzeug.middleware.profiler import ProfilerMiddleware
+
+    os.makedirs(profile_dir, exist_ok=True)
+    server.wsgi_app = ProfilerMiddleware(server.wsgi_app, stream=None,
+                                         profile_dir=profile_dir)
+
+
+@contextmanager
+def profiled(name):
+    """Dumps a cProfile of the block to RADAR_PROFILE_DIR, if it is set."""
+    profile_dir = os.environ.get(PROFILE_DIR_VARIABLE)
+    if not profile_dir:
+        yield
+        return
+    os.makedirs(profile_dir, exist_ok=True)
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(os.path.join(
+            profile_dir, f"{name}.{time.strftime('%Y%m%d-%H%M%S')}.prof"))
@@ -0,0 +1,57 @@
+"""
+Radar-by-date grids of any statistic, as shown in the Comparison tab.
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.storage import BIASES_COLUMNS, DETECTION_RATES_COLUMNS, RADAR_COLUMNS
+
+
+def stat_table(stat):
+    """Returns the table holding a statistic (e.g. "Range_Bias" or "pdP")."""
+    if stat in BIASES_COLUMNS[2:-1]:
+        return "biases"
+    if stat in DETECTION_RATES_COLUMNS[2:-1]:
+        return "detection_rates"
+    raise ValueError(f"Unknown statistic: {stat}")
+
+
+def stat_query(stat):
+    """SQL selecting (radar, value, Job_Date) for a statistic between two dates."""
+    table = stat_table(stat)
+    return (f"SELECT {RADAR_COLUMNS[table]}, {stat}, Job_Date FROM {table} "
+            "WHERE Job_Date BETWEEN ? AND ?")
+
+
+def pivot_rows(rows):
+    """Builds the radar-by-date grid of (radar, value, date) rows.
+
+    Returns (radars, dates, grid), with radars and dates sorted and grid[i, j]
+    the value of radars[i] on dates[j], NaN where there is none. When a radar
+    has several rows for a date (e.g. one per antenna type), the last row wins.
+    """
+    if not rows:
+        return pivot_columns([], [], [])
+    return pivot_columns([row[0] for row in rows], [row[1] for row in rows],
+                         [row[2] for row in rows])
+
+
+def pivot_columns(radars, values, dates):
+    """pivot_rows() of the radar, value and date columns, as arrays or lists."""
+    if not len(radars):
+        return np.array([], dtype=str), np.array([], dtype=str), np.empty((0, 0))
+
+    # Hash-based factorizing, much cheaper than sorting every row
+    radar_index, radars = pd.factorize(np.asarray(radars, dtype=object), sort=True)
+    date_index, dates = pd.factorize(np.asarray(dates), sort=True)
+    values = np.asarray(values, dtype=np.float64)
+
+    # Keep only the last row of each (radar, date) cell
+    cell = radar_index * len(dates) + date_index
+    _, last_reversed = np.unique(cell[::-1], return_index=True)
+    last = len(cell) - 1 - last_reversed
+
+    grid = np.full((len(radars), len(dates)), np.nan)
+    grid[radar_index[last], date_index[last]] = values[last]
+    return np.asarray(radars).astype(str), np.asarray(dates).astype(str), grid
@@ -0,0 +1,202 @@
+"""
+PDF report of the detection rates over a date range.
+
+The report opens with a summary section per radar (mean, minimum, maximum
+and trend of every rate), aggregated by SQLite, followed by the rows
+themselves. Rows are read in chunks and laid out as page-sized tables that
+the document pulls while it is being built, and the PDF is written to the
+output file as it is saved, so memory stays bounded whatever the range.
+"""
+
+import itertools
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle, SimpleDocTemplate
+
+from app.storage import DETECTION_RATES_COLUMNS, connect_read_only
+
+REPORT_TITLE = "Radar Statistics Report"
+REPORT_STATS = DETECTION_RATES_COLUMNS[2:-1]
+
+# Rows of a detail table; one table about fills a letter page
+ROWS_PER_BLOCK = 40
+CHUNK_SIZE = 2000
+# The PDF keeps every page until it is saved, so the detail is capped; the
+# summaries always cover the whole range
+MAX_DETAIL_ROWS = 10000
+DAYS_PER_YEAR = 365.25
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+SUMMARY_HEADER = ("Statistic", "Mean", "Min", "Max", "Trend / year")
+
+
+def _summary_columns(stat):
+    # Least-squares slope of the rate against the day number
+    return (
+        f"AVG({stat}), MIN({stat}), MAX({stat}), "
+        f"(COUNT({stat}) * SUM(x_{stat} * {stat}) - SUM(x_{stat}) * SUM({stat}))"
+        f" / NULLIF(COUNT({stat}) * SUM(x_{stat} * x_{stat})"
+        f" - SUM(x_{stat}) * SUM(x_{stat}), 0)"
+    )
+
+
+# One grouped pass over the range; missing rates (stored as -1) are ignored
+SUMMARY_QUERY = f"""
+    SELECT ds_name, COUNT(*), MIN(Job_Date), MAX(Job_Date),
+        {', '.join(_summary_columns(stat) for stat in REPORT_STATS)}
+    FROM (
+        SELECT ds_name, Job_Date,
+            {', '.join(f"NULLIF({stat}, -1) AS {stat}" for stat in REPORT_STATS)},
+            {', '.join(
+                f"CASE WHEN {stat} != -1 THEN julianday(Job_Date) - julianday(?) END"
+                f" AS x_{stat}" for stat in REPORT_STATS)}
+        FROM detection_rates
+        WHERE Job_Date BETWEEN ? AND ?
+    )
+    GROUP BY ds_name
+    ORDER BY ds_name
+"""
+
+DETAIL_QUERY = (
+    f"SELECT {', '.join(DETECTION_RATES_COLUMNS)} FROM detection_rates "
+    "WHERE Job_Date BETWEEN ? AND ? ORDER BY Job_Date, ds_name LIMIT ?"
+)
+
+COUNT_QUERY = "SELECT COUNT(*) FROM detection_rates WHERE Job_Date BETWEEN ? AND ?"
+
+
+class FlowableStream(list):
+    """Flowables pulled from an iterable as the document consumes them.
+
+    The document template only needs len(), [0] and deletions from the
+    front, so a list refilled one flowable at a time is enough to keep only
+    the block being laid out in memory.
+    """
+
+    def __init__(self, flowables):
+        super().__init__()
+        self._pending = iter(flowables)
+
+    def __len__(self):
+        if not super().__len__():
+            self.extend(itertools.islice(self._pending, 1))
+        return super().__len__()
+
+
+def format_cell(value):
+    """Plain table cell text; floats are shown with two decimals."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def radar_summaries(connection, start_date, end_date):
+    """Yields (radar, entries, first date, last date, stats) for every radar.
+
+    stats holds one (statistic, mean, min, max, trend per day) per rate.
+    """
+    cursor = connection.execute(
+        SUMMARY_QUERY, (start_date,) * len(REPORT_STATS) + (start_date, end_date))
+    for radar, entries, first_date, last_date, *values in cursor:
+        stats = [
+            (stat,) + tuple(values[4 * i:4 * i + 4])
+            for i, stat in enumerate(REPORT_STATS)
+        ]
+        yield radar, entries, first_date, last_date, stats
+
+
+def summary_flowables(connection, start_date, end_date, styles):
+    """Heading, description and table of each radar's summary."""
+    for radar, entries, first_date, last_date, stats in radar_summaries(
+            connection, start_date, end_date):
+        yield Paragraph(radar, styles['h2'])
+        yield Paragraph(f"{entries} entries from {first_date} to {last_date}",
+                        styles['Normal'])
+        rows = [SUMMARY_HEADER] + [
+            (stat, format_cell(mean), format_cell(low), format_cell(high),
+             format_cell(trend * DAYS_PER_YEAR if trend is not None else None))
+            for stat, mean, low, high, trend in stats
+        ]
+        table = Table(rows)
+        table.setStyle(TABLE_STYLE)
+        yield table
+        yield Spacer(1, 12)
+
+
+def detail_flowables(connection, start_date, end_date, styles, on_progress=None):
+    """The rows of the range, as page-sized tables built chunk by chunk.
+
+    on_progress, if given, is called with the fraction of the rows laid out.
+    """
+    if on_progress is not None:
+        total = connection.execute(COUNT_QUERY, (start_date, end_date)).fetchone()[0]
+        total = max(min(total, MAX_DETAIL_ROWS), 1)
+    cursor = connection.execute(DETAIL_QUERY,
+                                (start_date, end_date, MAX_DETAIL_ROWS + 1))
+    shown = 0
+    block = []
+    while True:
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        for row in rows:
+            if shown == MAX_DETAIL_ROWS:
+                yield Paragraph(
+                    f"Only the first {MAX_DETAIL_ROWS} rows are listed.",
+                    styles['Italic'])
+                return
+            block.append([format_cell(cell) for cell in row])
+            shown += 1
+            if len(block) == ROWS_PER_BLOCK:
+                yield _detail_table(block)
+                block = []
+                if on_progress is not None:
+                    on_progress(shown / total)
+        if not rows:
+            break
+    if block:
+        yield _detail_table(block)
+
+
+def _detail_table(block):
+    table = Table([DETECTION_RATES_COLUMNS] + block, repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+def report_flowables(connection, start_date, end_date, on_progress=None):
+    styles = getSampleStyleSheet()
+    yield Paragraph(REPORT_TITLE, styles['h1'])
+    yield Paragraph(f"Date Range: {start_date} to {end_date}", styles['Normal'])
+    yield Spacer(1, 12)
+    yield from summary_flowables(connection, start_date, end_date, styles)
+    yield Paragraph("Detection rates", styles['h2'])
+    yield from detail_flowables(connection, start_date, end_date, styles,
+                                on_progress)
+
+
+def write_report(path, start_date, end_date, output, on_progress=None):
+    """Writes the PDF report of a date range to a binary file object.
+
+    on_progress, if given, is called with the fraction of the report done.
+    """
+    connection = connect_read_only(path)
+    try:
+        doc = SimpleDocTemplate(output, pagesize=letter, title=REPORT_TITLE)
+        doc.build(FlowableStream(
+            report_flowables(connection, start_date, end_date, on_progress)))
+    finally:
+        connection.close()
+    if on_progress is not None:
+        on_progress(1.0)
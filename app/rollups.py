@@ -0,0 +1,104 @@
+"""
+Dashboard reads at the resolution their date range calls for.
+
+Short spans are read from the data tables. Longer ones are read from the
+weekly or monthly rollups kept up to date by the ingester (see
+storage.refresh_rollups), and their means are plotted instead of the raw
+values, so a ten year view reads a few hundred rows per statistic rather
+than every job.
+"""
+
+from datetime import date
+
+from app.pivot import pivot_rows, stat_query, stat_table
+from app.storage import RADAR_COLUMNS, ROLLUP_STATS, period_bounds
+
+RAW = "raw"
+WEEK = "week"
+MONTH = "month"
+
+# Longest span, in days, read at each resolution
+RAW_MAX_DAYS = 2 * 366
+WEEK_MAX_DAYS = 6 * 366
+
+# Appended to the title of figures built from rollups
+RESOLUTION_TITLES = {
+    RAW: "",
+    WEEK: " (weekly means)",
+    MONTH: " (monthly means)",
+}
+
+RADAR_ROLLUP_QUERY = """
+    SELECT stat, SUM(total) / SUM(count), period FROM rollups
+    WHERE source = ? AND resolution = ? AND radar = ? AND period BETWEEN ? AND ?
+    GROUP BY period, stat
+"""
+
+STAT_ROLLUP_QUERY = """
+    SELECT radar, SUM(total) / SUM(count), period FROM rollups
+    WHERE source = ? AND resolution = ? AND stat = ? AND period BETWEEN ? AND ?
+    GROUP BY radar, period
+"""
+
+
+def choose_resolution(date_range, bounds=(None, None)):
+    """Resolution for a (start, end) date range, once clipped to the data bounds."""
+    start, end = date_range
+    first, last = bounds
+    start = max(start, first) if first else start
+    end = min(end, last) if last else end
+    try:
+        span = (date.fromisoformat(end) - date.fromisoformat(start)).days
+    except ValueError:
+        # Unbounded range over an empty database
+        return RAW
+    if span <= RAW_MAX_DAYS:
+        return RAW
+    if span <= WEEK_MAX_DAYS:
+        return WEEK
+    return MONTH
+
+
+def _period_range(date_range, resolution):
+    # Periods are named after their first day, which can precede the range
+    start, end = date_range
+    try:
+        start = period_bounds(start, resolution)[0]
+    except ValueError:
+        pass
+    return start, end
+
+
+def radar_series(cache, source, radar, date_range, resolution=RAW):
+    """(dates, [(statistic, values)]) of every statistic of a radar in a table."""
+    if resolution == RAW:
+        # Named columns: tables upgraded by the migrations can hold them in
+        # another order
+        stats = list(ROLLUP_STATS[source])
+        _, rows = cache.query(
+            f"SELECT Job_Date, {', '.join(stats)} FROM {source} "
+            f"WHERE {RADAR_COLUMNS[source]} = ? "
+            "AND Job_Date BETWEEN ? AND ? ORDER BY Job_Date",
+            (radar,) + tuple(date_range))
+        dates = [row[0] for row in rows]
+        series = [(stat, [row[index] for row in rows])
+                  for index, stat in enumerate(stats, 1)]
+        return dates, series
+
+    _, rows = cache.query(
+        RADAR_ROLLUP_QUERY,
+        (source, resolution, radar) + _period_range(date_range, resolution))
+    stats, periods, grid = pivot_rows(rows)
+    row_of = {stat: i for i, stat in enumerate(stats)}
+    series = [(stat, grid[row_of[stat]])
+              for stat in ROLLUP_STATS[source] if stat in row_of]
+    return list(periods), series
+
+
+def stat_rows(cache, stat, date_range, resolution=RAW):
+    """(radar, value, date) rows of one statistic, for pivot_rows."""
+    if resolution == RAW:
+        return cache.query(stat_query(stat), tuple(date_range))[1]
+    return cache.query(
+        STAT_ROLLUP_QUERY,
+        (stat_table(stat), resolution, stat) + _period_range(date_range, resolution))[1]
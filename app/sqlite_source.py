@@ -0,0 +1,231 @@
+"""
+A stand-in for the MariaDB server holding the SASS-C job databases, made of
+one SQLite file per job database.
+
+SQLiteSourcePool answers the calls the ingester makes on a
+mysql.connector pool: the job databases are listed from the files of a
+directory, and the job queries run unchanged on the tables of each file, so
+main.py (with --sqlite-source) and the benchmarks exercise the real ingest
+path without a database server. generate_jobs() writes such job databases
+with synthetic source tables.
+"""
+
+import os
+import re
+import sqlite3
+import zlib
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from app.ingest import JOB_TABLES_QUERY, SOURCE_TABLES
+
+JOB_PREFIX = "job_verifsassuser_"
+JOB_SUFFIX = ".db"
+# Target reports per radar in each job, for the detection rates
+DEFAULT_REPORTS_PER_RADAR = 500
+
+SOURCE_SCHEMA = (
+    "CREATE TABLE LE_DS (DS_ID INTEGER PRIMARY KEY, DS_NAME TEXT)",
+    "CREATE TABLE DS_RADAR (DS_ID INTEGER PRIMARY KEY, RADAR_TYPE_ID INTEGER)",
+    """CREATE TABLE AN_RADAR_BIASES (
+        DS_ID INTEGER, RADAR_MODE TEXT, ACTION_ID INTEGER,
+        TIME_OFFSET_CALC_S REAL, RANGE_BIAS_CALC_M REAL, RANGE_GAIN_CALC REAL,
+        AZIMUTH_BIAS_CALC_DEG REAL, ECC_VALUE_CALC_DEG REAL,
+        ECC_ANGLE_CALC_DEG REAL)""",
+    """CREATE TABLE AN_RADAR_NOISES (
+        DS_ID INTEGER, RADAR_MODE TEXT, ACTION_ID INTEGER,
+        RANGE_ERROR_SD_CALC_M REAL, AZIMUTH_ERROR_SD_CALC_DEG REAL)""",
+    "CREATE TABLE AN_ACTIONS_OTR (DS_ID INTEGER, ACTION_ID INTEGER)",
+    "CREATE TABLE SD_RADAR (REC_NUM INTEGER PRIMARY KEY, DS_ID INTEGER)",
+    """CREATE TABLE AN_TR_RT_ASSOCIATIONS (
+        DS_ID INTEGER, REC_NUM INTEGER, DETECTION_P INTEGER,
+        DETECTION_S INTEGER, DETECTION_M INTEGER, DETECTION_PS INTEGER,
+        DETECTION_PM INTEGER)""",
+)
+
+_USE = re.compile(r"\s*USE\s+`([^`]+)`\s*;?\s*$", re.IGNORECASE)
+_CHECKSUM_TABLE = re.compile(r"\s*CHECKSUM\s+TABLE\s+(.+)$", re.IGNORECASE)
+_QUALIFIED_TABLE = re.compile(r"`([^`]+)`\.`([^`]+)`")
+# COUNT(...) / COUNT(...) divides integers in SQLite, not in MariaDB
+_COUNT_DIVISION = re.compile(r"\)\s*/\s*COUNT\(")
+
+
+def sqlite_dialect(query):
+    """A MariaDB job query, rewritten to give the same results in SQLite."""
+    return _COUNT_DIVISION.sub(") * 1.0 / COUNT(", query)
+
+
+class SQLiteSourceCursor:
+    """Cursor of a SQLiteSourceConnection, buffered or not alike."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._connection = None
+        self._cursor = None
+        self._rows = None
+
+    def execute(self, query):
+        match = _USE.match(query)
+        if match:
+            self._use(match.group(1))
+        elif query == JOB_TABLES_QUERY:
+            self._rows = iter(list_job_tables(self.directory))
+        elif _CHECKSUM_TABLE.match(query):
+            self._rows = iter(checksum_tables(
+                self.directory, _QUALIFIED_TABLE.findall(query)))
+        else:
+            if self._connection is None:
+                raise sqlite3.OperationalError("No database selected")
+            self._rows = None
+            self._cursor = self._connection.execute(sqlite_dialect(query))
+
+    def _use(self, database):
+        path = _job_path(self.directory, database)
+        if not os.path.exists(path):
+            raise sqlite3.OperationalError(f"Unknown database '{database}'")
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    def fetchmany(self, size):
+        if self._rows is not None:
+            return [row for _, row in zip(range(size), self._rows)]
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        if self._rows is not None:
+            return list(self._rows)
+        return self._cursor.fetchall()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class SQLiteSourceConnection:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def cursor(self, buffered=True):  # pylint: disable=unused-argument
+        return SQLiteSourceCursor(self.directory)
+
+    def close(self):
+        pass
+
+
+class SQLiteSourcePool:
+    """Stands in for a mysql.connector pool, over a directory of job databases."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get_connection(self):
+        return SQLiteSourceConnection(self.directory)
+
+
+def _job_path(directory, database):
+    return os.path.join(directory, database + JOB_SUFFIX)
+
+
+def list_job_tables(directory):
+    """Rows of JOB_TABLES_QUERY for the job databases of a directory.
+
+    The file's modification time stands in for the tables' creation and
+    update times, and its size for their row estimates.
+    """
+    rows = []
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if entry.name.startswith(JOB_PREFIX) and entry.name.endswith(JOB_SUFFIX):
+            stat = entry.stat()
+            modified = datetime.fromtimestamp(stat.st_mtime)
+            rows.extend((entry.name[:-len(JOB_SUFFIX)], table, modified,
+                         modified, stat.st_size)
+                        for table in sorted(SOURCE_TABLES))
+    return rows
+
+
+def checksum_tables(directory, tables):
+    """Rows of CHECKSUM TABLE for (database, table) pairs.
+
+    A CRC-32 of the whole job database stands in for each table's, so a job
+    database is only ingested again once its contents change.
+    """
+    checksums = {}
+    rows = []
+    for database, table in tables:
+        if database not in checksums:
+            with open(_job_path(directory, database), "rb") as job_file:
+                checksums[database] = zlib.crc32(job_file.read())
+        rows.append((f"{database}.{table}", checksums[database]))
+    return rows
+
+
+def write_job_database(path, radars, antenna_types, rng,
+                       reports_per_radar=DEFAULT_REPORTS_PER_RADAR):
+    """Writes a job database with synthetic source tables."""
+    count = len(radars)
+    ds_ids = np.arange(1, count + 1)
+    modes = len(antenna_types)
+    bias_ids = np.repeat(ds_ids, modes).tolist()
+    bias_modes = np.tile(antenna_types, count).tolist()
+    reports = count * reports_per_radar
+    report_ids = np.repeat(ds_ids, reports_per_radar).tolist()
+    # 0 or 1 mostly, 2 where the detection doesn't apply
+    detections = rng.choice(3, size=(5, reports), p=(0.1, 0.85, 0.05)).tolist()
+
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            for statement in SOURCE_SCHEMA:
+                connection.execute(statement)
+            connection.executemany("INSERT INTO LE_DS VALUES (?, ?)",
+                                   zip(ds_ids.tolist(), radars))
+            connection.executemany(
+                "INSERT INTO DS_RADAR VALUES (?, ?)",
+                ((ds_id, 1 + ds_id % 3) for ds_id in ds_ids.tolist()))
+            connection.executemany(
+                "INSERT INTO AN_RADAR_BIASES VALUES (?, ?, 2, ?, ?, ?, ?, ?, ?)",
+                zip(bias_ids, bias_modes,
+                    rng.uniform(-1, 1, len(bias_ids)).tolist(),
+                    rng.uniform(-100, 100, len(bias_ids)).tolist(),
+                    rng.uniform(0.999, 1.001, len(bias_ids)).tolist(),
+                    rng.uniform(-10, 10, len(bias_ids)).tolist(),
+                    rng.uniform(-5, 5, len(bias_ids)).tolist(),
+                    rng.uniform(0, 360, len(bias_ids)).tolist()))
+            connection.executemany(
+                "INSERT INTO AN_RADAR_NOISES VALUES (?, ?, 2, ?, ?)",
+                zip(bias_ids, bias_modes,
+                    rng.uniform(0, 5, len(bias_ids)).tolist(),
+                    rng.uniform(0, 2, len(bias_ids)).tolist()))
+            connection.executemany("INSERT INTO AN_ACTIONS_OTR VALUES (?, 2)",
+                                   ((ds_id,) for ds_id in ds_ids.tolist()))
+            connection.executemany("INSERT INTO SD_RADAR VALUES (?, ?)",
+                                   enumerate(report_ids, start=1))
+            connection.executemany(
+                "INSERT INTO AN_TR_RT_ASSOCIATIONS VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip(report_ids, range(1, reports + 1), *detections))
+    finally:
+        connection.close()
+
+
+def generate_jobs(directory, radars, antenna_types, jobs, seed=None,
+                  end_date=None, reports_per_radar=DEFAULT_REPORTS_PER_RADAR):
+    """Writes one job database per day for `jobs` days ending on end_date.
+
+    Existing job databases are replaced. Returns their names.
+    """
+    rng = np.random.default_rng(seed)
+    end_date = end_date or date.today()
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for offset in range(jobs - 1, -1, -1):
+        job_date = end_date - timedelta(days=offset)
+        name = f"{JOB_PREFIX}{job_date:%Y%m%d}"
+        path = os.path.join(directory, name + JOB_SUFFIX)
+        if os.path.exists(path):
+            os.remove(path)
+        write_job_database(path, radars, antenna_types, rng, reports_per_radar)
+        names.append(name)
+    return names
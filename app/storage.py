@@ -0,0 +1,511 @@
+"""
+Schema and bulk write path of the local SQLite database (rqmData.db).
+
+Both the ingester (main.py) and the fake data generator write through this
+module: the schema is created once per connection and rows are inserted in
+batches with executemany, one transaction per batch.
+"""
+
+import os
+import sqlite3
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+from urllib.request import pathname2url
+
+DATA_DB = "rqmData.db"
+
+# Stored in PRAGMA user_version; see MIGRATIONS
+SCHEMA_VERSION = 7
+
+# Pragmas applied to connections that write large batches
+INGEST_PRAGMAS = (
+    # Readers (the dashboard) keep working while a job is being written
+    ("journal_mode", "WAL"),
+    # Durable at transaction boundaries in WAL mode, without a sync per commit
+    ("synchronous", "NORMAL"),
+    # 64 MiB page cache (negative values are in KiB)
+    ("cache_size", -65536),
+    ("temp_store", "MEMORY"),
+)
+
+BIASES_COLUMNS = (
+    "Radar_Name", "Antenna_Type", "Time_Bias", "Range_Bias", "Range_Gain",
+    "Azimuth_Bias", "Range_Noise", "Azimuth_Noise", "Ecc_Value", "Ecc_Angle",
+    "Job_Date",
+)
+
+DETECTION_RATES_COLUMNS = (
+    "ds_name", "ds_type", "pdP", "pdS", "pdM", "pdPS", "pdPM", "Job_Date",
+)
+
+# Column holding the radar name in each data table
+RADAR_COLUMNS = {
+    "biases": "Radar_Name",
+    "detection_rates": "ds_name",
+}
+
+# Column holding the antenna type in each data table
+ANTENNA_COLUMNS = {
+    "biases": "Antenna_Type",
+    "detection_rates": "ds_type",
+}
+
+# Natural key of each data table: one row per radar, day and antenna type.
+# Missing antenna types are keyed as '' so they conflict like any other.
+UNIQUE_KEYS = {
+    "biases": "Radar_Name, Job_Date, COALESCE(Antenna_Type, '')",
+    "detection_rates": "ds_name, Job_Date, COALESCE(ds_type, '')",
+}
+
+# Expression reading each rolled up statistic; missing detection rates are
+# stored as -1 and left out of the aggregates
+ROLLUP_STATS = {
+    "biases": {stat: stat for stat in BIASES_COLUMNS[2:-1]},
+    "detection_rates": {stat: f"NULLIF({stat}, -1)"
+                        for stat in DETECTION_RATES_COLUMNS[2:-1]},
+}
+
+# First day of the period holding Job_Date; weeks start on Monday
+ROLLUP_PERIODS = {
+    "week": "date(Job_Date, '-' || ((strftime('%w', Job_Date) + 6) % 7) || ' days')",
+    "month": "date(Job_Date, 'start of month')",
+}
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS biases (
+        Radar_Name TEXT,
+        Antenna_Type TEXT,
+        Time_Bias REAL,
+        Range_Bias REAL,
+        Range_Gain REAL,
+        Azimuth_Bias REAL,
+        Range_Noise REAL,
+        Azimuth_Noise REAL,
+        Ecc_Value REAL,
+        Ecc_Angle REAL,
+        Job_Date TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS detection_rates (
+        ds_name TEXT,
+        ds_type INT,
+        pdP REAL,
+        pdS REAL,
+        pdM REAL,
+        pdPS REAL,
+        pdPM REAL,
+        Job_Date TEXT
+    )''',
+    # Ledger of the job databases already ingested
+    '''CREATE TABLE IF NOT EXISTS ingested_jobs (
+        database_name TEXT PRIMARY KEY,
+        Job_Date TEXT,
+        checksum TEXT,
+        biases_rows INT,
+        detection_rows INT,
+        ingested_at TEXT,
+        fingerprint TEXT
+    )''',
+    # Write counter bumped by every transaction that changes the data, so
+    # readers (e.g. the dashboard caches) can tell when their copy is stale
+    '''CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )''',
+    # Weekly and monthly aggregates of every statistic, see refresh_rollups
+    '''CREATE TABLE IF NOT EXISTS rollups (
+        source TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        radar TEXT NOT NULL,
+        stat TEXT NOT NULL,
+        period TEXT NOT NULL,
+        antenna_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        total REAL,
+        minimum REAL,
+        maximum REAL,
+        PRIMARY KEY (source, resolution, radar, stat, period, antenna_type)
+    ) WITHOUT ROWID''',
+    # EWMA state of every statistic after its last point, see app.control
+    '''CREATE TABLE IF NOT EXISTS control_state (
+        source TEXT NOT NULL,
+        radar TEXT NOT NULL,
+        antenna_type TEXT NOT NULL,
+        stat TEXT NOT NULL,
+        Job_Date TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        std REAL NOT NULL,
+        PRIMARY KEY (source, radar, antenna_type, stat)
+    ) WITHOUT ROWID''',
+    # Points outside the EWMA control limits of the points before them
+    '''CREATE TABLE IF NOT EXISTS control_anomalies (
+        source TEXT NOT NULL,
+        radar TEXT NOT NULL,
+        antenna_type TEXT NOT NULL,
+        stat TEXT NOT NULL,
+        Job_Date TEXT NOT NULL,
+        value REAL NOT NULL,
+        lower REAL NOT NULL,
+        upper REAL NOT NULL,
+        PRIMARY KEY (source, radar, Job_Date, antenna_type, stat)
+    ) WITHOUT ROWID''',
+    # EWMA control limits every point was checked against: float32 lower
+    # then upper limits of every statistic, in ROLLUP_STATS order
+    '''CREATE TABLE IF NOT EXISTS control_bands (
+        source TEXT NOT NULL,
+        radar TEXT NOT NULL,
+        Job_Date TEXT NOT NULL,
+        antenna_type TEXT NOT NULL,
+        limits BLOB NOT NULL,
+        PRIMARY KEY (source, radar, Job_Date, antenna_type)
+    ) WITHOUT ROWID''',
+)
+
+# Job_Date is stored as ISO-8601 text (yyyy-mm-dd), so these indexes serve
+# per-radar lookups and date ranges in date order
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_biases_date ON biases (Job_Date)",
+    "CREATE INDEX IF NOT EXISTS idx_detection_rates_date ON detection_rates (Job_Date)",
+    # One statistic of every radar over a range of periods
+    "CREATE INDEX IF NOT EXISTS idx_rollups_stat ON rollups (source, resolution, stat, period)",
+)
+
+# The unique keys also serve per-radar lookups in date order; created by
+# migration 3, once duplicates are removed
+KEY_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_biases_radar_date "
+    f"ON biases ({UNIQUE_KEYS['biases']})",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_detection_rates_radar_date "
+    f"ON detection_rates ({UNIQUE_KEYS['detection_rates']})",
+)
+
+
+def _upsert(table, columns, values):
+    """INSERT replacing the row with the same key, unless it is unchanged."""
+    key = (RADAR_COLUMNS[table], ANTENNA_COLUMNS[table], "Job_Date")
+    updated = [column for column in columns if column not in key]
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values}) "
+        f"ON CONFLICT ({UNIQUE_KEYS[table]}) DO UPDATE SET "
+        + ", ".join(f"{column} = excluded.{column}" for column in updated)
+        # Rewriting identical rows would only churn pages and the WAL
+        + f" WHERE ({', '.join(updated)}) IS NOT "
+        f"({', '.join(f'excluded.{column}' for column in updated)})"
+    )
+
+
+INSERT_BIASES = _upsert("biases", BIASES_COLUMNS,
+                        ", ".join("?" * len(BIASES_COLUMNS)))
+
+# Missing detection rates are stored as -1, normalized by SQLite while inserting
+INSERT_DETECTION_RATES = _upsert(
+    "detection_rates", DETECTION_RATES_COLUMNS,
+    "?, ?, COALESCE(?, -1), COALESCE(?, -1), COALESCE(?, -1), "
+    "COALESCE(?, -1), COALESCE(?, -1), ?")
+
+# MySQL returns DECIMAL results (e.g. the detection rates) as Decimal
+sqlite3.register_adapter(Decimal, float)
+
+
+def apply_ingest_pragmas(connection):
+    """Tunes a connection for bulk writes."""
+    for name, value in INGEST_PRAGMAS:
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+def create_schema(connection):
+    """Creates the tables and indexes if they don't exist."""
+    with connection:
+        for statement in SCHEMA + INDEXES:
+            connection.execute(statement)
+
+
+def _migrate_iso_dates(connection):
+    """Rewrites Job_Date from dd/mm/yyyy text or datetime text to yyyy-mm-dd."""
+    for table in ("biases", "detection_rates", "ingested_jobs"):
+        # Written by main.py and the rust ingester
+        connection.execute(
+            f"""UPDATE {table}
+            SET Job_Date = substr(Job_Date, 7, 4) || '-' || substr(Job_Date, 4, 2)
+                || '-' || substr(Job_Date, 1, 2)
+            WHERE Job_Date GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]'""")
+        # Written by generateFakeData.py ("yyyy-mm-dd hh:mm:ss.ffffff")
+        connection.execute(
+            f"""UPDATE {table}
+            SET Job_Date = substr(Job_Date, 1, 10)
+            WHERE Job_Date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]?*'""")
+
+
+def _add_antenna_type_column(connection):
+    """Adds detection_rates.ds_type, missing from the tables created by
+    earlier versions of generateFakeData.py."""
+    columns = [row[1] for row in
+               connection.execute("PRAGMA table_info(detection_rates)")]
+    if "ds_type" not in columns:
+        connection.execute("ALTER TABLE detection_rates ADD COLUMN ds_type INT")
+
+
+def _build_rollups(connection):
+    """Fills the rollups of the data stored before they existed."""
+    # The rollups are grouped by antenna type
+    _add_antenna_type_column(connection)
+    refresh_rollups(connection, *data_date_bounds(connection))
+
+
+def remove_duplicates(connection):
+    """Keeps the last written row of every key; returns the rows removed.
+
+    The rollups of the data are rebuilt if any row was removed.
+    """
+    removed = 0
+    for table, key in UNIQUE_KEYS.items():
+        removed += connection.execute(
+            f"DELETE FROM {table} WHERE rowid NOT IN "
+            f"(SELECT MAX(rowid) FROM {table} GROUP BY {key})").rowcount
+    if removed:
+        connection.execute("DELETE FROM rollups")
+        refresh_rollups(connection, *data_date_bounds(connection))
+    return removed
+
+
+def _add_unique_keys(connection):
+    """Removes the rows stored more than once and keys the data tables."""
+    remove_duplicates(connection)
+    for table in UNIQUE_KEYS:
+        # Replaced by the unique key of the same name
+        connection.execute(f"DROP INDEX IF EXISTS idx_{table}_radar_date")
+    for statement in KEY_INDEXES:
+        connection.execute(statement)
+
+
+def _build_control_limits(connection):
+    """Computes the control limits of the data stored before they existed."""
+    # app.control builds on this module
+    from app.control import rebuild_control
+
+    rebuild_control(connection)
+
+
+def _drop_control_points(connection):
+    """Replaces the control limits stored for every point by the state of
+    every series and its anomalies."""
+    connection.execute("DROP TABLE IF EXISTS control_points")
+    # Already built by migration 4 on databases upgraded from before it
+    if not connection.execute("SELECT 1 FROM control_state LIMIT 1").fetchone():
+        _build_control_limits(connection)
+
+
+def _add_ledger_fingerprints(connection):
+    """Adds ingested_jobs.fingerprint; the jobs ingested before it are
+    checksummed once on the next run."""
+    columns = [row[1] for row in
+               connection.execute("PRAGMA table_info(ingested_jobs)")]
+    if "fingerprint" not in columns:
+        connection.execute("ALTER TABLE ingested_jobs ADD COLUMN fingerprint TEXT")
+
+
+def _build_control_bands(connection):
+    """Stores the control limits of every point, so the dashboard reads the
+    bands of the shown dates instead of recomputing them."""
+    _build_control_limits(connection)
+
+
+# Upgrade steps, keyed by the schema version they produce
+MIGRATIONS = {
+    1: _migrate_iso_dates,
+    2: _build_rollups,
+    3: _add_unique_keys,
+    4: _build_control_limits,
+    5: _drop_control_points,
+    6: _add_ledger_fingerprints,
+    7: _build_control_bands,
+}
+
+
+def schema_version(connection):
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection):
+    """Upgrades the database to SCHEMA_VERSION, returning the applied versions."""
+    create_schema(connection)
+    applied = []
+    for version in range(schema_version(connection) + 1, SCHEMA_VERSION + 1):
+        with connection:
+            MIGRATIONS[version](connection)
+            connection.execute(f"PRAGMA user_version = {version}")
+            bump_data_version(connection)
+        applied.append(version)
+    if applied:
+        connection.execute("ANALYZE")
+    return applied
+
+
+def connect_for_ingest(path=DATA_DB):
+    """Opens the database for bulk writes, creating or upgrading the schema if needed."""
+    connection = sqlite3.connect(path)
+    apply_ingest_pragmas(connection)
+    migrate(connection)
+    return connection
+
+
+def connect_read_only(path=DATA_DB, immutable=False, check_same_thread=True):
+    """Opens the database for reading only.
+
+    immutable=True also skips locking and change detection, so it must only
+    be used on a copy of the database that nothing writes to any more.
+    """
+    uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    return sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+
+
+def with_job_date(rows, job_date):
+    """Appends the job date to every row."""
+    return (tuple(row) + (job_date, ) for row in rows)
+
+
+def insert_biases(cursor, rows):
+    """Inserts bias rows, each ending with its Job_Date."""
+    cursor.executemany(INSERT_BIASES, rows)
+
+
+def insert_detection_rates(cursor, rows):
+    """Inserts detection rate rows, each ending with its Job_Date."""
+    cursor.executemany(INSERT_DETECTION_RATES, rows)
+
+
+INSERTERS = {
+    "biases": insert_biases,
+    "detection_rates": insert_detection_rates,
+}
+
+
+def insert_rows(cursor, table, rows):
+    """Inserts rows into "biases" or "detection_rates"."""
+    INSERTERS[table](cursor, rows)
+
+
+def bump_data_version(cursor):
+    """Marks the data as changed; call inside the transaction that changes it."""
+    cursor.execute(
+        "INSERT INTO data_version (id, version) VALUES (1, 1) "
+        "ON CONFLICT (id) DO UPDATE SET version = version + 1")
+
+
+def read_data_version(connection):
+    """Returns the write counter, or 0 for a database that has never been written to."""
+    try:
+        row = connection.execute(
+            "SELECT version FROM data_version WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        # Database created before the counter existed, or not created at all
+        return 0
+    return row[0] if row else 0
+
+
+def period_bounds(day, resolution):
+    """First and last day (yyyy-mm-dd) of the week or month holding a day."""
+    day = date.fromisoformat(day)
+    if resolution == "week":
+        first = day - timedelta(days=day.weekday())
+        last = first + timedelta(days=6)
+    elif resolution == "month":
+        first = day.replace(day=1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    else:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    return first.isoformat(), last.isoformat()
+
+
+# Each MIN/MAX is a single seek in a Job_Date index
+DATE_BOUNDS_QUERY = """
+    SELECT MIN(first), MAX(last) FROM (
+        SELECT MIN(Job_Date) AS first, MAX(Job_Date) AS last FROM biases
+        UNION ALL
+        SELECT MIN(Job_Date), MAX(Job_Date) FROM detection_rates
+    )
+"""
+
+
+def data_date_bounds(cursor):
+    """Earliest and latest Job_Date of the data tables; (None, None) when empty."""
+    return cursor.execute(DATE_BOUNDS_QUERY).fetchone()
+
+
+def refresh_rollups(cursor, first_date, last_date):
+    """Recomputes the rollups of every week and month touching a date range.
+
+    Only those periods are read back from the data tables, so keeping the
+    rollups current costs a few weeks of rows per ingested job. Call inside
+    the transaction that changed the data.
+    """
+    if first_date is None:
+        return
+    for resolution, period in ROLLUP_PERIODS.items():
+        start = period_bounds(first_date, resolution)[0]
+        end = period_bounds(last_date, resolution)[1]
+        for source, stats in ROLLUP_STATS.items():
+            placeholders = ", ".join("?" * len(stats))
+            cursor.execute(
+                f"DELETE FROM rollups WHERE source = ? AND resolution = ? "
+                f"AND stat IN ({placeholders}) AND period BETWEEN ? AND ?",
+                (source, resolution, *stats, start, end))
+
+            # One pass over the rows aggregates every statistic at once
+            radar = RADAR_COLUMNS[source]
+            antenna = f"COALESCE(CAST({ANTENNA_COLUMNS[source]} AS TEXT), '')"
+            aggregates = ", ".join(
+                f"COUNT({value}) AS count{index}, SUM({value}) AS total{index}, "
+                f"MIN({value}) AS minimum{index}, MAX({value}) AS maximum{index}"
+                for index, value in enumerate(stats.values()))
+            selects = " UNION ALL ".join(
+                f"SELECT :source, :resolution, radar, '{stat}', period, "
+                f"antenna_type, count{index}, total{index}, minimum{index}, "
+                f"maximum{index} FROM grouped WHERE count{index} > 0"
+                for index, stat in enumerate(stats))
+            cursor.execute(
+                f"WITH grouped AS MATERIALIZED ("
+                f"SELECT {radar} AS radar, {period} AS period, "
+                f"{antenna} AS antenna_type, {aggregates} FROM {source} "
+                f"WHERE Job_Date BETWEEN :start AND :end AND {radar} IS NOT NULL "
+                f"GROUP BY 1, 2, 3) "
+                f"INSERT INTO rollups (source, resolution, radar, stat, period, "
+                f"antenna_type, count, total, minimum, maximum) {selects}",
+                {'source': source, 'resolution': resolution,
+                 'start': start, 'end': end})
+
+
+def record_job(cursor, database, job_date, checksum, fingerprint,
+               biases_rows, detection_rows, ingested_at):
+    """Records an ingested job database in the ledger."""
+    cursor.execute(
+        "INSERT OR REPLACE INTO ingested_jobs (database_name, Job_Date, "
+        "checksum, fingerprint, biases_rows, detection_rows, ingested_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (database, job_date, checksum, fingerprint, biases_rows,
+         detection_rows, ingested_at))
+
+
+def record_fingerprints(cursor, fingerprints):
+    """Updates the fingerprint of ingested jobs whose contents didn't change,
+    from (database, fingerprint) pairs."""
+    cursor.executemany(
+        "UPDATE ingested_jobs SET fingerprint = ? WHERE database_name = ?",
+        ((fingerprint, database) for database, fingerprint in fingerprints))
+
+
+# A job database already ingested, as recorded in the ledger
+LedgerEntry = namedtuple("LedgerEntry", ["fingerprint", "checksum"])
+
+
+def load_ledger(connection):
+    """Returns the fingerprint and checksum of every job database already
+    ingested, as {database: LedgerEntry}."""
+    return {
+        database: LedgerEntry(fingerprint, checksum)
+        for database, fingerprint, checksum in connection.execute(
+            "SELECT database_name, fingerprint, checksum FROM ingested_jobs")
+    }
@@ -1,6 +1,49 @@
+import re
+from datetime import date, datetime, timedelta
+
+# Dates embedded in job database names, e.g. "..._20231001" or "..._01-10-2023"
+JOB_NAME_DATE = re.compile(
+    r"(?<!\d)(?:\d{4}[-_]?\d{2}[-_]?\d{2}|\d{2}[-_]?\d{2}[-_]?\d{4})(?!\d)")
+
+# Bounds of an open date range; yyyy-mm-dd dates compare correctly as text
+MIN_DATE = "0000-01-01"
+MAX_DATE = "9999-12-31"
+
+
 def validate_date(date_str):
     try:
         day, month, year = map(int, date_str.split("/"))
         return 1 <= day <= 31 and 1 <= month <= 12 and 1900 <= year <= 2999
     except ValueError:
-        return False
\ No newline at end of file
+        return False
+
+
+def to_iso_date(date_str):
+    """Converts a "dd/mm/yyyy" date to the "yyyy-mm-dd" form stored in the database."""
+    return datetime.strptime(date_str, "%d/%m/%Y").strftime("%Y-%m-%d")
+
+
+def job_date_from_name(name):
+    """Returns the "dd/mm/yyyy" date embedded in a job database name, or None."""
+    for match in JOB_NAME_DATE.finditer(name):
+        digits = re.sub(r"\D", "", match.group())
+        for date_format in ("%Y%m%d", "%d%m%Y"):
+            try:
+                date_str = datetime.strptime(
+                    digits, date_format).strftime("%d/%m/%Y")
+            except ValueError:
+                continue
+            if validate_date(date_str):
+                return date_str
+    return None
+
+
+def date_range_or_all(start_date, end_date):
+    """(start, end) yyyy-mm-dd bounds for a Job_Date BETWEEN; missing ends are open."""
+    return ((start_date or MIN_DATE)[:10], (end_date or MAX_DATE)[:10])
+
+
+def date_window(end_date, days):
+    """The (start, end) yyyy-mm-dd range of `days` days ending on `end_date`."""
+    end = date.fromisoformat(end_date[:10]) if end_date else date.today()
+    return (end - timedelta(days=days - 1)).isoformat(), end.isoformat()
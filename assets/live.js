@@ -0,0 +1,130 @@
+/*
+ * Live mode: appends the points of newly ingested jobs (see app/live.py) to
+ * the open figures, in the browser, instead of fetching the figures again.
+ * The radar figures are drawn from the radar-data store (see radar.js), so
+ * their points are appended there.
+ *
+ * Traces arrive as base64 typed arrays ({dtype, bdata}), which
+ * Plotly.extendTraces can't extend, so the matching traces are decoded and
+ * returned with the new points appended.
+ */
+(function () {
+    var TYPED_ARRAYS = {
+        f8: Float64Array, f4: Float32Array, i4: Int32Array, i2: Int16Array,
+        i1: Int8Array, u4: Uint32Array, u2: Uint16Array, u1: Uint8Array
+    };
+
+    function toArray(values) {
+        if (!values) {
+            return [];
+        }
+        if (values.bdata !== undefined) {
+            var binary = atob(values.bdata);
+            var bytes = new Uint8Array(binary.length);
+            for (var i = 0; i < binary.length; i++) {
+                bytes[i] = binary.charCodeAt(i);
+            }
+            return Array.from(new TYPED_ARRAYS[values.dtype](bytes.buffer));
+        }
+        return Array.from(values);
+    }
+
+    // The table a figure of raw rows was built from; figures of rollups
+    // (means of whole periods) have none and are left alone
+    function liveSource(figure) {
+        var meta = figure && figure.layout && figure.layout.meta;
+        return meta && meta.live_source;
+    }
+
+    // Appends to the traces named in `additions` ({name: {x, y}})
+    function extendTraces(figure, additions) {
+        var extended = false;
+        var data = figure.data.map(function (trace) {
+            var addition = additions[trace.name];
+            if (!addition || !addition.x.length) {
+                return trace;
+            }
+            extended = true;
+            return Object.assign({}, trace, {
+                x: toArray(trace.x).concat(addition.x),
+                y: toArray(trace.y).concat(addition.y.map(function (value) {
+                    return value === null ? NaN : value;
+                }))
+            });
+        });
+        if (!extended) {
+            return window.dash_clientside.no_update;
+        }
+        return Object.assign({}, figure, {data: data});
+    }
+
+    // One trace per statistic of a radar
+    function extendRadarFigure(points, figure, radar) {
+        var source = liveSource(figure);
+        var radarPoints = source && points && points[source] &&
+            points[source][radar];
+        if (!radarPoints) {
+            return window.dash_clientside.no_update;
+        }
+        var additions = {};
+        Object.keys(radarPoints.y).forEach(function (stat) {
+            additions[stat] = {x: radarPoints.x, y: radarPoints.y[stat]};
+        });
+        return extendTraces(figure, additions);
+    }
+
+    // Both figures of the radar-data store
+    function extendRadarData(points, data) {
+        if (!data) {
+            return window.dash_clientside.no_update;
+        }
+        var extended = Object.assign({}, data);
+        var changed = false;
+        ['biases', 'detection_rates'].forEach(function (source) {
+            if (!data[source]) {
+                return;
+            }
+            var figure = extendRadarFigure(points, data[source], data.radar);
+            if (figure !== window.dash_clientside.no_update) {
+                extended[source] = figure;
+                changed = true;
+            }
+        });
+        return changed ? extended : window.dash_clientside.no_update;
+    }
+
+    // The last value of every x, as the Comparison tab's pivot keeps it
+    function lastPerX(x, y) {
+        var kept = {x: [], y: []};
+        x.forEach(function (value, index) {
+            if (index + 1 < x.length && x[index + 1] === value) {
+                return;
+            }
+            kept.x.push(value);
+            kept.y.push(y[index]);
+        });
+        return kept;
+    }
+
+    // One trace per radar, for one statistic
+    function extendStatFigure(points, figure, stat) {
+        var source = liveSource(figure);
+        if (!source || !points || !points[source]) {
+            return window.dash_clientside.no_update;
+        }
+        var additions = {};
+        Object.keys(points[source]).forEach(function (radar) {
+            var radarPoints = points[source][radar];
+            additions[radar] = lastPerX(radarPoints.x, radarPoints.y[stat]);
+        });
+        return extendTraces(figure, additions);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        live: {
+            extendRadarFigure: extendRadarFigure,
+            extendRadarData: extendRadarData,
+            extendStatFigure: extendStatFigure
+        }
+    });
+})();
@@ -0,0 +1,119 @@
+/*
+ * Tabs and radar figures drawn in the browser.
+ *
+ * Every tab's pane is part of the page and only shown or hidden here. The
+ * series of the selected radar are fetched once into the radar-data store
+ * ({radar, biases: figure, detection_rates: figure}, traces as base64 typed
+ * arrays), and the Bias and Probability figures are drawn from it, so
+ * switching tabs or series sends no request. Only zooms, and the Overview
+ * tab opened on a date range it wasn't built for, reach the server.
+ */
+(function () {
+    var no_update = function () {
+        return window.dash_clientside.no_update;
+    };
+
+    // One style per pane output, in the order of the outputs
+    function showPane(tab) {
+        var outputs = window.dash_clientside.callback_context.outputs_list;
+        return outputs.map(function (output) {
+            return output.id === 'pane-' + tab ? {} : {display: 'none'};
+        });
+    }
+
+    // Copies the radar picked on one tab to the other
+    function syncRadars(biasRadar, probabilityRadar) {
+        var triggered = window.dash_clientside.callback_context.triggered;
+        var radar = triggered.length &&
+            triggered[0].prop_id.indexOf('radar-dropdown-prob.') === 0 ?
+            probabilityRadar : biasRadar;
+        return [biasRadar === radar ? no_update() : radar,
+                probabilityRadar === radar ? no_update() : radar];
+    }
+
+    // The date range the Overview tab is built for, changed only while the
+    // tab is open and showing another range
+    function overviewRange(tab, startDate, endDate, builtRange) {
+        if (tab !== 'tab-4' || (builtRange && builtRange[0] === startDate &&
+                                builtRange[1] === endDate)) {
+            return no_update();
+        }
+        return [startDate, endDate];
+    }
+
+    // The relayout events of a radar graph that move its x axis; the
+    // others (e.g. the autosize of a graph first drawn) aren't sent
+    function radarZoom(biasRelayout, probabilityRelayout) {
+        var triggered = window.dash_clientside.callback_context.triggered;
+        if (!triggered.length) {
+            return no_update();
+        }
+        var graphId = triggered[0].prop_id.split('.')[0];
+        var relayout = graphId === 'bias-graph' ?
+            biasRelayout : probabilityRelayout;
+        var zoomed = Object.keys(relayout || {}).some(function (key) {
+            return key.indexOf('xaxis.range') === 0 || key === 'xaxis.autorange';
+        });
+        return zoomed ? {graph: graphId, relayout: relayout} : no_update();
+    }
+
+    // Unpicked statistics stay in the legend; the control bands of a
+    // statistic (its legendgroup) are dropped from it. Other traces, like
+    // the out of control markers, are left as they are.
+    function traceVisibility(trace, picked, stats) {
+        if (trace.legendgroup !== undefined) {
+            return picked[trace.legendgroup] ? trace.visible : false;
+        }
+        if (stats.indexOf(trace.name) === -1) {
+            return trace.visible;
+        }
+        return picked[trace.name] ? true : 'legendonly';
+    }
+
+    var SOURCES = {
+        'bias-graph': 'biases',
+        'probability-graph': 'detection_rates'
+    };
+
+    // The figure of a graph from the store, keeping the layout (template,
+    // axes, zoom) already in the browser
+    function drawFigure(data, series, options, figure, graphId) {
+        var stored = data && data[SOURCES[graphId]];
+        if (!stored) {
+            return no_update();
+        }
+        var stats = (options || []).map(function (option) {
+            return option.value;
+        });
+        var picked = {};
+        (series || []).forEach(function (stat) {
+            picked[stat] = true;
+        });
+        var traces = stored.data.map(function (trace) {
+            var visibility = traceVisibility(trace, picked, stats);
+            if (visibility === trace.visible) {
+                return trace;
+            }
+            return Object.assign({}, trace, {visible: visibility});
+        });
+        var layout = stored.layout || {};
+        return Object.assign({}, figure, {
+            data: traces,
+            layout: Object.assign({}, figure && figure.layout, {
+                title: layout.title || {},
+                uirevision: layout.uirevision,
+                meta: layout.meta || {}
+            })
+        });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        radar: {
+            showPane: showPane,
+            syncRadars: syncRadars,
+            overviewRange: overviewRange,
+            radarZoom: radarZoom,
+            drawFigure: drawFigure
+        }
+    });
+})();
@@ -0,0 +1,83 @@
+"""
+Compares the vectorized Comparison tab pivot (app.pivot.pivot_rows) with the
+original row-by-row loop at 10k, 100k and 1M rows.
+
+    python -m benchmarks.bench_pivot [--radars 20] [--loop-limit 100000]
+
+The original loop is O(rows x dates); above --loop-limit rows it is skipped
+and its time extrapolated from the largest measured size.
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from app.pivot import pivot_rows
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def loop_pivot(data):
+    """The original pivot of update_comparison_figure."""
+    radar_names = list(set([entry[0] for entry in data]))
+
+    # Initialize radar_data with None values for all dates
+    dates = sorted(list({entry[-1] for entry in data}))
+    radar_data = {radar: [None] * len(dates) for radar in radar_names}
+
+    # Populate radar_data with values, ensuring alignment with dates
+    for entry in data:
+        radar, value, date_str = entry
+        date_index = dates.index(date_str)
+        radar_data[radar][date_index] = value
+    return radar_names, dates, radar_data
+
+
+def make_rows(size, radars):
+    """`size` (radar, value, date) rows: one row per radar per day."""
+    start = date(2000, 1, 1)
+    days = size // radars
+    return [
+        (f"R{radar:03d}", random.uniform(0, 100),
+         (start + timedelta(days=day)).isoformat())
+        for day in range(days) for radar in range(radars)
+    ]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--radars', type=int, default=20)
+    parser.add_argument('--loop-limit', type=int, default=100_000)
+    args = parser.parse_args()
+    if args.loop_limit < SIZES[0]:
+        # The loop's time is extrapolated from at least one measured size
+        parser.error(f"--loop-limit must be at least {SIZES[0]}")
+
+    print(f"{'rows':>10} {'dates':>8} {'loop (s)':>12} {'pivot (s)':>10} {'speed-up':>9}")
+    last_loop = None
+    for size in SIZES:
+        rows = make_rows(size, args.radars)
+        dates = len(rows) // args.radars
+        pivot_time = timed(pivot_rows, rows)
+        if size <= args.loop_limit:
+            loop_time = timed(loop_pivot, rows)
+            last_loop = (size, loop_time)
+            loop_label = f"{loop_time:12.3f}"
+        else:
+            # Both the number of rows and of dates grow with the size
+            measured_size, measured_time = last_loop
+            loop_time = measured_time * (size / measured_size) ** 2
+            loop_label = f"~{loop_time:11.0f}"
+        print(f"{len(rows):>10} {dates:>8} {loop_label} {pivot_time:10.3f} "
+              f"{loop_time / pivot_time:8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,190 @@
-import sqlite3
-import random
-from datetime import datetime, timedelta
-
-DATA_DB = "rqmData.db"
-
-def generate_fake_data(num_days=3000):
-    conn = sqlite3.connect(DATA_DB)
-    cursor = conn.cursor()
-
-    # Create tables (using DATE data type for Job_Date)
-    cursor.execute('''
-        CREATE TABLE biases (
-            Radar_Name TEXT,
-            Antenna_Type TEXT,
-            Time_Bias REAL,
-            Range_Bias REAL,
-            Range_Gain REAL,
-            Azimuth_Bias REAL,
-            Range_Noise REAL,
-            Azimuth_Noise REAL,
-            Ecc_Value REAL,
-            Ecc_Angle REAL,
-            Job_Date DATE
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE detection_rates (
-            ds_name TEXT,
-            pdP REAL,
-            pdS REAL,
-            pdM REAL,
-            pdPS REAL,
-            pdPM REAL,
-            Job_Date DATE
-        )
-    ''')
-
-    # Insert fake data
-    radars = ['EBSZ', 'EBSH', 'EBBE', "EBFL", "EBLG", "EBOS"]
-    antenna_types = ['Type 1', 'Type 2']
-    start_date = datetime.now() - timedelta(days=num_days)
-
-    for i in range(num_days):
-        current_date = start_date + timedelta(days=i)
-        for radar in radars:
-            for antenna_type in antenna_types:
-                cursor.execute('''
-                    INSERT INTO biases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    radar,
-                    antenna_type,
-                    random.uniform(-1, 1),  # Time_Bias
-                    random.uniform(-100, 100),  # Range_Bias
-                    random.uniform(0.9, 1.1),  # Range_Gain
-                    random.uniform(-10, 10),  # Azimuth_Bias
-                    random.uniform(0, 5),  # Range_Noise
-                    random.uniform(0, 2),  # Azimuth_Noise
-                    random.uniform(-5, 5),  # Ecc_Value
-                    random.uniform(0, 360),  # Ecc_Angle
-                    current_date  # Store as a datetime object directly
-                ))
-
-                cursor.execute('''
-                    INSERT INTO detection_rates VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    radar,
-                    random.uniform(80, 100),  # pdP
-                    random.uniform(70, 90),  # pdS
-                    random.uniform(60, 80),  # pdM
-                    random.uniform(50, 70),  # pdPS
-                    random.uniform(40, 60),  # pdPM
-                    current_date  # Store as a datetime object directly
-                ))
-
-    conn.commit()
-    conn.close()
+"""
+Fills rqmData.db with synthetic radar statistics, for development and
+benchmarks.
+
+    python generateFakeData.py [--radars 6] [--antenna-types 2] [--days 3000]
+                               [--rows N] [--seed S] [--output rqmData.db]
+                               [--jobs-dir DIR] [--jobs 30]
+
+--rows picks the days, then the radars, giving about N bias rows, up to
+hundreds of millions: the history is kept to MAX_DAYS and more radars are
+added once it is full. Rows are drawn with NumPy and written a block of days
+at a time, so memory stays flat. Generating a range again replaces its rows.
+
+--jobs-dir also writes job databases for the SQLite stand-in of the MariaDB
+server (see app.sqlite_source), to run main.py without one.
+"""
+
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.control import refresh_control
+from app.storage import (DATA_DB, bump_data_version, connect_for_ingest,
+                         insert_biases, insert_detection_rates,
+                         refresh_rollups)
+
+DEFAULT_RADARS = ('EBSZ', 'EBSH', 'EBBE', "EBFL", "EBLG", "EBOS")
+DEFAULT_ANTENNA_TYPES = ('Type 1', 'Type 2')
+DEFAULT_DAYS = 3000
+# Longest history generated for --rows, ten years
+MAX_DAYS = 3650
+# Largest fleet generated for --rows
+MAX_RADARS = 100_000
+# Bias rows drawn and written at a time
+ROWS_PER_BLOCK = 500_000
+
+# Uniform (low, high) of every bias column, in table order
+BIAS_RANGES = (
+    (-1, 1),  # Time_Bias
+    (-100, 100),  # Range_Bias
+    (0.9, 1.1),  # Range_Gain
+    (-10, 10),  # Azimuth_Bias
+    (0, 5),  # Range_Noise
+    (0, 2),  # Azimuth_Noise
+    (-5, 5),  # Ecc_Value
+    (0, 360),  # Ecc_Angle
+)
+# Uniform (low, high) of pdP, pdS, pdM, pdPS and pdPM
+DETECTION_RANGES = ((80, 100), (70, 90), (60, 80), (50, 70), (40, 60))
+
+
+def radar_names(count):
+    """The default radars, then R0007, R0008... for larger fleets."""
+    names = list(DEFAULT_RADARS[:count])
+    names += [f"R{index:04d}" for index in range(len(names) + 1, count + 1)]
+    return names
+
+
+def antenna_type_names(count):
+    return [f"Type {index}" for index in range(1, count + 1)]
+
+
+def fleet_for_rows(rows, radars, antenna_types, max_days=MAX_DAYS):
+    """(radars, days) giving at least `rows` bias rows.
+
+    The days grow first, up to max_days, then the radars. Raises ValueError
+    when even MAX_RADARS radars can't hold the rows.
+    """
+    days = max(1, -(-rows // (radars * antenna_types)))
+    if days > max_days:
+        radars = -(-rows // (max_days * antenna_types))
+        if radars > MAX_RADARS:
+            raise ValueError(
+                f"{rows} rows need more than {MAX_RADARS} radars over "
+                f"{max_days} days; add antenna types")
+        days = -(-rows // (radars * antenna_types))
+    return radars, days
+
+
+def uniform_columns(rng, ranges, size):
+    """One list of `size` uniform draws per (low, high) range."""
+    return [rng.uniform(low, high, size).tolist() for low, high in ranges]
+
+
+def _write_block(cursor, rng, dates, radars, antenna_types, radar_types):
+    """Inserts the rows of every radar on a block of days."""
+    per_day = len(radars) * len(antenna_types)
+    biases = zip(
+        np.tile(np.repeat(radars, len(antenna_types)), len(dates)).tolist(),
+        np.tile(antenna_types, len(dates) * len(radars)).tolist(),
+        *uniform_columns(rng, BIAS_RANGES, len(dates) * per_day),
+        np.repeat(dates, per_day).tolist())
+    insert_biases(cursor, biases)
+
+    detection_rates = zip(
+        np.tile(radars, len(dates)).tolist(),
+        np.tile(radar_types, len(dates)).tolist(),
+        *uniform_columns(rng, DETECTION_RANGES, len(dates) * len(radars)),
+        np.repeat(dates, len(radars)).tolist())
+    insert_detection_rates(cursor, detection_rates)
+
+
+def generate_fake_data(path=DATA_DB, radars=DEFAULT_RADARS, days=DEFAULT_DAYS,
+                       antenna_types=DEFAULT_ANTENNA_TYPES, seed=None,
+                       end_date=None):
+    """Writes `days` days of data ending on end_date (default today).
+
+    Returns the number of bias and detection rate rows written.
+    """
+    rng = np.random.default_rng(seed)
+    radars, antenna_types = list(radars), list(antenna_types)
+    # radar_type_id of the source; stable per radar
+    radar_types = [1 + index % 3 for index in range(len(radars))]
+    end_date = end_date or date.today()
+    first = np.datetime64(end_date - timedelta(days=days - 1), 'D')
+    all_dates = np.arange(first, first + days).astype(str)
+    days_per_block = max(1, ROWS_PER_BLOCK // (len(radars) * len(antenna_types)))
+
+    conn = connect_for_ingest(path)
+    try:
+        for start in range(0, days, days_per_block):
+            dates = all_dates[start:start + days_per_block]
+            with conn:
+                cursor = conn.cursor()
+                for table in ("biases", "detection_rates"):
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE Job_Date BETWEEN ? AND ?",
+                        (dates[0], dates[-1]))
+                _write_block(cursor, rng, dates, radars, antenna_types,
+                             radar_types)
+                cursor.close()
+                # Each block extends the rollups and control states of the
+                # ones before it, so no step reads more than a block of days
+                refresh_rollups(conn, dates[0], dates[-1])
+                refresh_control(conn, dates[0])
+                bump_data_version(conn)
+    finally:
+        conn.close()
+    return days * len(radars) * len(antenna_types), days * len(radars)
+
+
+def parse_args():
+    """The arguments, with --rows resolved into radars and days."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--radars', type=int, default=len(DEFAULT_RADARS))
+    parser.add_argument('--antenna-types', type=int,
+                        default=len(DEFAULT_ANTENNA_TYPES))
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS)
+    parser.add_argument('--rows', type=int, default=None,
+                        help="target number of bias rows; overrides --days, "
+                             "and --radars once MAX_DAYS are filled")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default=DATA_DB)
+    parser.add_argument('--jobs-dir', default=None,
+                        help="also write job databases for app.sqlite_source here")
+    parser.add_argument('--jobs', type=int, default=30,
+                        help="number of daily job databases, ending today")
+    args = parser.parse_args()
+    if args.rows:
+        try:
+            args.radars, args.days = fleet_for_rows(args.rows, args.radars,
+                                                    args.antenna_types)
+        except ValueError as error:
+            parser.error(str(error))
+    return args
+
+
+def main():
+    args = parse_args()
+    radars = radar_names(args.radars)
+    antenna_types = antenna_type_names(args.antenna_types)
+    days = args.days
+
+    biases, detection_rates = generate_fake_data(
+        args.output, radars, days, antenna_types, args.seed)
+    print(f"Wrote {biases} bias and {detection_rates} detection rate rows "
+          f"for {len(radars)} radars over {days} days to {args.output}.")
+
+    if args.jobs_dir:
+        from app.sqlite_source import generate_jobs
+
+        written = generate_jobs(args.jobs_dir, radars, antenna_types,
+                                args.jobs, args.seed)
+        print(f"Wrote {len(written)} job databases to {args.jobs_dir}.")
+
 
 if __name__ == "__main__":
-    generate_fake_data()
\ No newline at end of file
+    main()
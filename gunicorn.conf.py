@@ -0,0 +1,48 @@
+"""
+Production settings of the dashboard:
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+RADAR_BIND, RADAR_WORKERS and RADAR_THREADS override the address, the worker
+processes and the threads per worker. Workers share their figures through
+the cache file in RADAR_SHARED_CACHE, and add up their /metrics in
+PROMETHEUS_MULTIPROC_DIR.
+"""
+
+import multiprocessing
+import os
+import shutil
+import time
+
+bind = os.environ.get("RADAR_BIND", "0.0.0.0:8051")
+workers = int(os.environ.get("RADAR_WORKERS", multiprocessing.cpu_count() + 1))
+threads = int(os.environ.get("RADAR_THREADS", 4))
+worker_class = "gthread"
+# Figures of long ranges can take a while on a cold cache
+timeout = 120
+
+# Read by run_dash.py when the app is loaded, below
+os.environ.setdefault("RADAR_SHARED_CACHE", "dashboard_cache.db")
+# Must be set before prometheus_client is imported, and start empty
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "metrics")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+# Load the app once in the master, so the warm-up below is shared by every
+# worker through the shared cache
+preload_app = True
+
+
+def when_ready(server):
+    import wsgi
+
+    started = time.monotonic()
+    built = wsgi.warm_up()
+    server.log.info("Warmed up %d figures in %.1f s", built,
+                    time.monotonic() - started)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,179 +1,195 @@
-import mysql.connector
-import sqlite3
-from datetime import datetime
+"""
+Ingests radar biases and detection rates from the SASS-C job databases on the
+remote MariaDB server into the local SQLite database.
+
+Runs unattended: only jobs that are new or changed since the last run are
+queried, and job dates are resolved from the database names or metadata. Jobs
+are told apart from information_schema first; only those that look new or
+changed are checksummed, in parallel.
+
+The MySQL fetch and SQLite write time of every job is printed, and served in
+Prometheus format during the run with --metrics-port. Set RADAR_PROFILE_DIR
+to dump a cProfile of the run.
+
+With --sqlite-source DIR, job databases are read from SQLite files instead
+(see app.sqlite_source and generateFakeData.py --jobs-dir), e.g. to try or
+benchmark the ingest without a MariaDB server.
+"""
+
+import argparse
 import configparser
-from app.utils import validate_date
-
-# Create a ConfigParser object and read the config file
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-# Replace with your actual connection details
-mysql_host = config['Credentials']['mysqlhost']
-mysql_user = config['Credentials']['mysql_user']
-mysql_password = config['Credentials']['mysql_password']
-
-# Provided SQL queries
-biases_query = """
-    SELECT
-        d.DS_NAME AS "Radar Name",
-        b.RADAR_MODE AS "Antenna Type",
-        ROUND(COALESCE(b.TIME_OFFSET_CALC_S, -1), 5) AS "Time Bias",
-        ROUND(COALESCE(b.RANGE_BIAS_CALC_M, -1), 5) AS "Range Bias",
-        ROUND(COALESCE((b.RANGE_GAIN_CALC - 1) * 1852, -1), 5) AS "Range Gain",
-        ROUND(COALESCE(b.AZIMUTH_BIAS_CALC_DEG, -1), 5) AS "Azimuth Bias",
-        ROUND(COALESCE(n.RANGE_ERROR_SD_CALC_M, -1), 5) AS "Range Noise",
-        ROUND(COALESCE(n.AZIMUTH_ERROR_SD_CALC_DEG, -1), 5) AS "Azimuth Noise",
-        ROUND(COALESCE(b.ECC_VALUE_CALC_DEG, -1), 5) AS "Ecc Value",
-        ROUND(COALESCE(b.ECC_ANGLE_CALC_DEG, -1), 5) AS "Ecc Angle"
-    FROM AN_RADAR_BIASES b
-    LEFT JOIN AN_RADAR_NOISES n 
-        ON  b.DS_ID = n.DS_ID
-        AND b.RADAR_MODE = n.RADAR_MODE
-        AND b.ACTION_ID = n.ACTION_ID
-    INNER JOIN LE_DS d ON b.DS_ID = d.DS_ID
-    WHERE b.ACTION_ID = 2;
-
-    """
-
-detection_rate_query = """
-        SELECT
-        d.DS_NAME AS ds_name,
-        r.radar_type_id AS ds_type,
-        COUNT(CASE WHEN tra.detection_P = 1 THEN 1 ELSE NULL END) /
-        COUNT(CASE WHEN tra.detection_P IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdP,
-        COUNT(CASE WHEN tra.detection_S = 1 THEN 1 ELSE NULL END) /
-        COUNT(CASE WHEN tra.detection_S IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdS,
-        COUNT(CASE WHEN tra.detection_M = 1 THEN 1 ELSE NULL END) /
-        COUNT(CASE WHEN tra.detection_M IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdM,
-        COUNT(CASE WHEN tra.detection_PS = 1 THEN 1 ELSE NULL END) /
-        COUNT(CASE WHEN tra.detection_PS IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdPS,
-        COUNT(CASE WHEN tra.detection_PM = 1 THEN 1 ELSE NULL END) /
-        COUNT(CASE WHEN tra.detection_PM IN (0, 1) THEN 1 ELSE NULL END) * 100 AS pdPM
-    FROM
-        an_tr_rt_associations tra
-    JOIN
-        an_actions_otr a ON tra.ds_id = a.ds_id AND a.action_id = 2
-    JOIN
-        sd_radar s ON tra.REC_NUM = s.REC_NUM
-    JOIN
-        le_ds d ON s.ds_id = d.ds_id
-    JOIN
-        ds_radar r ON s.ds_id = r.ds_id
-    GROUP BY
-        d.DS_NAME
-    ORDER BY
-        d.DS_NAME;
-    """
-
-# Connect to the remote MariaDB server
-mysql_connection = mysql.connector.connect(host=mysql_host,
-                                           user=mysql_user,
-                                           password=mysql_password)
-
-# Create an SQLite database and connect to it
-sqlite_connection = sqlite3.connect('rqmData.db')
-sqlite_cursor = sqlite_connection.cursor()
-
-# Execute the provided SQL queries
-try:
-    if mysql_connection.is_connected():
-        mysql_cursor = mysql_connection.cursor()
-
-        # Find databases that begin with "job_verifsassuser_"
-        mysql_cursor.execute("SHOW DATABASES LIKE 'job_verifsassuser_%'")
-        databases_to_query = [
-            database[0] for database in mysql_cursor.fetchall()
-        ]
-
-        for database in databases_to_query:
-            # Prompt the user for the date of the job in "dd/mm/yyyy" format
-            job_date_str = input(
-                f"Enter the date for job '{database}' (dd/mm/yyyy): ")
-
-            if validate_date(job_date_str):
-                job_date = datetime.strptime(job_date_str, "%d/%m/%Y")
-                job_date_formatted = job_date.strftime("%d/%m/%Y")
-
-                # Format the datetime object as a string in the desired format (dd/mm/yyyy)
-                job_date_formatted = job_date.strftime("%d/%m/%Y")
-
-                # Create the "biases" table if it doesn't exist
-                sqlite_cursor.execute('''CREATE TABLE IF NOT EXISTS biases (
-                    Radar_Name TEXT,
-                    Antenna_Type TEXT,
-                    Time_Bias REAL,
-                    Range_Bias REAL,
-                    Range_Gain REAL,
-                    Azimuth_Bias REAL,
-                    Range_Noise REAL,
-                    Azimuth_Noise REAL,
-                    Ecc_Value REAL,
-                    Ecc_Angle REAL,
-                    Job_Date TEXT
-                )''')
-
-                # Create the "detection_rates" table if it doesn't exist
-                sqlite_cursor.execute(
-                    '''CREATE TABLE IF NOT EXISTS detection_rates (
-                    ds_name TEXT,
-                    ds_type INT,
-                    pdP REAL,
-                    pdS REAL,
-                    pdM REAL,
-                    pdPS REAL,
-                    pdPM REAL,
-                    Job_Date TEXT
-                )''')
-
-                # Execute the biases_query
-                mysql_cursor.execute(f"USE `{database}`")
-                mysql_cursor.execute(biases_query)
-                biases_results = mysql_cursor.fetchall()
-
-                # Insert data into the "biases" table with the date
-                for row in biases_results:
-                    # Insert data with column names explicitly listed
-                    sqlite_cursor.execute(
-                        "INSERT INTO biases (Radar_Name, Antenna_Type, Time_Bias, Range_Bias, Range_Gain, Azimuth_Bias, Range_Noise, Azimuth_Noise, Ecc_Value, Ecc_Angle, Job_Date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (row + (job_date_formatted, )))
-
-                # Execute the detection_rate_query
-                mysql_cursor.execute(detection_rate_query)
-                detection_rate_results = mysql_cursor.fetchall()
-
-                # Insert data into the "detection_rates" table with the date
-                for row in detection_rate_results:
-                    # Convert numeric values to float or set to -1 if None
-                    ds_name = row[0]
-                    ds_type = row[1]
-                    pdP = float(row[2]) if row[2] is not None else -1
-                    pdS = float(row[3]) if row[3] is not None else -1
-                    pdM = float(row[4]) if row[4] is not None else -1
-                    pdPS = float(row[5]) if row[5] is not None else -1
-                    pdPM = float(row[6]) if row[6] is not None else -1
-
-                    sqlite_cursor.execute(
-                        "INSERT INTO detection_rates (ds_name, ds_type, pdP, pdS, pdM, pdPS, pdPM, Job_Date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                        (ds_name, ds_type, pdP, pdS, pdM, pdPS, pdPM,
-                         job_date_formatted))
-
-            else:
-
-                print(
-                    "Invalid date format. Please enter the date in 'dd/mm/yyyy' format (e.g., '01/01/2023')."
-                )
-
-    # Commit the changes to the SQLite database
-    sqlite_connection.commit()
-
-except mysql.connector.Error as e:
-    print("MySQL Error: ", e)
-
-finally:
-    if mysql_connection.is_connected():
-        mysql_cursor.close()
-        mysql_connection.close()
-
-    sqlite_cursor.close()
-    sqlite_connection.close()
+
+import mysql.connector
+from mysql.connector import pooling
+from prometheus_client import start_http_server
+
+from app.ingest import (DEFAULT_CHUNK_SIZE, DEFAULT_WORKERS, Job, changed_jobs,
+                        checksum_jobs, ingest_jobs, list_jobs, pending_jobs,
+                        resolve_job_date)
+from app.metrics import profiled
+from app.sqlite_source import SQLiteSourcePool
+from app.storage import (DATA_DB, connect_for_ingest, load_ledger,
+                         record_fingerprints)
+from app.utils import to_iso_date, validate_date
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help="number of job databases queried in parallel "
+             f"(default: [Ingest] workers in config.ini, or {DEFAULT_WORKERS})")
+    parser.add_argument(
+        '--chunk-size', type=int, default=None,
+        help="rows streamed from MySQL to SQLite at a time "
+             f"(default: [Ingest] chunk_size in config.ini, or {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument(
+        '--full', action='store_true',
+        help="re-ingest every job database, not only new or changed ones")
+    parser.add_argument(
+        '--interactive', action='store_true',
+        help="prompt for the date of jobs whose date can't be resolved")
+    parser.add_argument(
+        '--parquet-dir', default=None,
+        help="refresh the Parquet export in this directory after ingesting "
+             "(default: [Export] parquet_dir in config.ini; needs pyarrow)")
+    parser.add_argument(
+        '--sqlite-source', default=None, metavar='DIR',
+        help="read the job databases from the SQLite files in DIR instead of "
+             "the MariaDB server in config.ini")
+    parser.add_argument(
+        '--metrics-port', type=int, default=None,
+        help="serve the ingest metrics on http://127.0.0.1:PORT/metrics "
+             "while running")
+    return parser.parse_args()
+
+
+def prompt_job_date(database):
+    """Asks for the date of a job, returning None if the answer is invalid."""
+    # Prompt the user for the date of the job in "dd/mm/yyyy" format
+    job_date_str = input(
+        f"Enter the date for job '{database}' (dd/mm/yyyy): ")
+
+    if validate_date(job_date_str):
+        try:
+            # Stored as yyyy-mm-dd so dates sort and compare correctly
+            return to_iso_date(job_date_str)
+        except ValueError:
+            pass  # e.g. 31/02/2023
+
+    print(
+        "Invalid date format. Please enter the date in 'dd/mm/yyyy' format (e.g., '01/01/2023')."
+    )
+    return None
+
+
+def plan_jobs(jobs_metadata, interactive=False):
+    """Resolves the date of every pending job, skipping those without one."""
+    jobs = []
+    for metadata in jobs_metadata:
+        job_date_str = resolve_job_date(metadata.database, metadata.created)
+        if job_date_str is None and interactive:
+            job_date_str = prompt_job_date(metadata.database)
+        if job_date_str is None:
+            print(f"Skipping job '{metadata.database}': no valid job date.")
+            continue
+        jobs.append(Job(metadata.database, job_date_str, metadata.checksum,
+                        metadata.fingerprint))
+    return jobs
+
+
+def print_timings(timings):
+    """Prints the MySQL fetch and SQLite write time of every ingested job."""
+    for database, (fetch_seconds, write_seconds) in sorted(timings.items()):
+        print(f"  {database}: MySQL fetch {fetch_seconds:.2f} s, "
+              f"SQLite write {write_seconds:.2f} s")
+    if timings:
+        print(f"  total: MySQL fetch "
+              f"{sum(fetch for fetch, _ in timings.values()):.2f} s, "
+              f"SQLite write {sum(write for _, write in timings.values()):.2f} s")
+
+
+def main():
+    args = parse_args()
+    if args.metrics_port:
+        start_http_server(args.metrics_port, addr='127.0.0.1')
+
+    # Create a ConfigParser object and read the config file
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+
+    workers = args.workers or config.getint(
+        'Ingest', 'workers', fallback=DEFAULT_WORKERS)
+    # mysql.connector refuses pools larger than CNX_POOL_MAXSIZE
+    workers = max(1, min(workers, pooling.CNX_POOL_MAXSIZE))
+    chunk_size = max(1, args.chunk_size or config.getint(
+        'Ingest', 'chunk_size', fallback=DEFAULT_CHUNK_SIZE))
+
+    if args.sqlite_source:
+        mysql_pool = SQLiteSourcePool(args.sqlite_source)
+    else:
+        # Replace with your actual connection details
+        mysql_host = config['Credentials']['mysqlhost']
+        mysql_user = config['Credentials']['mysql_user']
+        mysql_password = config['Credentials']['mysql_password']
+
+        # One pooled connection per worker keeps the load on the server bounded
+        mysql_pool = pooling.MySQLConnectionPool(pool_name='rqm_ingest',
+                                                 pool_size=workers,
+                                                 host=mysql_host,
+                                                 user=mysql_user,
+                                                 password=mysql_password)
+
+    # Create the SQLite database and its schema, tuned for bulk writes
+    sqlite_connection = connect_for_ingest(DATA_DB)
+
+    try:
+        ledger = load_ledger(sqlite_connection)
+
+        mysql_connection = mysql_pool.get_connection()
+        try:
+            jobs_metadata = list_jobs(mysql_connection)
+        finally:
+            mysql_connection.close()
+
+        # Only the jobs that look new or changed are checksummed
+        checksummed = checksum_jobs(
+            mysql_pool, pending_jobs(jobs_metadata, ledger, full=args.full),
+            workers=workers)
+        pending, unchanged = changed_jobs(checksummed, ledger, full=args.full)
+        with sqlite_connection:
+            record_fingerprints(sqlite_connection,
+                                [(metadata.database, metadata.fingerprint)
+                                 for metadata in unchanged])
+        print(f"{len(pending)} of {len(jobs_metadata)} job database(s) "
+              "are new or changed.")
+
+        jobs = plan_jobs(pending, interactive=args.interactive)
+        timings = {}
+        with profiled('ingest'):
+            ingested = ingest_jobs(mysql_pool, jobs, sqlite_connection,
+                                   workers=workers, chunk_size=chunk_size,
+                                   timings=timings)
+        print(f"Ingested {len(ingested)} job database(s) "
+              f"with {workers} worker(s).")
+        print_timings(timings)
+
+        parquet_dir = args.parquet_dir or config.get(
+            'Export', 'parquet_dir', fallback=None)
+        if parquet_dir and ingested:
+            # Only the years of the new jobs are rewritten
+            from app.columnar import export_parquet
+            written = export_parquet(sqlite_connection, parquet_dir,
+                                     {job.job_date[:4] for job in jobs
+                                      if job.database in ingested})
+            print(f"Exported {written} Parquet partition(s) to {parquet_dir}.")
+
+    except mysql.connector.Error as e:
+        print("MySQL Error: ", e)
+
+    finally:
+        sqlite_connection.close()
+
+
+if __name__ == "__main__":
+    main()
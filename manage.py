@@ -0,0 +1,156 @@
+"""
+Maintenance commands for the local SQLite database.
+
+    python manage.py migrate    Upgrade rqmData.db to the current schema
+    python manage.py rollups    Rebuild the weekly and monthly rollups
+    python manage.py control    Rebuild the control limits and anomalies
+    python manage.py compact    Remove duplicate rows, then VACUUM and ANALYZE
+    python manage.py export-parquet [--years 2023 ...]
+                                Write the Parquet copy read by the dashboard's
+                                parquet backend (needs pyarrow)
+"""
+
+import argparse
+import os
+import sqlite3
+
+from app import control, storage
+
+
+def migrate(args):
+    """Applies every migration past the database's user_version: ISO-8601
+    dates, indexes, rollups, deduplicated unique keys, control limits and
+    ledger fingerprints."""
+    connection = sqlite3.connect(args.database)
+    try:
+        before = storage.schema_version(connection)
+        applied = storage.migrate(connection)
+    finally:
+        connection.close()
+
+    if applied:
+        print(f"Migrated {args.database} from schema version {before} "
+              f"to {applied[-1]}.")
+    else:
+        print(f"{args.database} is up to date "
+              f"(schema version {storage.SCHEMA_VERSION}).")
+
+
+def rollups(args):
+    """Recomputes every weekly and monthly rollup from the data tables."""
+    connection = storage.connect_for_ingest(args.database)
+    try:
+        with connection:
+            connection.execute("DELETE FROM rollups")
+            storage.refresh_rollups(connection,
+                                    *storage.data_date_bounds(connection))
+            storage.bump_data_version(connection)
+        count = connection.execute("SELECT COUNT(*) FROM rollups").fetchone()[0]
+    finally:
+        connection.close()
+    print(f"Rebuilt {count} rollups in {args.database}.")
+
+
+def control_limits(args):
+    """Recomputes the control limits of every statistic from the data tables."""
+    connection = storage.connect_for_ingest(args.database)
+    try:
+        with connection:
+            control.rebuild_control(connection)
+            storage.bump_data_version(connection)
+        series = connection.execute(
+            "SELECT COUNT(*) FROM control_state").fetchone()[0]
+        flagged = connection.execute(
+            "SELECT COUNT(*) FROM control_anomalies").fetchone()[0]
+    finally:
+        connection.close()
+    print(f"Rebuilt the control limits of {series} series in {args.database}, "
+          f"{flagged} points out of control.")
+
+
+def database_size(path):
+    """Bytes used by a database and its write-ahead log."""
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal")
+               if os.path.exists(path + suffix))
+
+
+def data_rows(path):
+    """Rows of the data tables; 0 for tables that don't exist yet."""
+    connection = sqlite3.connect(path)
+    try:
+        rows = 0
+        for table in storage.UNIQUE_KEYS:
+            try:
+                rows += connection.execute(
+                    f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            except sqlite3.OperationalError:
+                pass
+        return rows
+    finally:
+        connection.close()
+
+
+def compact(args):
+    """Removes duplicate rows, then rebuilds the file and its statistics."""
+    size, rows = database_size(args.database), data_rows(args.database)
+    # Migrating to the unique keys (schema version 3) removes the duplicates
+    connection = storage.connect_for_ingest(args.database)
+    try:
+        # Waits for the dashboard's read transactions rather than failing
+        connection.execute(f"PRAGMA busy_timeout = {args.timeout * 1000}")
+        connection.execute("VACUUM")
+        connection.execute("ANALYZE")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        connection.close()
+    print(f"Removed {rows - data_rows(args.database)} duplicate row(s); "
+          f"{args.database} went from {size / 2**20:.1f} MiB "
+          f"to {database_size(args.database) / 2**20:.1f} MiB.")
+
+
+def export_parquet(args):
+    """Writes the data tables as Parquet files partitioned by radar and year."""
+    from app.columnar import export_parquet as export
+
+    connection = storage.connect_for_ingest(args.database)
+    try:
+        written = export(connection, args.output, args.years)
+    finally:
+        connection.close()
+    print(f"Wrote {written} partition(s) to {args.output}.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=storage.DATA_DB,
+                        help=f"SQLite database (default: {storage.DATA_DB})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('migrate', help=migrate.__doc__).set_defaults(
+        handler=migrate)
+    commands.add_parser('rollups', help=rollups.__doc__).set_defaults(
+        handler=rollups)
+    commands.add_parser('control', help=control_limits.__doc__).set_defaults(
+        handler=control_limits)
+    compaction = commands.add_parser('compact', help=compact.__doc__)
+    compaction.add_argument('--timeout', type=int, default=60,
+                            help="seconds to wait for readers (default: 60)")
+    compaction.set_defaults(handler=compact)
+    export = commands.add_parser('export-parquet', help=export_parquet.__doc__)
+    export.add_argument('--output', default="parquet",
+                        help="directory of the Parquet files (default: parquet)")
+    export.add_argument('--years', nargs='+', default=None,
+                        help="only rewrite these years (default: all)")
+    export.set_defaults(handler=export_parquet)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
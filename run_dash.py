@@ -3,132 +3,292 @@ This Dash application visualizes and analyzes radar statistics data stored in an
 It provides interactive graphs and a report generation feature.
 """
 
-import io
-import sqlite3
+import os
+from urllib.parse import urlencode
 
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import ALL, ClientsideFunction, ctx, dcc, html, Input, Output, State
+from flask import Response, abort, jsonify, request
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import load_figure_template
 
-import pandas as pd
 import plotly.graph_objs as go
 
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, Spacer, Table, TableStyle, SimpleDocTemplate
+from app import jobs
+from app.backends import DEFAULT_BACKEND, create_backend
+from app.cache import QueryCache
+from app.export import (CONTENT_TYPES, TABLE_COLUMNS, parquet_available,
+                        stream_export)
+from app.figures import (DATE_XAXIS, base_figure, column_scores,
+                         control_traces, figure_patch, heatmap_trace,
+                         line_traces, max_points_for_width, visible_range)
+from app.fleet import METRICS, fleet_matrix, fleet_resolution, fleet_rows
+from app.metadata import Metadata
+from app.live import LIVE_POLL_MS, live_state, new_points
+from app.metrics import instrument_callbacks, profile_requests, render_metrics
+from app.pivot import pivot_columns, stat_table
+from app.rollups import RAW, RESOLUTION_TITLES, choose_resolution
+from app.storage import ROLLUP_STATS
+from app.utils import date_range_or_all, date_window
+
+# RADAR_DATA_DB points the dashboard at another database, e.g. a benchmark one
+DATA_DB = os.environ.get("RADAR_DATA_DB", "rqmData.db")
+REPORTS_DIR = "reports"
+PARQUET_DIR = "parquet"
+
+# Date range selected when the dashboard is opened, ending on the latest job
+DEFAULT_WINDOW_DAYS = 90
+# How often the Report tab asks for the progress of its report
+REPORT_POLL_MS = 1000
+# Window widths the figures are prepared for by warm_up(); None is the first
+# render, before the browser has reported its width
+WARM_UP_WIDTHS = (None, 1366, 1920)
+# Tabs in display order; their panes are built once per page and shown or
+# hidden in the browser, so switching tabs costs no request
+TABS = (
+    ('tab-1', 'Bias'),
+    ('tab-2', 'Probability'),
+    ('tab-3', 'Comparison'),
+    ('tab-4', 'Overview'),
+    ('tab-6', 'Fleet'),
+    ('tab-5', 'Report'),
+)
+# What the Fleet tab compares, and the metric it opens on
+FLEET_METRICS = (
+    ('zscore', 'Z-score'),
+    ('latest', 'Latest value'),
+    ('delta', 'Change from previous period'),
+)
+# Out of control points marked on a figure and listed under it
+ANOMALY_MARKERS = 1000
+ANOMALY_ROWS = 20
+
+# Query results and figures, invalidated whenever new data is ingested. Set
+# RADAR_SHARED_CACHE to a file path to share them between worker processes,
+# and RADAR_DB_IMMUTABLE=1 when serving a copy of the database nothing
+# writes to any more.
+cache = QueryCache(DATA_DB,
+                   shared_path=os.environ.get('RADAR_SHARED_CACHE') or None,
+                   immutable=os.environ.get('RADAR_DB_IMMUTABLE') == '1')
 
-LINES_MARKERS = 'lines+markers'
+# Where the figures read their data: "sqlite", or "parquet" to read raw rows
+# from the export written by 'python manage.py export-parquet'
+backend = create_backend(os.environ.get('RADAR_BACKEND', DEFAULT_BACKEND), cache,
+                         os.environ.get('RADAR_PARQUET_DIR', PARQUET_DIR))
 
-DATA_DB = "rqmData.db"
+# Reports are built in background processes and kept per data version
+report_jobs = jobs.ReportJobs(DATA_DB, REPORTS_DIR, cache.data_version)
 
-# Database functions
+# Radar names, date bounds and statistics, from cached indexed aggregates
+metadata = Metadata(cache)
 
-conn = sqlite3.connect(DATA_DB)
-cursor = conn.cursor()
-cursor.execute("SELECT * FROM detection_rates")  # Adjust the query as needed
-data = cursor.fetchall()
-column_names = [desc[0] for desc in cursor.description]
-df = pd.DataFrame(data, columns=column_names)
-conn.close()
 
-years = df['Job_Date'].unique()  # Assuming 'Job_Date' is your date column
-radars = df['ds_name'].unique()
+def resolution_for(date_range):
+    """Raw rows, weekly or monthly rollups, depending on the span shown."""
+    return choose_resolution(date_range, metadata.date_bounds())
 
 
 def get_all_radars():
     """Fetches a list of unique radar names from the database."""
-    conn_radars = sqlite3.connect(DATA_DB)  # Use a different name here
-    cursor = conn_radars.cursor()
-    cursor.execute("SELECT DISTINCT Radar_Name FROM biases")
-    radars = cursor.fetchall()
-    conn_radars.close()
-    return [{'label': radar[0], 'value': radar[0]} for radar in radars]
-
+    return [{'label': radar, 'value': radar} for radar in metadata.radars()]
 
 
 def get_all_stats():
-    return [
-        {
-            'label': 'pdP',
-            'value': 'pdP'
-        },
-        {
-            'label': 'pdS',
-            'value': 'pdS'
-        },
-        {
-            'label': 'pdM',
-            'value': 'pdM'
-        },
-        {
-            'label': 'pdPS',
-            'value': 'pdPS'
-        },
-        {
-            'label': 'pdPM',
-            'value': 'pdPM'
-        },
-        {
-            'label': 'Range Bias',
-            'value': 'Range_Bias'
-        },
-        {
-            'label': 'Azimuth Bias',
-            'value': 'Azimuth_Bias'
-        },
-        {
-            'label': 'Time Bias',
-            'value': 'Time_Bias'
-        },
-        # Add other biases as needed
-    ]
+    return [{'label': label, 'value': stat} for stat, label in metadata.stats()]
 
 
 # Initialize Dash app
 dbc_css = "https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css"
-# Theme is adjustable by changing dbc.themes.<themeName>, available themes are found here: https://hellodash.pythonanywhere.com/
+# Theme is adjustable by changing dbc.themes.<themeName>, available themes are
+# found here: https://hellodash.pythonanywhere.com/
 app = dash.Dash(__name__, suppress_callback_exceptions=True,
                 external_stylesheets=[dbc.themes.JOURNAL, dbc_css])
 app.title = "Radar Statistics"
 load_figure_template("journal")
 
+# WSGI application, for production servers (see wsgi.py)
+server = app.server
+# Callback timings for /metrics, and a cProfile per request if
+# RADAR_PROFILE_DIR is set
+instrument_callbacks(server)
+profile_requests(server)
 
-app.layout = dbc.Container(
-    children=[
-        html.H1("Radar Statistics"),
 
-        dbc.Tabs(  # Use dbc.Tabs instead of dcc.Tabs
-            id="tabs",
-            active_tab='tab-1',  # Use active_tab instead of value
-            children=[
+def default_date_range():
+    """The last DEFAULT_WINDOW_DAYS of data, as first shown by the date picker."""
+    first_date, last_date = metadata.date_bounds()
+    start_date, end_date = date_window(last_date, DEFAULT_WINDOW_DAYS)
+    return max(start_date, first_date or start_date), end_date
+
+
+def serve_layout():
+    """Builds the page on every load, so the default date range follows new data."""
+    first_date, last_date = metadata.date_bounds()
+    start_date, end_date = default_date_range()
+    return dbc.Container(
+        children=[
+            html.H1("Radar Statistics"),
+
+            # Applies to every graph; only this range is read from the database
+            dcc.DatePickerRange(
+                id='date-range',
+                min_date_allowed=first_date,
+                max_date_allowed=last_date,
+                start_date=start_date,
+                end_date=end_date,
+                display_format='YYYY-MM-DD',
+                clearable=True,
+                className="mb-2"
+            ),
+
+            dbc.Tabs(  # Use dbc.Tabs instead of dcc.Tabs
+                id="tabs",
+                active_tab=TABS[0][0],  # Use active_tab instead of value
                 # Use tab_id instead of value
-                dbc.Tab(label='Bias', tab_id='tab-1'),
-                dbc.Tab(label='Probability', tab_id='tab-2'),
-                dbc.Tab(label='Comparison', tab_id='tab-3'),
-                dbc.Tab(label='Overview', tab_id='tab-4'),
-                dbc.Tab(label='Report', tab_id='tab-5')
-            ]
-        ),
-
-        html.Div(id='tabs-content')
-    ],
-    className="dbc"
+                children=[dbc.Tab(label=label, tab_id=tab) for tab, label in TABS]
+            ),
+
+            # Appends newly ingested jobs to the open figures
+            dbc.Switch(id='live-mode', label="Live", value=False,
+                       persistence=True, className="mt-2"),
+
+            html.Div(id='tabs-content', children=[
+                html.Div(render_content(tab), id=f'pane-{tab}',
+                         style=None if tab == TABS[0][0] else {'display': 'none'})
+                for tab, _ in TABS
+            ]),
+
+            # Window width, used to cap the points sent per trace
+            dcc.Store(id='plot-width'),
+
+            # Series of the selected radar, drawn by the Bias and Probability
+            # tabs in the browser (see assets/radar.js)
+            dcc.Store(id='radar-data'),
+            # The x axis zoomed in a radar graph, {graph, relayout}
+            dcc.Store(id='radar-zoom'),
+            # The date range the Overview tab is built for
+            dcc.Store(id='overview-range'),
+
+            # The data the page was built from, and the points ingested since
+            dcc.Interval(id='live-poll', interval=LIVE_POLL_MS, disabled=True),
+            dcc.Store(id='live-version',
+                      data=live_state(cache.data_version.get(), last_date,
+                                      end_date)),
+            dcc.Store(id='live-points')
+        ],
+        className="dbc"
+    )
+
+
+app.layout = serve_layout
+
+app.clientside_callback(
+    "function(tab) { return window.innerWidth; }",
+    Output('plot-width', 'data'),
+    Input('tabs', 'active_tab')
+)
+
+
+app.clientside_callback(
+    "function(live) { return !live; }",
+    Output('live-poll', 'disabled'),
+    Input('live-mode', 'value')
+)
+
+
+@app.callback([Output('live-version', 'data'),
+               Output('live-points', 'data'),
+               Output('date-range', 'start_date'),
+               Output('date-range', 'end_date'),
+               Output('date-range', 'min_date_allowed'),
+               Output('date-range', 'max_date_allowed')],
+              Input('live-poll', 'n_intervals'),
+              [State('date-range', 'end_date'), State('live-version', 'data')],
+              prevent_initial_call=True)
+def poll_live_data(n_intervals, end_date, seen):
+    """Sends the rows ingested since the page last looked, if any.
+
+    They are only appended while the figures end at the latest data: under
+    the range they were extended under, or under a range picked since that
+    ends no earlier. A page built before there was any data gets the default
+    date range instead, so its figures are built again.
+    """
+    version = cache.data_version.get()
+    seen = seen or live_state(None, None, None)
+    if version == seen['version']:
+        raise PreventUpdate
+    first_date, latest_date = metadata.date_bounds()
+    since = seen['latest']
+    if not latest_date or (since and latest_date <= since):
+        # Only earlier days changed
+        return (live_state(version, since, seen['end']), dash.no_update,
+                dash.no_update, dash.no_update, dash.no_update, dash.no_update)
+    if since is None:
+        start_date, end_date = default_date_range()
+        return (live_state(version, latest_date, end_date), dash.no_update,
+                start_date, end_date, first_date, latest_date)
+    if end_date != seen['end'] and end_date and end_date[:10] < since:
+        # Another range is shown; it is left as picked
+        return (live_state(version, latest_date, None), dash.no_update,
+                dash.no_update, dash.no_update, first_date, latest_date)
+    return (live_state(version, latest_date, end_date),
+            new_points(cache, since), dash.no_update, dash.no_update,
+            first_date, latest_date)
+
+
+# Appended in the browser, see assets/live.js; the radar figures are redrawn
+# from the store, so their points go there
+app.clientside_callback(
+    ClientsideFunction('live', 'extendRadarData'),
+    Output('radar-data', 'data', allow_duplicate=True),
+    Input('live-points', 'data'),
+    State('radar-data', 'data'),
+    prevent_initial_call=True
+)
+app.clientside_callback(
+    ClientsideFunction('live', 'extendStatFigure'),
+    Output('comparison-graph', 'figure', allow_duplicate=True),
+    Input('live-points', 'data'),
+    [State('comparison-graph', 'figure'), State('stat-dropdown', 'value')],
+    prevent_initial_call=True
+)
+
+
+app.clientside_callback(
+    ClientsideFunction('radar', 'showPane'),
+    [Output(f'pane-{tab}', 'style') for tab, _ in TABS],
+    Input('tabs', 'active_tab')
+)
+
+# Both radar tabs show the same radar, the one in the store
+app.clientside_callback(
+    ClientsideFunction('radar', 'syncRadars'),
+    [Output('radar-dropdown', 'value'), Output('radar-dropdown-prob', 'value')],
+    [Input('radar-dropdown', 'value'), Input('radar-dropdown-prob', 'value')],
+    prevent_initial_call=True
 )
 
 
-# Use active_tab
-@app.callback(Output('tabs-content', 'children'), [Input('tabs', 'active_tab')])
+def series_checklist(checklist_id, source):
+    """Statistics drawn by a radar figure, toggled in the browser."""
+    stats = list(ROLLUP_STATS[source])
+    return dbc.Checklist(id=checklist_id, value=stats, inline=True,
+                         options=[{'label': stat, 'value': stat} for stat in stats],
+                         className="m-2")
+
+
 def render_content(tab):
+    """The pane of a tab, built once per page."""
     if tab == 'tab-1':
         return html.Div([
             dbc.Select(  # Use dbc.Select instead of dcc.Dropdown
                 id='radar-dropdown',
                 options=get_all_radars()
             ),
-            dcc.Graph(id='bias-graph')
+            series_checklist('bias-series', 'biases'),
+            dcc.Graph(id='bias-graph', figure=base_figure(), responsive=True),
+            html.Div(id='bias-anomalies')
         ])
     elif tab == 'tab-2':
         return html.Div([
@@ -136,7 +296,11 @@ def render_content(tab):
                 id='radar-dropdown-prob',
                 options=get_all_radars()
             ),
-            dcc.Graph(id='probability-graph')
+            series_checklist('probability-series', 'detection_rates'),
+            dcc.Graph(id='probability-graph',
+                      figure=base_figure(yaxis=dict(range=[0, 100])),
+                      responsive=True),
+            html.Div(id='probability-anomalies')
         ])
     elif tab == 'tab-3':
         return html.Div([
@@ -144,231 +308,497 @@ def render_content(tab):
                 id='stat-dropdown',
                 options=get_all_stats()
             ),
-            dcc.Graph(id='comparison-graph')
+            dcc.Graph(id='comparison-graph', figure=base_figure(),
+                      responsive=True)
         ])
     elif tab == 'tab-4':
         return html.Div(id='overview-content')
+    elif tab == 'tab-6':
+        return html.Div([
+            dbc.RadioItems(
+                id='fleet-metric',
+                options=[{'label': label, 'value': metric}
+                         for metric, label in FLEET_METRICS],
+                value=FLEET_METRICS[0][0],
+                inline=True,
+                className="m-2"
+            ),
+            dcc.Graph(id='fleet-graph', figure=base_figure(), responsive=True)
+        ])
     elif tab == 'tab-5':  # Content for the "Report" tab
+        first_date, last_date = metadata.date_bounds()
         return html.Div([
             dcc.DatePickerRange(
                 id='date-range-picker',
-                min_date_allowed=df['Job_Date'].min(),
-                max_date_allowed=df['Job_Date'].max(),
-                start_date=df['Job_Date'].min(),
-                end_date=df['Job_Date'].max()
+                min_date_allowed=first_date,
+                max_date_allowed=last_date,
+                start_date=first_date,
+                end_date=last_date
             ),
             dbc.Button("Generate Report", id='generate-report-button',
                        color="primary", className="m-2"),
-            dcc.Download(id="download-report")
+            dbc.Progress(id='report-progress', value=0, className="m-2"),
+            html.Div(id='report-status', className="m-2"),
+            # Polls the report job until its PDF is ready
+            dcc.Interval(id='report-poll', interval=REPORT_POLL_MS, disabled=True),
+            dcc.Store(id='report-job'),
+            dcc.Download(id="download-report"),
+
+            # Raw rows, streamed by the /export route
+            html.H4("Export data", className="mt-4"),
+            dcc.Dropdown(id='export-radars', options=get_all_radars(),
+                         multi=True, placeholder="All radars",
+                         className="m-2"),
+            dbc.Select(id='export-table', value='biases', options=[
+                {'label': 'Biases', 'value': 'biases'},
+                {'label': 'Detection rates', 'value': 'detection_rates'},
+            ], className="m-2"),
+            dbc.RadioItems(id='export-format', value='csv', inline=True,
+                           options=[{'label': 'CSV', 'value': 'csv'},
+                                    {'label': 'Parquet', 'value': 'parquet',
+                                     'disabled': not parquet_available()}],
+                           className="m-2"),
+            html.A(dbc.Button("Download data", color="secondary"),
+                   id='export-link', className="m-2")
         ])
 
 # Callbacks for graphs and other components
 
 
-@app.callback(Output('bias-graph', 'figure'),
-              [Input('radar-dropdown', 'value')])
-def update_bias_figure(selected_radar):
-    conn_bias = sqlite3.connect(DATA_DB)  # Use a different name here
-    cursor = conn_bias.cursor()
-    cursor.execute("SELECT * FROM biases WHERE Radar_Name=?", (selected_radar,))
-    data = cursor.fetchall()
-    conn_bias.close()
+def live_meta(source, resolution):
+    """Figure metadata telling assets/live.js which points it can append."""
+    return {'live_source': source} if resolution == RAW else {}
+
+
+def zoomed_date_range(relayout_data, date_range):
+    """The part of the selected date range visible in a zoomed graph.
+
+    Raises PreventUpdate for relayout events that don't change the x axis.
+    """
+    zoom = visible_range(relayout_data)
+    if zoom is None:
+        if 'xaxis.autorange' not in (relayout_data or {}):
+            raise PreventUpdate
+        return date_range
+    return max(date_range[0], zoom[0]), min(date_range[1], zoom[1])
+
+
+# Only the relayout events moving the x axis reach the server
+app.clientside_callback(
+    ClientsideFunction('radar', 'radarZoom'),
+    Output('radar-zoom', 'data'),
+    [Input('bias-graph', 'relayoutData'),
+     Input('probability-graph', 'relayoutData')],
+    prevent_initial_call=True
+)
 
-    if not data:
-        return go.Figure()
 
-    labels = [desc[0] for desc in cursor.description][2:-1]
-    dates = [entry[-1] for entry in data]
+@app.callback(Output('radar-data', 'data'),
+              [Input('radar-dropdown', 'value'),
+               Input('date-range', 'start_date'),
+               Input('date-range', 'end_date'),
+               Input('radar-zoom', 'data')],
+              State('plot-width', 'data'))
+def load_radar_data(selected_radar, start_date, end_date, zoom, plot_width):
+    """Both series of the selected radar, drawn in the browser.
 
+    The Bias and Probability tabs and their series checklists only redraw
+    from this store, so a radar is fetched once for both tabs.
+    """
+    if not selected_radar:
+        raise PreventUpdate
+    date_range = date_range_or_all(start_date, end_date)
+    max_points = max_points_for_width(plot_width)
+    # Zooming refetches the visible range of that graph only, in more
+    # detail once it is short
+    if ctx.triggered_id == 'radar-zoom' and zoom:
+        key, build = {
+            'bias-graph': ('biases', build_bias_figure),
+            'probability-graph': ('detection_rates', build_probability_figure),
+        }[zoom['graph']]
+        zoomed = zoomed_date_range(zoom['relayout'], date_range)
+        patch = dash.Patch()
+        patch[key] = build(selected_radar, zoomed, resolution_for(zoomed),
+                           max_points)
+        return patch
+    resolution = resolution_for(date_range)
     return {
-        'data': [
-            go.Scatter(x=dates,
-                       y=[entry[i + 2] for entry in data],
-                       mode=LINES_MARKERS,
-                       name=label) for i, label in enumerate(labels)
-        ],
-        'layout': go.Layout(title=f"Bias for {selected_radar}")
+        'radar': selected_radar,
+        'biases': build_bias_figure(selected_radar, date_range, resolution,
+                                    max_points),
+        'detection_rates': build_probability_figure(
+            selected_radar, date_range, resolution, max_points),
     }
 
 
-@app.callback(Output('probability-graph', 'figure'),
-              [Input('radar-dropdown-prob', 'value')])
-def update_probability_figure(selected_radar):
-    conn = sqlite3.connect(DATA_DB)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM detection_rates WHERE ds_name=?", (selected_radar,))
-    data = cursor.fetchall()
-    conn.close()
+# Figures drawn from the store and the series picked, see assets/radar.js
+for graph_id, series_id in (('bias-graph', 'bias-series'),
+                            ('probability-graph', 'probability-series')):
+    app.clientside_callback(
+        ClientsideFunction('radar', 'drawFigure'),
+        Output(graph_id, 'figure'),
+        [Input('radar-data', 'data'), Input(series_id, 'value')],
+        [State(series_id, 'options'), State(graph_id, 'figure'),
+         State(graph_id, 'id')]
+    )
+
+
+@cache.memoize
+def build_bias_figure(selected_radar, date_range, resolution, max_points):
+    dates, series = backend.radar_series('biases', selected_radar, date_range,
+                                         resolution)
+
+    if not len(dates):
+        return {'data': [], 'layout': go.Layout(xaxis=DATE_XAXIS)}
+
+    return {
+        'data': line_traces(dates, series, max_points)
+        + control_overlay('biases', selected_radar, date_range, resolution,
+                          max_points),
+        # Keeps the zoom while the visible range is refetched
+        'layout': go.Layout(
+            title=f"Bias for {selected_radar}{RESOLUTION_TITLES[resolution]}",
+            xaxis=DATE_XAXIS, uirevision=selected_radar,
+            meta=live_meta('biases', resolution))
+    }
+
 
-    if not data:
-        return go.Figure()
+@cache.memoize
+def build_probability_figure(selected_radar, date_range, resolution, max_points):
+    dates, series = backend.radar_series('detection_rates', selected_radar,
+                                         date_range, resolution)
 
-    labels = [desc[0] for desc in cursor.description][2:-1]
-    dates = [entry[-1] for entry in data]
+    if not len(dates):
+        return {'data': [], 'layout': go.Layout(xaxis=DATE_XAXIS)}
 
     return {
-        'data': [go.Scatter(x=dates, y=[entry[i+2] for entry in data], mode='lines+markers', name=label) for i, label in enumerate(labels)],
-        'layout': go.Layout(title=f"Probability for {selected_radar}", yaxis=dict(range=[0, 100]))
+        'data': line_traces(dates, series, max_points)
+        + control_overlay('detection_rates', selected_radar, date_range,
+                          resolution, max_points),
+        # Keeps the zoom while the visible range is refetched
+        'layout': go.Layout(
+            title=f"Probability for {selected_radar}{RESOLUTION_TITLES[resolution]}",
+            xaxis=DATE_XAXIS, yaxis=dict(range=[0, 100]),
+            uirevision=selected_radar,
+            meta=live_meta('detection_rates', resolution))
     }
 
 
+def control_overlay(source, radar, date_range, resolution, max_points):
+    """Control bands and out of control markers, over raw rows only."""
+    if resolution != RAW:
+        return []
+    return control_traces(
+        backend.control_limits(source, radar, date_range),
+        backend.anomalies(source, radar, date_range, ANOMALY_MARKERS),
+        max_points)
+
+
+@app.callback(Output('bias-anomalies', 'children'),
+              [Input('radar-dropdown', 'value'),
+               Input('date-range', 'start_date'),
+               Input('date-range', 'end_date')])
+def update_bias_anomalies(selected_radar, start_date, end_date):
+    return build_anomaly_table('biases', selected_radar,
+                               date_range_or_all(start_date, end_date))
+
+
+@app.callback(Output('probability-anomalies', 'children'),
+              [Input('radar-dropdown-prob', 'value'),
+               Input('date-range', 'start_date'),
+               Input('date-range', 'end_date')])
+def update_probability_anomalies(selected_radar, start_date, end_date):
+    return build_anomaly_table('detection_rates', selected_radar,
+                               date_range_or_all(start_date, end_date))
+
+
+@cache.memoize
+def build_anomaly_table(source, selected_radar, date_range):
+    """The latest out of control points of a radar, as flagged while ingesting."""
+    if not selected_radar:
+        return None
+    rows = backend.anomalies(source, selected_radar, date_range, ANOMALY_ROWS)
+    if not rows:
+        return html.P("No out of control points in this range.",
+                      className="text-muted m-2")
+    header = ["Date", "Antenna type", "Statistic", "Value", "Control limits"]
+    return dbc.Table([
+        html.Thead(html.Tr([html.Th(label) for label in header])),
+        html.Tbody([
+            html.Tr([html.Td(job_date), html.Td(antenna_type), html.Td(stat),
+                     html.Td(f"{value:.3f}"),
+                     html.Td(f"{lower:.3f} to {upper:.3f}")])
+            for job_date, antenna_type, stat, value, lower, upper in rows
+        ])
+    ], size="sm", striped=True, className="m-2")
+
+
 @app.callback(Output('comparison-graph', 'figure'),
-              [Input('stat-dropdown', 'value')])
-def update_comparison_figure(selected_stat):
-    if not selected_stat:
+              [Input('stat-dropdown', 'value'),
+               Input('date-range', 'start_date'),
+               Input('date-range', 'end_date')],
+              State('plot-width', 'data'))
+def update_comparison_figure(selected_stat, start_date, end_date, plot_width):
+    # Only the statistics offered by the dropdown have a table
+    if selected_stat not in {option['value'] for option in get_all_stats()}:
         raise dash.exceptions.PreventUpdate
+    date_range = date_range_or_all(start_date, end_date)
+    return figure_patch(
+        build_comparison_figure(selected_stat, date_range,
+                                resolution_for(date_range),
+                                max_points_for_width(plot_width)),
+        'title', 'meta')
 
-    conn = sqlite3.connect(DATA_DB)
-    cursor = conn.cursor()
 
-    if "Bias" in selected_stat:
-        table_name = "biases"
-        radar_column = "Radar_Name"
-    else:
-        table_name = "detection_rates"
-        radar_column = "ds_name"
+@cache.memoize
+def build_comparison_figure(selected_stat, date_range, resolution, max_points):
+    # One row per radar, one column per date
+    radar_names, dates, grid = pivot_columns(
+        *backend.stat_columns(selected_stat, date_range, resolution))
 
-    # Modify the query to handle Job_Date as a DATE and ensure sorting
-    cursor.execute(
-        f"SELECT {radar_column}, {selected_stat}, Job_Date FROM {
-            table_name} ORDER BY Job_Date"
-    )
-    data = cursor.fetchall()
-    conn.close()
+    return {
+        'data': line_traces(dates, zip(radar_names, grid), max_points),
+        'layout': go.Layout(
+            title=f"Comparison for {selected_stat}{RESOLUTION_TITLES[resolution]}",
+            xaxis=DATE_XAXIS,
+            meta=live_meta(stat_table(selected_stat), resolution))
+    }
 
-    radar_names = list(set([entry[0] for entry in data]))
 
-    # Initialize radar_data with None values for all dates
-    dates = sorted(list({entry[-1] for entry in data}))
-    radar_data = {radar: [None] * len(dates) for radar in radar_names}
+# One grouped pass over detection_rates; with a single MAX() aggregate,
+# SQLite takes the bare columns from the latest row of each radar
+OVERVIEW_SUMMARY_QUERY = """
+    SELECT ds_name, COUNT(*), MAX(Job_Date), pdP, pdS, pdM, pdPS, pdPM
+    FROM detection_rates
+    WHERE Job_Date BETWEEN ? AND ?
+        AND ds_name IN (SELECT DISTINCT Radar_Name FROM biases)
+    GROUP BY ds_name
+    ORDER BY ds_name
+"""
 
-    # Populate radar_data with values, ensuring alignment with dates
-    for entry in data:
-        radar, value, date = entry
-        date_index = dates.index(date)
-        radar_data[radar][date_index] = value
 
-    return {
-        'data': [
-            go.Scatter(x=dates,
-                       y=radar_data[radar],
-                       mode=LINES_MARKERS,
-                       name=radar) for radar in radar_names
-        ],
-        'layout': go.Layout(title=f"Comparison for {selected_stat}")
+# Written in the browser when the Overview tab is opened on a date range it
+# wasn't built for, so switching tabs sends no request
+app.clientside_callback(
+    ClientsideFunction('radar', 'overviewRange'),
+    Output('overview-range', 'data'),
+    [Input('tabs', 'active_tab'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')],
+    State('overview-range', 'data')
+)
 
-    }
 
+@app.callback(Output('overview-content', 'children'),
+              Input('overview-range', 'data'),
+              prevent_initial_call=True)
+def update_overview_figure(date_range):
+    """Built when the tab is first opened, then once per date range."""
+    if not date_range:
+        raise PreventUpdate
+    return build_overview(date_range_or_all(*date_range))
 
-@app.callback(Output('overview-content', 'children'), [Input('tabs', 'active_tab')])
-def update_overview_figure(tab):
-    if tab != 'tab-4':
-        raise dash.exceptions.PreventUpdate
 
-    conn = sqlite3.connect(DATA_DB)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT Radar_Name FROM biases")
-    radars = [radar[0] for radar in cursor.fetchall()]
-
-    radar_graphs = []
-    for idx, radar in enumerate(radars):
-        cursor.execute(
-            "SELECT * FROM detection_rates WHERE ds_name=?", (radar,))
-        radar_data = cursor.fetchall()
-
-        if radar_data:
-            labels = [desc[0] for desc in cursor.description][2:-1]
-            dates = [entry[-1] for entry in radar_data]
-            traces = [
-                go.Scatter(x=dates,
-                           y=[entry[i + 2] for entry in radar_data],
-                           mode=LINES_MARKERS,
-                           name=label) for i, label in enumerate(labels)
-            ]
-
-            radar_graph = html.Div(
-                dcc.Graph(id=f'overview-{radar}',
-                          figure={
-                              'data': traces,
-                              'layout': go.Layout(title=f"{radar}'s Stats")
-                }),
-                style={
-                    'width': '50%',
-                    'display': 'inline-block'
-                }
-                # Adjust the width to slightly less than 50% to account for padding/margins
-            )
-            radar_graphs.append(radar_graph)
-
-            # If index is odd (second graph in the pair), or it's the last graph, wrap the graphs in a row
-            if idx % 2 == 1 or idx == len(radars) - 1:
-                radar_graphs[-2:] = [
-                    html.Div(radar_graphs[-2:],
-                             style={
-                                 'width': '100%',
-                                 'display': 'inline-block'
-                    })
-                ]
-
-    conn.close()
-    return radar_graphs
+def build_overview(date_range):
+    """Summary of every radar; graphs are only built once an item is expanded."""
+    columns, summaries = cache.query(OVERVIEW_SUMMARY_QUERY, date_range)
+    labels = columns[3:]
+
+    items = []
+    for radar, entries, latest_date, *latest in summaries:
+        latest_values = ", ".join(
+            f"{label} {value:.1f}" for label, value in zip(labels, latest)
+            if value is not None)
+        items.append(dbc.AccordionItem(
+            dcc.Graph(id={'type': 'overview-graph', 'radar': radar}),
+            title=f"{radar}: {entries} entries, latest {latest_date} ({latest_values})",
+            item_id=radar
+        ))
+
+    return [
+        dbc.Accordion(items, id='overview-accordion', always_open=True,
+                      start_collapsed=True),
+        # Radars whose graph has already been sent to the browser
+        dcc.Store(id='overview-loaded', data=[])
+    ]
+
+
+@app.callback([Output({'type': 'overview-graph', 'radar': ALL}, 'figure'),
+               Output('overview-loaded', 'data')],
+              Input('overview-accordion', 'active_item'),
+              [State({'type': 'overview-graph', 'radar': ALL}, 'id'),
+               State('overview-loaded', 'data'),
+               State('date-range', 'start_date'),
+               State('date-range', 'end_date'),
+               State('plot-width', 'data')])
+def load_overview_graphs(active_items, graph_ids, loaded, start_date, end_date, plot_width):
+    """Fills in the graphs of newly expanded radars."""
+    if isinstance(active_items, str):
+        active_items = [active_items]
+    expanded = set(active_items or []) - set(loaded)
+    if not expanded:
+        raise PreventUpdate
+
+    date_range = date_range_or_all(start_date, end_date)
+    max_points = max_points_for_width(plot_width)
+    resolution = resolution_for(date_range)
+    figures = [
+        build_radar_overview_figure(graph_id['radar'], date_range, resolution,
+                                    max_points)
+        if graph_id['radar'] in expanded else dash.no_update
+        for graph_id in graph_ids
+    ]
+    return figures, loaded + sorted(expanded)
+
+
+@cache.memoize
+def build_radar_overview_figure(radar, date_range, resolution, max_points):
+    dates, series = backend.radar_series('detection_rates', radar, date_range,
+                                         resolution)
+    return {
+        'data': line_traces(dates, series, max_points),
+        'layout': go.Layout(title=f"{radar}'s Stats{RESOLUTION_TITLES[resolution]}",
+                            xaxis=DATE_XAXIS)
+    }
+
+
+@app.callback(Output('fleet-graph', 'figure'),
+              [Input('fleet-metric', 'value'),
+               Input('date-range', 'start_date'),
+               Input('date-range', 'end_date')])
+def update_fleet_figure(metric, start_date, end_date):
+    # Read off the matrix by name, so only its metrics are accepted
+    if metric not in METRICS:
+        raise PreventUpdate
+    date_range = date_range_or_all(start_date, end_date)
+    return build_fleet_figure(metric, date_range, resolution_for(date_range))
+
+
+@cache.memoize
+def build_fleet_figure(metric, date_range, resolution):
+    """Every radar against every statistic, from one query over the rollups."""
+    stats = metadata.stats()
+    matrix = fleet_matrix(fleet_rows(cache, date_range, resolution),
+                          metadata.radars(), [stat for stat, _ in stats])
+    values = getattr(matrix, metric)
+    # Statistics have different units, so only z-scores share a colour scale
+    colors = values if metric == 'zscore' else column_scores(values)
+    period = fleet_resolution(resolution)
+    return {
+        'data': [heatmap_trace(matrix.radars, [label for _, label in stats],
+                               values, colors, matrix.latest_periods)],
+        'layout': go.Layout(
+            title=f"Fleet {dict(FLEET_METRICS)[metric].lower()} "
+                  f"({period}ly means)",
+            xaxis=dict(side='top'), yaxis=dict(autorange='reversed'),
+            height=max(400, 30 * len(matrix.radars) + 150))
+    }
 
 
 @app.callback(
-    Output('download-report', 'data'),
-    Input('generate-report-button', 'n_clicks'),
-    State('date-range-picker', 'start_date'),
-    State('date-range-picker', 'end_date')
+    [Output('report-job', 'data'),
+     Output('report-poll', 'disabled'),
+     Output('report-progress', 'value'),
+     Output('report-status', 'children'),
+     Output('download-report', 'data')],
+    [Input('generate-report-button', 'n_clicks'),
+     Input('report-poll', 'n_intervals')],
+    [State('date-range-picker', 'start_date'),
+     State('date-range-picker', 'end_date'),
+     State('report-job', 'data')]
 )
-def generate_report(n_clicks, start_date, end_date):
-    if n_clicks is None:
+def generate_report(n_clicks, n_intervals, start_date, end_date, job):
+    """Starts a report job on click, then follows it until the PDF is sent."""
+    if ctx.triggered_id == 'generate-report-button':
+        if n_clicks is None:
+            raise PreventUpdate
+        # The pickers are empty while the database is
+        if not start_date or not end_date:
+            return (None, True, 0, "Pick the dates of the report first.",
+                    dash.no_update)
+        job = report_jobs.submit(start_date, end_date)
+    elif not job:
         raise PreventUpdate
 
-    # Fetch data from the database based on the date range
-    conn_report = sqlite3.connect(DATA_DB)  # Use a different name here
-    cursor = conn_report.cursor()
-    cursor.execute('''
-        SELECT * FROM detection_rates 
-        WHERE Job_Date BETWEEN ? AND ?
-    ''', (start_date, end_date))
-    data = cursor.fetchall()
-    conn.close()
-
-    # Create PDF document
-    buffer = io.BytesIO()  # Use an in-memory buffer
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-
-    # Add title and other content
-    styles = getSampleStyleSheet()
-    elements.append(Paragraph("Radar Statistics Report", styles['h1']))
-    elements.append(Paragraph(f"Date Range: {start_date} to {
-                    end_date}", styles['Normal']))
-    elements.append(Spacer(1, 12))  # Add some space
-
-    # Add table of data
-    table_data = [cursor.description] + data
-    table_data = [[Paragraph(str(cell), styles['Normal'])
-                   for cell in row] for row in table_data]
-
-    table = Table(table_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-
-    ]))
-    elements.append(table)
-
-    doc.build(elements)
-    # Return the PDF data for download
-    buffer.seek(0)
-    return dcc.send_bytes(buffer.getvalue(), 'radar_report.pdf')
+    status = report_jobs.status(job)
+    progress = round(status['progress'] * 100)
+    if status['state'] == jobs.DONE:
+        return (None, True, 100, "Report ready",
+                dcc.send_file(report_jobs.pdf_path(job),
+                              f"radar_report_{start_date}_{end_date}.pdf"))
+    if status['state'] == jobs.FAILED:
+        return None, True, 0, f"Report failed: {status['error']}", dash.no_update
+    return job, False, progress, f"Building report... {progress}%", dash.no_update
+
+
+@app.callback(Output('export-link', 'href'),
+              [Input('export-table', 'value'),
+               Input('export-format', 'value'),
+               Input('export-radars', 'value'),
+               Input('date-range-picker', 'start_date'),
+               Input('date-range-picker', 'end_date')])
+def update_export_link(table, file_format, radars, start_date, end_date):
+    """Points the download at the /export route, which streams the file."""
+    query = {'radar': radars or [], 'start': start_date or '',
+             'end': end_date or ''}
+    return f"/export/{table}.{file_format}?{urlencode(query, doseq=True)}"
+
+
+def warm_up():
+    """Builds the figures visitors open first, before any traffic arrives.
+
+    Returns the number of figures built or found in the cache.
+    """
+    date_range = default_date_range()
+    resolution = resolution_for(date_range)
+    built = 0
+    for max_points in sorted({max_points_for_width(width)
+                              for width in WARM_UP_WIDTHS}):
+        for radar in metadata.radars():
+            build_bias_figure(radar, date_range, resolution, max_points)
+            build_probability_figure(radar, date_range, resolution, max_points)
+            built += 2
+        for stat, _ in metadata.stats():
+            build_comparison_figure(stat, date_range, resolution, max_points)
+            built += 1
+    build_overview(date_range)
+    build_fleet_figure(FLEET_METRICS[0][0], date_range, resolution)
+    return built + 2
+
+
+@app.server.route('/cache/stats')
+def cache_stats():
+    """Hit and miss statistics of the query and figure cache."""
+    return jsonify(cache.stats())
+
+
+@app.server.route('/export/<table>.<file_format>')
+def export_data(table, file_format):
+    """Streams a table as CSV or Parquet, for ?radar=...&start=...&end=...
+
+    Rows are read and sent a chunk at a time, so large exports start at once
+    and use constant memory. All radars are exported when none is given.
+    """
+    if table not in TABLE_COLUMNS or file_format not in CONTENT_TYPES:
+        abort(404)
+    if file_format == 'parquet' and not parquet_available():
+        abort(501, "Parquet exports need pyarrow")
+    start_date = request.args.get('start') or None
+    end_date = request.args.get('end') or None
+    name = "_".join([table] + [day for day in (start_date, end_date) if day])
+    return Response(
+        stream_export(DATA_DB, table, file_format, request.args.getlist('radar'),
+                      date_range_or_all(start_date, end_date)),
+        content_type=CONTENT_TYPES[file_format],
+        headers={'Content-Disposition':
+                 f'attachment; filename="{name}.{file_format}"'})
+
+
+@app.server.route('/metrics')
+def prometheus_metrics():
+    """Callback, query and cache timings in Prometheus text format."""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
 
 
 if __name__ == "__main__":
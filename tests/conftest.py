@@ -0,0 +1,37 @@
+import pytest
+
+from app.storage import (
+    bump_data_version, connect_for_ingest, data_date_bounds, insert_biases,
+    insert_detection_rates, refresh_rollups)
+
+
+@pytest.fixture
+def bias_rows():
+    """Rows of the biases table in `database`; overridden by test modules."""
+    return []
+
+
+@pytest.fixture
+def rate_rows():
+    """Rows of the detection_rates table in `database`; overridden by test
+    modules."""
+    return []
+
+
+@pytest.fixture
+def database(tmp_path, bias_rows, rate_rows):
+    """(path, connection) of a database holding bias_rows and rate_rows, with
+    their rollups and control limits, as the ingester leaves it."""
+    # app.control needs numpy, which test modules skip without
+    from app.control import refresh_control
+
+    path = str(tmp_path / "rqmData.db")
+    connection = connect_for_ingest(path)
+    with connection:
+        insert_biases(connection.cursor(), bias_rows)
+        insert_detection_rates(connection.cursor(), rate_rows)
+        refresh_rollups(connection, *data_date_bounds(connection))
+        refresh_control(connection)
+        bump_data_version(connection)
+    yield path, connection
+    connection.close()
@@ -0,0 +1,326 @@
+"""
+Timings of the dashboard callbacks and of the ingest, on synthetic data.
+
+    pip install pytest-benchmark
+    RADAR_BENCH_DAYS=3650 RADAR_BENCH_RADARS=40 \
+        python -m pytest tests/test_benchmarks.py --benchmark-only
+
+The default dataset is small enough for the regular test run; raise the
+RADAR_BENCH_* variables for numbers close to production. Callbacks are posted
+through Flask like the browser does, with the cache cleared before each round.
+"""
+
+import base64
+import importlib
+import io
+import json
+import os
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+np = pytest.importorskip("numpy")
+
+from app.ingest import (Job, checksum_jobs, ingest_jobs, list_jobs,  # noqa: E402
+                        resolve_job_date)
+from app.report import write_report  # noqa: E402
+from app.sqlite_source import SQLiteSourcePool, generate_jobs  # noqa: E402
+from app.storage import connect_for_ingest  # noqa: E402
+from generateFakeData import (antenna_type_names, generate_fake_data,  # noqa: E402
+                              radar_names)
+
+BENCH_DAYS = int(os.environ.get("RADAR_BENCH_DAYS", 730))
+BENCH_RADARS = int(os.environ.get("RADAR_BENCH_RADARS", 6))
+BENCH_ANTENNA_TYPES = int(os.environ.get("RADAR_BENCH_ANTENNA_TYPES", 2))
+BENCH_JOBS = int(os.environ.get("RADAR_BENCH_JOBS", 5))
+BENCH_ROUNDS = int(os.environ.get("RADAR_BENCH_ROUNDS", 3))
+
+END_DATE = date(2024, 6, 30)
+PLOT_WIDTH = 1920
+
+
+@pytest.fixture(scope="module")
+def dashboard(tmp_path_factory):
+    """The run_dash module, reading a synthetic database."""
+    path = str(tmp_path_factory.mktemp("bench") / "rqmData.db")
+    generate_fake_data(path, radar_names(BENCH_RADARS), BENCH_DAYS,
+                       antenna_type_names(BENCH_ANTENNA_TYPES), seed=0,
+                       end_date=END_DATE)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("RADAR_DATA_DB", path)
+        patch.delenv("RADAR_SHARED_CACHE", raising=False)
+        patch.delenv("RADAR_BACKEND", raising=False)
+        run_dash = importlib.import_module("run_dash")
+    if run_dash.DATA_DB != path:
+        pytest.skip("run_dash was imported with another database")
+    return run_dash
+
+
+def prop(component_id, prop_name, value=None):
+    return {"id": component_id, "property": prop_name, "value": value}
+
+
+def prop_id(spec):
+    """How Dash names a property, e.g. "tabs.active_tab"."""
+    component_id = spec["id"]
+    if isinstance(component_id, dict):
+        component_id = json.dumps(component_id, sort_keys=True,
+                                  separators=(",", ":"))
+    return f"{component_id}.{spec['property']}"
+
+
+def post_callback(client, output, outputs, inputs, state=(), changed=0):
+    """Posts a callback as the browser does, its input at index `changed`
+    being changed."""
+    response = client.post("/_dash-update-component", json={
+        "output": output, "outputs": outputs, "inputs": list(inputs),
+        "state": list(state), "changedPropIds": [prop_id(inputs[changed])],
+    })
+    assert response.status_code in (200, 204), response.data[:500]
+    return response
+
+
+def run_cold(benchmark, dashboard, callback, *args):
+    client = dashboard.server.test_client()
+    benchmark.pedantic(callback, args=(client, *args), rounds=BENCH_ROUNDS,
+                       setup=dashboard.cache.clear)
+
+
+def radar_data_callback(client, radar, zoom=None):
+    return post_callback(
+        client, "radar-data.data", {"id": "radar-data", "property": "data"},
+        [prop("radar-dropdown", "value", radar), prop("date-range", "start_date"),
+         prop("date-range", "end_date"), prop("radar-zoom", "data", zoom)],
+        [prop("plot-width", "data", PLOT_WIDTH)], changed=3 if zoom else 0)
+
+
+def comparison_callback(client, stat):
+    return post_callback(
+        client, "comparison-graph.figure",
+        {"id": "comparison-graph", "property": "figure"},
+        [prop("stat-dropdown", "value", stat), prop("date-range", "start_date"),
+         prop("date-range", "end_date")],
+        [prop("plot-width", "data", PLOT_WIDTH)])
+
+
+def fleet_callback(client, metric):
+    return post_callback(
+        client, "fleet-graph.figure", {"id": "fleet-graph", "property": "figure"},
+        [prop("fleet-metric", "value", metric), prop("date-range", "start_date"),
+         prop("date-range", "end_date")])
+
+
+def load_layout(client):
+    """The page with every tab's pane; tabs are then switched in the browser."""
+    response = client.get("/_dash-layout")
+    assert response.status_code == 200
+    return response
+
+
+def overview_callback(client):
+    return post_callback(
+        client, "overview-content.children",
+        {"id": "overview-content", "property": "children"},
+        [prop("overview-range", "data", [None, None])])
+
+
+def overview_graph_callback(client, radars):
+    graph_ids = [{"type": "overview-graph", "radar": radar} for radar in radars]
+    output = ('..{"radar":["ALL"],"type":"overview-graph"}.figure'
+              '...overview-loaded.data..')
+    return post_callback(
+        client, output,
+        [[{"id": graph_id, "property": "figure"} for graph_id in graph_ids],
+         {"id": "overview-loaded", "property": "data"}],
+        [prop("overview-accordion", "active_item", radars[0])],
+        [[prop(graph_id, "id", graph_id) for graph_id in graph_ids],
+         prop("overview-loaded", "data", []), prop("date-range", "start_date"),
+         prop("date-range", "end_date"), prop("plot-width", "data", PLOT_WIDTH)])
+
+
+LIVE_OUTPUTS = [("live-version", "data"), ("live-points", "data"),
+                ("date-range", "start_date"), ("date-range", "end_date"),
+                ("date-range", "min_date_allowed"),
+                ("date-range", "max_date_allowed")]
+
+
+def live_callback(client, end_date, latest, end):
+    """A live poll of a page showing the figures up to `latest`, extended
+    under a date range ending on `end`; the data version always changed."""
+    response = post_callback(
+        client, ".." + "...".join(f"{component}.{name}"
+                                  for component, name in LIVE_OUTPUTS) + "..",
+        [{"id": component, "property": name} for component, name in LIVE_OUTPUTS],
+        [prop("live-poll", "n_intervals", 1)],
+        [prop("date-range", "end_date", end_date),
+         prop("live-version", "data",
+              {"version": -1, "latest": latest, "end": end})])
+    return {f"{component}.{name}": value
+            for component, props in response.json["response"].items()
+            for name, value in props.items()}
+
+
+def test_live_appends_only_to_a_range_ending_at_the_latest_data(dashboard):
+    client = dashboard.server.test_client()
+    end = END_DATE.isoformat()
+
+    outputs = live_callback(client, "2024-06-28", "2024-06-28", "2024-06-28")
+    points = outputs["live-points.data"]["biases"]
+    assert {len(radar_points["x"]) for radar_points in points.values()} == {
+        2 * BENCH_ANTENNA_TYPES}
+    assert outputs["live-version.data"]["latest"] == end
+    assert outputs["date-range.max_date_allowed"] == end
+
+    # An earlier end date picked since: left alone
+    outputs = live_callback(client, "2024-06-20", "2024-06-28", "2024-06-28")
+    assert "live-points.data" not in outputs
+    assert outputs["live-version.data"]["end"] is None
+
+    # Already showing the latest day
+    outputs = live_callback(client, end, end, end)
+    assert list(outputs) == ["live-version.data"]
+
+
+def test_live_rebuilds_a_page_built_without_data(dashboard):
+    outputs = live_callback(dashboard.server.test_client(), "2030-01-01",
+                            None, "2030-01-01")
+
+    assert "live-points.data" not in outputs
+    assert outputs["date-range.end_date"] == END_DATE.isoformat()
+    assert outputs["date-range.start_date"] < outputs["date-range.end_date"]
+    assert outputs["live-version.data"]["latest"] == END_DATE.isoformat()
+
+
+def test_layout(benchmark, dashboard):
+    run_cold(benchmark, dashboard, load_layout)
+
+
+def test_radar_data(benchmark, dashboard):
+    run_cold(benchmark, dashboard, radar_data_callback,
+             radar_names(BENCH_RADARS)[0])
+
+
+def test_radar_zoom_refetches_one_figure(dashboard):
+    client = dashboard.server.test_client()
+    radar = radar_names(BENCH_RADARS)[0]
+    zoom = {"graph": "bias-graph", "relayout": {
+        "xaxis.range[0]": "2024-06-01 00:00:00",
+        "xaxis.range[1]": "2024-06-20 12:00:00"}}
+
+    response = radar_data_callback(client, radar, zoom)
+
+    # Only the zoomed figure is replaced, with the raw rows of the zoom
+    operations = response.json["response"]["radar-data"]["data"]["operations"]
+    assert [operation["location"] for operation in operations] == [["biases"]]
+    dates = np.frombuffer(base64.b64decode(
+        operations[0]["params"]["value"]["data"][0]["x"]["bdata"]))
+    assert np.datetime_as_string(dates.astype("datetime64[ms]"), unit="D")[
+        [0, -1]].tolist() == ["2024-06-01", "2024-06-20"]
+
+
+def test_comparison_figure(benchmark, dashboard):
+    run_cold(benchmark, dashboard, comparison_callback, "Range_Bias")
+
+
+def test_comparison_ignores_unknown_stats(dashboard):
+    client = dashboard.server.test_client()
+    for stat in ("", "Job_Date", "pdX"):
+        assert comparison_callback(client, stat).status_code == 204
+
+
+def test_overview_summarizes_every_radar(dashboard):
+    date_range = ("2024-01-01", END_DATE.isoformat())
+    columns, summaries = dashboard.cache.query(
+        dashboard.OVERVIEW_SUMMARY_QUERY, date_range)
+
+    assert columns[:3] == ("ds_name", "COUNT(*)", "MAX(Job_Date)")
+    assert [row[0] for row in summaries] == sorted(radar_names(BENCH_RADARS))
+    for radar, entries, latest_date, *latest in summaries:
+        # One detection rate row per radar and day
+        assert entries == (END_DATE - date(2024, 1, 1)).days + 1
+        assert latest_date == END_DATE.isoformat()
+        # The statistics of the latest row
+        assert tuple(latest) == dashboard.cache.query(
+            "SELECT pdP, pdS, pdM, pdPS, pdPM FROM detection_rates "
+            "WHERE ds_name = ? AND Job_Date = ?", (radar, latest_date))[1][0]
+
+
+def test_overview_fills_only_expanded_graphs(dashboard):
+    radars = radar_names(BENCH_RADARS)
+    response = overview_graph_callback(dashboard.server.test_client(), radars)
+
+    outputs = response.json["response"]
+    assert outputs["overview-loaded"]["data"] == [radars[0]]
+    graphs = {json.loads(graph_id)["radar"]: props["figure"]
+              for graph_id, props in outputs.items() if graph_id.startswith("{")}
+    assert list(graphs) == [radars[0]]
+    assert graphs[radars[0]]["data"]
+
+
+def test_fleet_ignores_unknown_metrics(dashboard):
+    response = fleet_callback(dashboard.server.test_client(), "radars")
+    assert response.status_code == 204
+
+
+def test_report_needs_both_dates(dashboard):
+    outputs = ["report-job.data", "report-poll.disabled", "report-progress.value",
+               "report-status.children", "download-report.data"]
+    response = post_callback(
+        dashboard.server.test_client(),
+        ".." + "...".join(outputs) + "..",
+        [dict(zip(("id", "property"), output.split("."))) for output in outputs],
+        [prop("generate-report-button", "n_clicks", 1),
+         prop("report-poll", "n_intervals")],
+        [prop("date-range-picker", "start_date"),
+         prop("date-range-picker", "end_date", "2024-06-30"),
+         prop("report-job", "data")])
+
+    status = response.json["response"]["report-status"]["children"]
+    assert status == "Pick the dates of the report first."
+
+
+@pytest.mark.parametrize("metric", ["zscore", "latest"])
+def test_fleet_figure(benchmark, dashboard, metric):
+    run_cold(benchmark, dashboard, fleet_callback, metric)
+
+
+def test_overview(benchmark, dashboard):
+    run_cold(benchmark, dashboard, overview_callback)
+
+
+def test_overview_graph(benchmark, dashboard):
+    run_cold(benchmark, dashboard, overview_graph_callback,
+             radar_names(BENCH_RADARS))
+
+
+def test_report(benchmark, dashboard):
+    start = date(END_DATE.year, 1, 1).isoformat()
+    benchmark.pedantic(write_report, rounds=1, args=(
+        dashboard.DATA_DB, start, END_DATE.isoformat(), io.BytesIO()))
+
+
+@pytest.fixture(scope="module")
+def job_source(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("jobs"))
+    generate_jobs(directory, radar_names(BENCH_RADARS),
+                  antenna_type_names(BENCH_ANTENNA_TYPES), BENCH_JOBS, seed=0,
+                  end_date=END_DATE)
+    return directory
+
+
+def test_ingest(benchmark, job_source, tmp_path):
+    pool = SQLiteSourcePool(job_source)
+    connection = pool.get_connection()
+    jobs = [Job(metadata.database,
+                resolve_job_date(metadata.database, metadata.created),
+                metadata.checksum, metadata.fingerprint)
+            for metadata in checksum_jobs(pool, list_jobs(connection))]
+    rounds = iter(range(BENCH_ROUNDS))
+
+    def fresh_database():
+        sqlite_connection = connect_for_ingest(
+            str(tmp_path / f"rqmData_{next(rounds)}.db"))
+        return (pool, jobs, sqlite_connection), {}
+
+    benchmark.pedantic(ingest_jobs, setup=fresh_database, rounds=BENCH_ROUNDS)
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from app.cache import QueryCache
+from app.storage import bump_data_version, connect_for_ingest
+
+
+def test_query_cache_hits_and_invalidation(tmp_path):
+    path = str(tmp_path / "rqmData.db")
+    writer = connect_for_ingest(path)
+    cache = QueryCache(path)
+
+    assert cache.query("SELECT COUNT(*) FROM biases") == (("COUNT(*)",), ((0,),))
+    cache.query("SELECT COUNT(*) FROM biases")
+    assert cache.stats()["hits"] == 1
+
+    with writer:
+        writer.execute("INSERT INTO biases (Radar_Name) VALUES ('EBBE')")
+        bump_data_version(writer)
+
+    assert cache.query("SELECT COUNT(*) FROM biases")[1] == ((1,),)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+def test_memoize_evicts_least_recently_used(tmp_path):
+    cache = QueryCache(str(tmp_path / "rqmData.db"), maxsize=2)
+    calls = []
+
+    @cache.memoize
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(1), square(2), square(1), square(3), square(1)] == [1, 4, 1, 9, 1]
+    square(2)
+    assert calls == [1, 2, 3, 2]
+    assert cache.stats()["size"] == 2
+
+
+def test_shared_store_serves_other_caches(tmp_path):
+    path = str(tmp_path / "rqmData.db")
+    writer = connect_for_ingest(path)
+    shared_path = str(tmp_path / "dashboard_cache.db")
+    first = QueryCache(path, shared_path=shared_path)
+    second = QueryCache(path, shared_path=shared_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"figure": [1, 2, 3]}
+
+    assert first.get_or_compute(("figure", 1), compute) == {"figure": [1, 2, 3]}
+    assert second.get_or_compute(("figure", 1), compute) == {"figure": [1, 2, 3]}
+    assert len(calls) == 1
+    assert second.stats()["shared_hits"] == 1
+
+    # Entries of an older data version are not reused
+    with writer:
+        bump_data_version(writer)
+    second.get_or_compute(("figure", 1), compute)
+    assert len(calls) == 2
+
+
+def test_queries_run_on_read_only_connections(tmp_path):
+    path = str(tmp_path / "rqmData.db")
+    connect_for_ingest(path).close()
+    cache = QueryCache(path)
+
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        cache.query("INSERT INTO biases (Radar_Name) VALUES ('EBBE')")
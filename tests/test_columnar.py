@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from app.backends import ParquetBackend, SQLiteBackend  # noqa: E402
+from app.cache import QueryCache  # noqa: E402
+from app.columnar import export_parquet, partition_dir  # noqa: E402
+from app.pivot import pivot_columns  # noqa: E402
+
+
+@pytest.fixture
+def bias_rows():
+    return [
+        ("EB/BE", "PSR", 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, "2022-12-31"),
+        ("EB/BE", "PSR", 1.5, None, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, "2023-01-02"),
+    ]
+
+
+@pytest.fixture
+def rate_rows():
+    return [
+        ("EBBE", 1, 90.0, 80.0, 70.0, 60.0, 50.0, "2023-01-02"),
+        ("EBLG", 1, 91.0, 81.0, None, 61.0, 51.0, "2023-01-01"),
+        ("EBLG", 1, 92.0, 82.0, 72.0, 62.0, 52.0, "2023-01-03"),
+    ]
+
+
+def test_export_writes_radar_year_partitions(database, tmp_path):
+    _, connection = database
+    root = str(tmp_path / "parquet")
+
+    assert export_parquet(connection, root) == 4
+    assert os.path.exists(os.path.join(
+        partition_dir(root, "biases", "EB/BE", 2022), "data.parquet"))
+
+    # Re-exporting a year drops the partitions whose rows are gone
+    with connection:
+        connection.execute("DELETE FROM detection_rates WHERE ds_name = 'EBBE'")
+    assert export_parquet(connection, root, years=[2023]) == 2
+    assert not os.path.exists(partition_dir(root, "detection_rates", "EBBE", 2023))
+    assert os.path.exists(partition_dir(root, "biases", "EB/BE", 2022))
+
+
+def test_parquet_backend_matches_sqlite(database, tmp_path):
+    path, connection = database
+    root = str(tmp_path / "parquet")
+    export_parquet(connection, root)
+    cache = QueryCache(path)
+    sqlite, parquet = SQLiteBackend(cache), ParquetBackend(cache, root)
+    date_range = ("2022-01-01", "2023-01-02")
+
+    sqlite_dates, sqlite_series = sqlite.radar_series("biases", "EB/BE", date_range)
+    dates, series = parquet.radar_series("biases", "EB/BE", date_range)
+    assert list(dates.astype(str)) == sqlite_dates
+    for (name, values), (sqlite_name, sqlite_values) in zip(series, sqlite_series):
+        assert name == sqlite_name
+        np.testing.assert_array_equal(values, np.array(sqlite_values, dtype=float))
+
+    for backend in (sqlite, parquet):
+        radars, dates, grid = pivot_columns(
+            *backend.stat_columns("pdP", ("2000-01-01", "2023-01-02")))
+        assert list(radars) == ["EBBE", "EBLG"]
+        assert list(dates) == ["2023-01-01", "2023-01-02"]
+        np.testing.assert_array_equal(grid, [[np.nan, 90.0], [91.0, np.nan]])
+
+
+def test_parquet_backend_without_export(database, tmp_path):
+    path, _ = database
+    backend = ParquetBackend(QueryCache(path), str(tmp_path / "missing"))
+    dates, series = backend.radar_series("biases", "EBBE", ("0000-01-01", "9999-12-31"))
+    assert len(dates) == 0 and all(len(values) == 0 for _, values in series)
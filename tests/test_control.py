@@ -0,0 +1,161 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.cache import QueryCache  # noqa: E402
+from app.control import (  # noqa: E402
+    ALPHA, BAND_DTYPE, BLOCK, WARM_UP, anomalies, control_limits, ewma,
+    limit_series, rebuild_control, refresh_control)
+from app.storage import insert_detection_rates  # noqa: E402
+
+
+def rates(pdP, job_date, radar="EBBE", ds_type=1):
+    return (radar, ds_type, pdP, 80.0, None, 70.0, 60.0, job_date)
+
+
+def days(count, start=1):
+    return [f"2023-{1 + day // 28:02d}-{1 + day % 28:02d}"
+            for day in range(start - 1, start - 1 + count)]
+
+
+def test_ewma_matches_the_recurrence_across_blocks():
+    values = np.random.default_rng(0).normal(size=BLOCK * 2 + 7)
+    expected, previous = [], 5.0
+    for value in values:
+        previous = (1 - ALPHA) * previous + ALPHA * value
+        expected.append(previous)
+
+    np.testing.assert_allclose(ewma(values, ALPHA, 5.0), expected)
+
+
+def test_control_limits_flag_points_outside_the_band():
+    values = np.tile([90.0, 91.0], WARM_UP).tolist() + [90.5, 60.0]
+
+    n, _, _, lower, upper, flagged = control_limits(values)
+
+    assert n[-1] == len(values)
+    # No limits while the series warms up
+    assert np.isnan(lower[:WARM_UP]).all() and not flagged[:WARM_UP].any()
+    assert lower[-2] < 90.5 < upper[-2]
+    assert flagged.tolist() == [False] * (len(values) - 1) + [True]
+
+
+def test_control_limits_continue_from_a_state():
+    values = np.random.default_rng(1).normal(90, 2, 40)
+
+    whole = control_limits(values)
+    first = control_limits(values[:25])
+    state = (first[0][-1], first[1][-1], first[2][-1])
+    rest = control_limits(values[25:], state)
+
+    for full, part in zip(whole, rest):
+        np.testing.assert_allclose(np.asarray(full[25:], dtype=float),
+                                   np.asarray(part, dtype=float))
+
+
+@pytest.fixture
+def rate_rows():
+    values = np.random.default_rng(2).normal(90, 1, 40).tolist()
+    values[30] = 50.0
+    return [rates(value, job_date) for value, job_date in zip(values, days(40))]
+
+
+def stored(connection):
+    states = connection.execute(
+        "SELECT * FROM control_state ORDER BY source, radar, antenna_type, "
+        "stat").fetchall()
+    flagged = connection.execute(
+        "SELECT * FROM control_anomalies ORDER BY source, radar, Job_Date, "
+        "antenna_type, stat").fetchall()
+    return states, flagged
+
+
+def stored_bands(connection):
+    rows = connection.execute(
+        "SELECT source, radar, Job_Date, antenna_type, limits "
+        "FROM control_bands ORDER BY 1, 2, 3, 4").fetchall()
+    return ([row[:4] for row in rows],
+            np.array([np.frombuffer(row[4], dtype=BAND_DTYPE) for row in rows]))
+
+
+def assert_same_bands(refreshed, rebuilt):
+    assert refreshed[0] == rebuilt[0]
+    np.testing.assert_allclose(refreshed[1], rebuilt[1], rtol=1e-6)
+
+
+def assert_same_rows(refreshed, rebuilt, keys):
+    assert len(refreshed) == len(rebuilt)
+    for refreshed_row, rebuilt_row in zip(refreshed, rebuilt):
+        assert refreshed_row[:keys] == rebuilt_row[:keys]
+        assert refreshed_row[keys:] == pytest.approx(rebuilt_row[keys:])
+
+
+def test_refresh_control_continues_each_series(database):
+    _, connection = database
+    values = [91.0, 91.0, 30.0, 91.0, 91.0]
+    with connection:
+        insert_detection_rates(connection.cursor(), [
+            rates(value, job_date)
+            for value, job_date in zip(values, days(5, start=41))])
+        refresh_control(connection, days(1, start=41)[0])
+    states, flagged = stored(connection)
+    bands = stored_bands(connection)
+
+    with connection:
+        rebuild_control(connection)
+    rebuilt_states, rebuilt_flagged = stored(connection)
+    assert_same_bands(bands, stored_bands(connection))
+    # No bands during the warm-up
+    assert len(bands[0]) == 45 - WARM_UP
+
+    assert len(states) == 4  # pdM is missing throughout
+    assert all(state[4] == days(45)[-1] and state[5] == 45 for state in states)
+    assert_same_rows(states, rebuilt_states, 5)
+    assert [row[4] for row in flagged] == [days(31)[-1], days(43)[-1]]
+    assert_same_rows(flagged, rebuilt_flagged, 5)
+
+
+def test_refresh_control_recomputes_radars_refreshed_past_a_date(database):
+    _, connection = database
+    with connection:
+        # A job of an earlier day, ingested after the later ones
+        connection.execute(
+            "UPDATE detection_rates SET pdP = 10.0 WHERE Job_Date = ?",
+            (days(20)[-1],))
+        refresh_control(connection, days(20)[-1])
+    states, flagged = stored(connection)
+    bands = stored_bands(connection)
+
+    with connection:
+        rebuild_control(connection)
+
+    assert (states, flagged) == stored(connection)
+    assert_same_bands(bands, stored_bands(connection))
+    assert days(20)[-1] in [row[4] for row in flagged]
+
+
+def test_anomalies_and_limits_are_read_for_the_dashboard(database):
+    path, connection = database
+    cache = QueryCache(path)
+    date_range = ("2023-01-01", "2023-12-31")
+
+    flagged = anomalies(cache, "detection_rates", "EBBE", date_range)
+    assert [row[:4] for row in flagged] == [(days(31)[-1], "1", "pdP", 50.0)]
+
+    series = limit_series(cache, "detection_rates", "EBBE", date_range)
+    assert [(stat, antenna_type) for stat, antenna_type, *_ in series] == [
+        ("pdP", "1"), ("pdPM", "1"), ("pdPS", "1"), ("pdS", "1")]
+    _, _, dates, lower, upper = series[0]
+    # Bands start once the series warmed up
+    assert dates == days(40)[WARM_UP:]
+    assert (lower < upper).all()
+    expected = control_limits([row[0] for row in connection.execute(
+        "SELECT pdP FROM detection_rates ORDER BY Job_Date")])
+    np.testing.assert_allclose(lower, expected[3][WARM_UP:], rtol=1e-6)
+    np.testing.assert_allclose(upper, expected[4][WARM_UP:], rtol=1e-6)
+
+    # Only the bands of the shown dates are read
+    later = limit_series(cache, "detection_rates", "EBBE",
+                         (days(35)[-1], date_range[1]))
+    assert later[0][2] == days(40)[34:]
+    np.testing.assert_array_equal(later[0][3], lower[34 - WARM_UP:])
@@ -0,0 +1,45 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.downsample import downsample, downsample_indices, lttb_indices, minmax_indices  # noqa: E402
+
+
+def test_minmax_keeps_spikes():
+    y = np.sin(np.linspace(0, 20, 10000))
+    y[1234] = 50
+    y[8765] = -50
+    keep = minmax_indices(y, 100)
+    assert len(keep) <= 102
+    assert 1234 in keep and 8765 in keep
+    assert keep[0] == 0 and keep[-1] == 9999
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_minmax_ignores_missing_values():
+    y = np.arange(1000, dtype=float)
+    y[::2] = np.nan
+    keep = minmax_indices(y, 50)
+    assert not np.isnan(y[keep[1:-1]]).any()
+
+
+def test_lttb_returns_requested_number_of_points():
+    x = np.arange(5000, dtype=float)
+    y = np.random.default_rng(0).normal(size=5000)
+    keep = lttb_indices(x, y, 300)
+    assert len(keep) == 300
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_downsample_short_series_unchanged():
+    dates = ["2023-10-01", "2023-10-02", "2023-10-03"]
+    x, y = downsample(dates, [1.0, None, 3.0], 100, method="lttb")
+    assert list(x) == dates
+    assert len(y) == 3
+
+
+def test_downsample_lttb_on_dates():
+    dates = np.arange("2000-01-01", "2010-01-01", dtype="datetime64[D]").astype(str)
+    values = np.random.default_rng(1).normal(size=len(dates))
+    keep = downsample_indices(dates, values, 500, method="lttb")
+    assert len(keep) == 500
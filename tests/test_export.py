@@ -0,0 +1,70 @@
+import csv
+import io
+
+import pytest
+
+from app.export import export_chunks, stream_export
+
+
+def bias(radar, antenna_type, range_bias, job_date):
+    return (radar, antenna_type, 0.1, range_bias, 0.0, 0.3, 1.0, 0.1, 0.0, 0.0,
+            job_date)
+
+
+@pytest.fixture
+def bias_rows():
+    return [
+        bias("EBLG", "PSR", 3.0, "2023-10-01"),
+        bias("EBBE", "PSR", 1.0, "2023-10-02"),
+        bias("EBBE", "SSR", 2.0, "2023-10-01"),
+        bias("EBOS", "PSR", 4.0, "2023-11-01"),
+    ]
+
+
+@pytest.fixture
+def rate_rows():
+    return [("EBBE", 1, 95.0, None, 80.0, 70.0, 60.0, "2023-10-01")]
+
+
+def test_export_chunks_filter_radars_and_dates(database):
+    path, _ = database
+    chunks = list(export_chunks(path, "biases", ["EBLG", "EBBE"],
+                                ("2023-10-01", "2023-10-31"), chunk_rows=2))
+
+    assert [len(rows) for rows in chunks] == [2, 1]
+    assert [(row[0], row[1], row[-1]) for rows in chunks for row in rows] == [
+        ("EBBE", "SSR", "2023-10-01"), ("EBBE", "PSR", "2023-10-02"),
+        ("EBLG", "PSR", "2023-10-01")]
+
+
+def test_stream_csv_sends_the_header_first(database):
+    path, _ = database
+    stream = stream_export(path, "detection_rates", "csv", [],
+                           ("0000-01-01", "9999-12-31"))
+
+    assert next(stream) == "ds_name,ds_type,pdP,pdS,pdM,pdPS,pdPM,Job_Date\n"
+    assert list(csv.reader(io.StringIO("".join(stream)))) == [
+        ["EBBE", "1", "95.0", "-1.0", "80.0", "70.0", "60.0", "2023-10-01"]]
+
+
+def test_stream_parquet_writes_a_row_group_per_chunk(database):
+    path, _ = database
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    stream = stream_export(path, "biases", "parquet", None,
+                           ("0000-01-01", "9999-12-31"), chunk_rows=3)
+    data = b"".join(stream)
+
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_row_groups == 2
+    table = parquet.read()
+    assert table.column("Range_Bias").to_pylist() == [2.0, 1.0, 3.0, 4.0]
+    assert str(table.column("Job_Date")[0]) == "2023-10-01"
+
+
+def test_stream_export_rejects_unknown_tables_and_formats(database):
+    path, _ = database
+    with pytest.raises(ValueError):
+        stream_export(path, "ingested_jobs", "csv", [], ("", ""))
+    with pytest.raises(ValueError):
+        stream_export(path, "biases", "xlsx", [], ("", ""))
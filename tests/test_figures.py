@@ -0,0 +1,46 @@
+import base64
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("dash")
+
+from app.figures import (  # noqa: E402
+    WEBGL_MIN_POINTS, epoch_ms, figure_patch, line_traces, typed_array)
+
+
+def decode(spec):
+    return np.frombuffer(base64.b64decode(spec['bdata']),
+                         dtype=np.dtype(spec['dtype']).newbyteorder('<'))
+
+
+def test_typed_array_round_trips():
+    values = [1.5, np.nan, -2.25]
+    np.testing.assert_array_equal(decode(typed_array(values, 'f4')),
+                                  np.array(values, dtype=np.float32))
+
+
+def test_epoch_ms_of_dates():
+    assert list(epoch_ms(["1970-01-01", "1970-01-02"])) == [0.0, 86400000.0]
+
+
+def test_line_traces_switch_to_webgl_when_dense():
+    dates = np.arange("2000-01-01", "2030-01-01", dtype="datetime64[D]")
+    values = np.arange(len(dates), dtype=float)
+
+    sparse = line_traces(dates[:100], [("bias", values[:100])])
+    assert sparse[0]['type'] == 'scatter'
+    np.testing.assert_array_equal(decode(sparse[0]['y']), values[:100])
+    assert decode(sparse[0]['x'])[1] - decode(sparse[0]['x'])[0] == 86400000.0
+
+    dense = line_traces(dates, [("a", values), ("b", values)],
+                        max_points=WEBGL_MIN_POINTS)
+    assert [trace['type'] for trace in dense] == ['scattergl', 'scattergl']
+
+
+def test_figure_patch_only_sends_traces_and_given_layout():
+    figure = {'data': [{'type': 'scatter'}],
+              'layout': {'title': 'Bias', 'height': 400}}
+    operations = figure_patch(figure, 'title').to_plotly_json()['operations']
+    assert [operation['location'] for operation in operations] == [
+        ['data'], ['layout', 'title']]
@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.cache import QueryCache  # noqa: E402
+from app.fleet import fleet_matrix, fleet_rows  # noqa: E402
+from app.rollups import RAW  # noqa: E402
+from app.storage import (  # noqa: E402
+    connect_for_ingest, insert_detection_rates, refresh_rollups)
+
+ROWS = [
+    ("EBBE", "pdP", "2023-10-02", 90.0),
+    ("EBBE", "pdP", "2023-10-09", 92.0),
+    ("EBBE", "pdP", "2023-10-16", 97.0),
+    ("EBBE", "pdS", "2023-10-02", 80.0),
+    ("EBLG", "pdP", "2023-10-09", 95.0),
+    ("EBLG", "pdP", "2023-10-16", None),
+    ("EBOS", "pdP", "2023-10-16", 50.0),
+]
+
+
+def test_fleet_matrix_reduces_every_radar_and_statistic():
+    matrix = fleet_matrix(ROWS, ["EBBE", "EBLG", "EBOS", "EBSZ"], ["pdP", "pdS"])
+
+    assert matrix.periods == ["2023-10-02", "2023-10-09", "2023-10-16"]
+    np.testing.assert_array_equal(
+        matrix.latest, [[97.0, 80.0], [95.0, np.nan], [50.0, np.nan],
+                        [np.nan, np.nan]])
+    np.testing.assert_array_equal(
+        matrix.delta, [[5.0, np.nan], [np.nan, np.nan], [np.nan, np.nan],
+                       [np.nan, np.nan]])
+    # EBBE's latest pdP against its mean 93 and standard deviation sqrt(26/3)
+    assert matrix.zscore[0, 0] == pytest.approx(4 / math.sqrt(26 / 3))
+    # A single period has no spread
+    assert np.isnan(matrix.zscore[0, 1]) and np.isnan(matrix.zscore[1, 0])
+    assert matrix.latest_periods.tolist() == [
+        ["2023-10-16", "2023-10-02"], ["2023-10-09", ""], ["2023-10-16", ""],
+        ["", ""]]
+
+
+def test_fleet_matrix_of_no_rows():
+    matrix = fleet_matrix([], ["EBBE"], ["pdP"])
+
+    assert matrix.periods == []
+    assert np.isnan(matrix.latest).all() and np.isnan(matrix.zscore).all()
+
+
+def test_fleet_rows_read_weekly_rollups_of_raw_ranges(tmp_path):
+    path = str(tmp_path / "rqmData.db")
+    connection = connect_for_ingest(path)
+    with connection:
+        insert_detection_rates(connection.cursor(), [
+            ("EBBE", 1, 90.0, 80.0, None, 70.0, 60.0, "2023-10-04"),
+            ("EBBE", 2, 94.0, 80.0, None, 70.0, 60.0, "2023-10-04"),
+            ("EBBE", 1, 50.0, 80.0, None, 70.0, 60.0, "2023-10-09"),
+        ])
+        refresh_rollups(connection, "2023-10-04", "2023-10-09")
+    connection.close()
+
+    rows = fleet_rows(QueryCache(path), ("2023-10-04", "2023-10-31"), RAW)
+
+    assert sorted(row for row in rows if row[1] == "pdP") == [
+        ("EBBE", "pdP", "2023-10-02", 92.0), ("EBBE", "pdP", "2023-10-09", 50.0)]
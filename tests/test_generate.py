@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from generateFakeData import MAX_DAYS, MAX_RADARS, fleet_for_rows  # noqa: E402
+
+
+def test_fleet_for_rows_adds_days_then_radars():
+    assert fleet_for_rows(1200, 6, 2) == (6, 100)
+    radars, days = fleet_for_rows(100_000_000, 6, 2)
+    assert days <= MAX_DAYS and radars * days * 2 >= 100_000_000
+    assert radars == 13_699
+
+
+def test_fleet_for_rows_rejects_targets_beyond_the_largest_fleet():
+    with pytest.raises(ValueError):
+        fleet_for_rows(MAX_RADARS * MAX_DAYS * 2 + 1, 6, 2)
@@ -0,0 +1,220 @@
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.ingest import (BIASES_QUERY, DETECTION_RATE_QUERY, Job, JobMetadata,
+                        changed_jobs, ingest_jobs, pending_jobs,
+                        resolve_job_date)
+from app.storage import (LedgerEntry, connect_for_ingest, load_ledger,
+                         read_data_version)
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self.results = results
+        self.database = None
+        self.rows = []
+
+    def execute(self, query):
+        if query.startswith("USE"):
+            self.database = query[5:-1]
+        elif query == BIASES_QUERY:
+            self.rows = self.results[self.database][0]
+        elif query == DETECTION_RATE_QUERY:
+            self.rows = self.results[self.database][1]
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, buffered=True):
+        assert not buffered
+        return FakeCursor(self.pool.results)
+
+    def close(self):
+        with self.pool.lock:
+            self.pool.in_use -= 1
+
+
+class FakePool:
+    def __init__(self, results):
+        self.results = results
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.max_in_use = 0
+
+    def get_connection(self):
+        with self.lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+        return FakeConnection(self)
+
+
+def make_results(count, radars=1):
+    return {
+        f"job_verifsassuser_{i}": (
+            [(f"R{i}.{r}", antenna, 0.1, 2.0, 0.0, 0.3, 1.0, 0.1, 0.0, 0.0)
+             for r in range(radars) for antenna in ("PSR", "SSR")],
+            [(f"R{i}.{r}", 1, 95.0, None, 80.0, 70.0, 60.0)
+             for r in range(radars)],
+        )
+        for i in range(count)
+    }
+
+
+def test_ingest_jobs_writes_every_job():
+    results = make_results(10)
+    pool = FakePool(results)
+    jobs = [Job(database, "2023-10-01", "abc") for database in results]
+    sqlite_connection = connect_for_ingest(":memory:")
+
+    timings = {}
+    ingested = ingest_jobs(pool, jobs, sqlite_connection, workers=3,
+                           timings=timings)
+
+    assert sorted(ingested) == sorted(results)
+    assert sorted(timings) == sorted(results)
+    assert all(fetch >= 0 and write > 0 for fetch, write in timings.values())
+    assert pool.in_use == 0
+    assert pool.max_in_use <= 3
+    biases = sqlite_connection.execute("SELECT COUNT(*) FROM biases").fetchone()
+    assert biases == (20,)
+    rate = sqlite_connection.execute(
+        "SELECT pdS, Job_Date FROM detection_rates WHERE ds_name = 'R0.0'").fetchone()
+    assert rate == (-1, "2023-10-01")
+    # A control state per statistic of every radar, pdS being missing
+    series = sqlite_connection.execute(
+        "SELECT COUNT(*) FROM control_state").fetchone()
+    assert series == (10 * (2 * 8 + 4),)
+
+
+def test_reingesting_a_changed_job_replaces_its_rows():
+    results = make_results(2)
+    pool = FakePool(results)
+    sqlite_connection = connect_for_ingest(":memory:")
+    jobs = [Job(database, "2023-10-01", "v1", "f1") for database in results]
+    ingest_jobs(pool, jobs, sqlite_connection)
+
+    ledger = load_ledger(sqlite_connection)
+    assert ledger == {database: LedgerEntry("f1", "v1") for database in results}
+
+    metadata = [
+        JobMetadata("job_verifsassuser_0", None, "f1"),
+        JobMetadata("job_verifsassuser_1", None, "f2"),
+        JobMetadata("job_verifsassuser_2", None, "f1"),
+    ]
+    pending = pending_jobs(metadata, ledger)
+    assert [job.database for job in pending] == [
+        "job_verifsassuser_1", "job_verifsassuser_2"]
+    assert len(pending_jobs(metadata, ledger, full=True)) == 3
+
+    # Only the checksum tells whether a job that looks changed is
+    checksummed = [pending[0]._replace(checksum="v1"),
+                   pending[1]._replace(checksum="v1")]
+    changed, unchanged = changed_jobs(checksummed, ledger)
+    assert [job.database for job in changed] == ["job_verifsassuser_2"]
+    assert [job.database for job in unchanged] == ["job_verifsassuser_1"]
+    assert len(changed_jobs(checksummed, ledger, full=True)[0]) == 2
+
+    version = read_data_version(sqlite_connection)
+    ingest_jobs(pool, [Job("job_verifsassuser_1", "2023-10-01", "v2", "f2")],
+                sqlite_connection)
+    count = sqlite_connection.execute("SELECT COUNT(*) FROM biases").fetchone()
+    assert count == (4,)
+    # Same rows: the dashboard caches stay valid
+    assert read_data_version(sqlite_connection) == version
+    assert load_ledger(sqlite_connection)["job_verifsassuser_1"] == (
+        LedgerEntry("f2", "v2"))
+
+
+def test_resolve_job_date():
+    assert resolve_job_date("job_verifsassuser_20231001") == "2023-10-01"
+    assert resolve_job_date("job_verifsassuser_42",
+                            datetime(2023, 10, 2, 8, 30)) == "2023-10-02"
+    assert resolve_job_date("job_verifsassuser_42") is None
+
+
+def test_ingest_jobs_streams_in_chunks():
+    results = make_results(3, radars=50)
+    pool = FakePool(results)
+    jobs = [Job(database, "2023-10-01", "v1") for database in results]
+    sqlite_connection = connect_for_ingest(":memory:")
+
+    ingest_jobs(pool, jobs, sqlite_connection, workers=2, chunk_size=7)
+    ingest_jobs(pool, jobs, sqlite_connection, workers=2, chunk_size=7)
+
+    counts = sqlite_connection.execute(
+        "SELECT biases_rows, detection_rows FROM ingested_jobs").fetchall()
+    assert counts == [(100, 50)] * 3
+    biases = sqlite_connection.execute("SELECT COUNT(*) FROM biases").fetchone()
+    assert biases == (300,)
+
+
+def test_ingest_jobs_stops_on_failure():
+    results = make_results(5)
+    del results["job_verifsassuser_3"]
+    pool = FakePool(results)
+    jobs = [Job(f"job_verifsassuser_{i}", "2023-10-01", "v1") for i in range(5)]
+
+    with pytest.raises(KeyError):
+        ingest_jobs(pool, jobs, connect_for_ingest(":memory:"), workers=2)
+    assert pool.in_use == 0
+
+
+def test_ingest_from_sqlite_source(tmp_path):
+    np = pytest.importorskip("numpy")
+    from app.ingest import checksum_jobs, list_jobs
+    from app.sqlite_source import SQLiteSourcePool, generate_jobs
+
+    generate_jobs(str(tmp_path), ["EBBE", "EBLG"], ["PSR", "SSR"], 2, seed=0,
+                  end_date=datetime(2023, 10, 2).date(), reports_per_radar=50)
+    pool = SQLiteSourcePool(str(tmp_path))
+    jobs = [Job(metadata.database, resolve_job_date(metadata.database),
+                metadata.checksum, metadata.fingerprint)
+            for metadata in checksum_jobs(pool, list_jobs(pool.get_connection()))]
+    sqlite_connection = connect_for_ingest(":memory:")
+
+    assert sorted(ingest_jobs(pool, jobs, sqlite_connection)) == [
+        "job_verifsassuser_20231001", "job_verifsassuser_20231002"]
+    assert sqlite_connection.execute(
+        "SELECT COUNT(*) FROM biases").fetchone() == (8,)
+    rates = np.array(sqlite_connection.execute(
+        "SELECT pdP, pdS, pdM, pdPS, pdPM FROM detection_rates").fetchall())
+    # Rates, not integer divisions rounded to 0 or 100
+    assert rates.shape == (4, 5) and ((rates > 50) & (rates < 100)).all()
+
+
+def test_list_jobs_checksums_follow_the_contents(tmp_path):
+    pytest.importorskip("numpy")
+    from app.ingest import checksum_jobs, list_jobs
+    from app.sqlite_source import SQLiteSourcePool, generate_jobs
+
+    generate_jobs(str(tmp_path), ["EBBE"], ["PSR"], 2, seed=0,
+                  end_date=datetime(2023, 10, 2).date(), reports_per_radar=10)
+    pool = SQLiteSourcePool(str(tmp_path))
+    before = checksum_jobs(pool, list_jobs(pool.get_connection()), workers=2)
+    assert list_jobs(pool.get_connection()) == [
+        metadata._replace(checksum=None) for metadata in before]
+
+    # Touched, but not changed: only the fingerprint follows
+    os.utime(tmp_path / "job_verifsassuser_20231001.db", (0, 0))
+    touched = checksum_jobs(pool, list_jobs(pool.get_connection()))
+    assert touched[0].fingerprint != before[0].fingerprint
+    assert [job.checksum for job in touched] == [job.checksum for job in before]
+
+    generate_jobs(str(tmp_path), ["EBBE", "EBLG"], ["PSR"], 1, seed=1,
+                  end_date=datetime(2023, 10, 2).date(), reports_per_radar=10)
+    after = checksum_jobs(pool, list_jobs(pool.get_connection()))
+    assert after[0].checksum == before[0].checksum
+    assert after[1].checksum != before[1].checksum
+    assert after[1].fingerprint != before[1].fingerprint
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+pytest.importorskip("reportlab")
+
+from app import jobs  # noqa: E402
+from app.cache import DataVersion  # noqa: E402
+from app.storage import (  # noqa: E402
+    bump_data_version, connect_for_ingest, insert_detection_rates)
+
+
+def wait_for(report_jobs, key, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = report_jobs.status(key)
+        if status['state'] in (jobs.DONE, jobs.FAILED):
+            return status
+        time.sleep(0.05)
+    raise AssertionError("report job did not finish")
+
+
+def test_report_jobs_cache_reports_per_data_version(tmp_path):
+    path = str(tmp_path / "rqmData.db")
+    writer = connect_for_ingest(path)
+    with writer:
+        insert_detection_rates(writer.cursor(), [
+            ("EBBE", None, 90.0, 80.0, 70.0, 60.0, 50.0, "2023-10-01")])
+        bump_data_version(writer)
+
+    report_jobs = jobs.ReportJobs(path, str(tmp_path / "reports"), DataVersion(path))
+    try:
+        key = report_jobs.submit("2023-10-01", "2023-10-31")
+        assert wait_for(report_jobs, key) == {'state': jobs.DONE, 'progress': 1.0,
+                                              'error': None}
+        with open(report_jobs.pdf_path(key), "rb") as pdf:
+            assert pdf.read(5) == b"%PDF-"
+
+        # Served from disk without a new job
+        assert report_jobs.submit("2023-10-01", "2023-10-31") == key
+        assert list(report_jobs._futures) == [key]
+
+        with writer:
+            bump_data_version(writer)
+        assert report_jobs.submit("2023-10-01", "2023-10-31") != key
+    finally:
+        report_jobs.shutdown()
+        writer.close()
+
+
+def test_report_key_rejects_other_strings():
+    assert jobs.report_key("2023-10-01", "2023-10-31", 3) == \
+        "report_2023-10-01_2023-10-31_v3"
+    with pytest.raises(ValueError):
+        jobs.report_key("../../etc", "2023-10-31", 3)
@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.cache import QueryCache  # noqa: E402
+from app.live import new_points  # noqa: E402
+from app.storage import (  # noqa: E402
+    connect_for_ingest, insert_biases, insert_detection_rates)
+
+
+def bias(radar, antenna_type, range_bias, job_date):
+    return (radar, antenna_type, 0.1, range_bias, 0.0, 0.3, 1.0, 0.1, 0.0, 0.0,
+            job_date)
+
+
+def test_new_points_are_the_rows_after_a_date(tmp_path):
+    path = str(tmp_path / "rqmData.db")
+    connection = connect_for_ingest(path)
+    with connection:
+        insert_biases(connection.cursor(), [
+            bias("EBBE", "SSR", 1.0, "2023-10-01"),
+            bias("EBBE", "SSR", 2.0, "2023-10-02"),
+            bias("EBBE", "PSR", 3.0, "2023-10-02"),
+            bias("EBLG", "PSR", 4.0, "2023-10-03"),
+        ])
+        insert_detection_rates(connection.cursor(), [
+            ("EBBE", 1, 95.0, None, 80.0, 70.0, 60.0, "2023-10-01"),
+        ])
+    connection.close()
+
+    points = new_points(QueryCache(path), "2023-10-01")
+
+    assert points["detection_rates"] == {}
+    assert sorted(points["biases"]) == ["EBBE", "EBLG"]
+    ebbe = points["biases"]["EBBE"]
+    # Milliseconds since the epoch, like the x values of the figures
+    assert ebbe["x"] == [1696204800000.0, 1696204800000.0]
+    assert ebbe["y"]["Range_Bias"] == [3.0, 2.0]
+    assert points["biases"]["EBLG"]["y"]["Range_Bias"] == [4.0]
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from app.cache import QueryCache  # noqa: E402
+from app.metadata import Metadata  # noqa: E402
+from app.storage import (  # noqa: E402
+    bump_data_version, connect_for_ingest, insert_biases)
+
+
+def test_metadata_follows_new_data(tmp_path):
+    path = str(tmp_path / "rqmData.db")
+    writer = connect_for_ingest(path)
+    metadata = Metadata(QueryCache(path))
+
+    assert metadata.radars() == []
+    assert metadata.date_bounds() == (None, None)
+    assert metadata.stats() == []
+
+    with writer:
+        insert_biases(writer.cursor(), [
+            ("EBLG", "PSR", 1, 2, 3, 4, 5, 6, 7, 8, "2023-10-02"),
+            ("EBBE", "PSR", 1, 2, 3, 4, 5, 6, 7, 8, "2023-10-01"),
+            ("EBLG", "SSR", 1, 2, 3, 4, 5, 6, 7, 8, "2023-10-03"),
+        ])
+        bump_data_version(writer)
+
+    assert metadata.radars() == ["EBBE", "EBLG"]
+    assert metadata.radars("detection_rates") == []
+    assert metadata.date_bounds() == ("2023-10-01", "2023-10-03")
+    assert [stat for stat, _ in metadata.stats()] == [
+        "Range_Bias", "Azimuth_Bias", "Time_Bias"]
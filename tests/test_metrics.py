@@ -0,0 +1,44 @@
+import flask
+
+from app.cache import QueryCache
+from app.metrics import (CALLBACK_PATH, instrument_callbacks, profiled,
+                         query_label, render_metrics)
+from app.storage import connect_for_ingest
+
+
+def test_query_label_collapses_whitespace():
+    assert query_label("SELECT *\n    FROM biases\n") == "SELECT * FROM biases"
+    assert len(query_label("SELECT " + "x, " * 100 + "y")) == 120
+
+
+def test_queries_and_callbacks_are_exported(tmp_path):
+    path = str(tmp_path / "rqmData.db")
+    connect_for_ingest(path).close()
+    QueryCache(path).query("SELECT COUNT(*) FROM biases WHERE 'metrics' = 'metrics'")
+
+    server = flask.Flask(__name__)
+    instrument_callbacks(server)
+
+    @server.route(CALLBACK_PATH, methods=["POST"])
+    def callback():
+        return flask.jsonify(response={"value": "x" * 2000})
+
+    server.test_client().post(CALLBACK_PATH, json={"output": "metrics-graph.figure"})
+
+    body = render_metrics()[0].decode()
+    assert ('radar_sql_seconds_count{phase="fetch",query="SELECT COUNT(*) FROM '
+            "biases WHERE 'metrics' = 'metrics'\"} 1.0") in body
+    assert 'radar_callback_seconds_count{callback="metrics-graph.figure"} 1.0' in body
+    assert ('radar_callback_response_bytes_bucket{callback="metrics-graph.figure",'
+            'le="1000.0"} 0.0') in body
+
+
+def test_profiled_dumps_stats_only_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.delenv("RADAR_PROFILE_DIR", raising=False)
+    with profiled("test"):
+        pass
+    monkeypatch.setenv("RADAR_PROFILE_DIR", str(tmp_path / "profiles"))
+    with profiled("test"):
+        sum(range(1000))
+    assert [name.split(".")[0] for name in
+            (entry.name for entry in (tmp_path / "profiles").iterdir())] == ["test"]
@@ -0,0 +1,36 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+from app.pivot import pivot_rows, stat_query, stat_table  # noqa: E402
+
+
+def test_pivot_rows_aligns_radars_and_dates():
+    rows = [
+        ("EBLG", 2.0, "2023-10-02"),
+        ("EBBE", 1.0, "2023-10-01"),
+        ("EBBE", None, "2023-10-03"),
+        ("EBLG", 5.0, "2023-10-01"),
+        ("EBLG", 6.0, "2023-10-01"),
+    ]
+    radars, dates, grid = pivot_rows(rows)
+
+    assert list(radars) == ["EBBE", "EBLG"]
+    assert list(dates) == ["2023-10-01", "2023-10-02", "2023-10-03"]
+    np.testing.assert_array_equal(
+        grid, [[1.0, np.nan, np.nan], [6.0, 2.0, np.nan]])
+
+
+def test_pivot_rows_empty():
+    radars, dates, grid = pivot_rows([])
+    assert len(radars) == len(dates) == grid.size == 0
+
+
+def test_stat_query_only_accepts_known_statistics():
+    assert stat_table("Range_Bias") == "biases"
+    assert stat_query("pdP") == (
+        "SELECT ds_name, pdP, Job_Date FROM detection_rates "
+        "WHERE Job_Date BETWEEN ? AND ?")
+    with pytest.raises(ValueError):
+        stat_query("pdP; DROP TABLE biases")
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+pytest.importorskip("reportlab")
+
+from app import jobs, report  # noqa: E402
+
+
+@pytest.fixture
+def rate_rows():
+    return [
+        ("EBBE", None, 90.0, 80.0, None, 70.0, 60.0, "2023-10-01"),
+        ("EBBE", None, 92.0, 80.0, None, 70.0, 60.0, "2023-10-03"),
+        ("EBBE", None, 94.0, 80.0, 50.0, 70.0, 60.0, "2023-10-05"),
+        ("EBLG", None, 99.0, 99.0, 99.0, 99.0, 99.0, "2023-11-01"),
+    ]
+
+
+def test_radar_summaries_skip_missing_rates(database):
+    _, connection = database
+    summaries = list(report.radar_summaries(connection, "2023-10-01", "2023-10-31"))
+
+    assert [summary[:4] for summary in summaries] == [
+        ("EBBE", 3, "2023-10-01", "2023-10-05")]
+    stats = {stat[0]: stat[1:] for stat in summaries[0][4]}
+    assert stats["pdP"] == pytest.approx((92.0, 90.0, 94.0, 1.0))
+    assert stats["pdS"] == pytest.approx((80.0, 80.0, 80.0, 0.0))
+    # A single point has no trend
+    assert stats["pdM"] == (50.0, 50.0, 50.0, None)
+
+
+def test_run_report_streams_page_sized_tables(database, monkeypatch, tmp_path):
+    path, _ = database
+    monkeypatch.setattr(report, "ROWS_PER_BLOCK", 3)
+    monkeypatch.setattr(report, "MAX_DETAIL_ROWS", 4)
+    pdf_path = str(tmp_path / "report.pdf")
+    progress_path = str(tmp_path / "report.progress")
+
+    jobs.run_report(path, "2023-01-01", "2023-12-31", pdf_path, progress_path)
+
+    with open(pdf_path, "rb") as pdf:
+        assert pdf.read(5) == b"%PDF-"
+    # Neither the partial PDF nor the progress file is left behind
+    assert not os.path.exists(pdf_path + ".tmp")
+    assert not os.path.exists(progress_path)
+
+
+def test_flowable_stream_pulls_lazily():
+    pulled = []
+
+    def flowables():
+        for i in range(3):
+            pulled.append(i)
+            yield i
+
+    stream = report.FlowableStream(flowables())
+    assert pulled == []
+    assert len(stream) == 1 and stream[0] == 0
+    del stream[0]
+    assert len(stream) == 1 and pulled == [0, 1]
@@ -0,0 +1,93 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from app.cache import QueryCache  # noqa: E402
+from app.rollups import (  # noqa: E402
+    MONTH, RAW, WEEK, choose_resolution, radar_series, stat_rows)
+from app.storage import (  # noqa: E402
+    insert_detection_rates, period_bounds, refresh_rollups)
+
+
+def rates(radar, ds_type, pdP, job_date):
+    return (radar, ds_type, pdP, 80.0, None, 70.0, 60.0, job_date)
+
+
+@pytest.fixture
+def rate_rows():
+    return [
+        rates("EBBE", 1, 90.0, "2023-10-02"),
+        rates("EBBE", 2, 94.0, "2023-10-02"),
+        rates("EBBE", 1, 92.0, "2023-10-08"),
+        rates("EBBE", 1, 50.0, "2023-10-09"),
+        rates("EBLG", 1, 99.0, "2023-11-01"),
+    ]
+
+
+def rollup(connection, resolution, radar, stat):
+    return connection.execute(
+        "SELECT period, antenna_type, count, total, minimum, maximum "
+        "FROM rollups WHERE source = 'detection_rates' AND resolution = ? "
+        "AND radar = ? AND stat = ? ORDER BY period, antenna_type",
+        (resolution, radar, stat)).fetchall()
+
+
+def test_period_bounds():
+    assert period_bounds("2023-10-08", "week") == ("2023-10-02", "2023-10-08")
+    assert period_bounds("2024-02-10", "month") == ("2024-02-01", "2024-02-29")
+    with pytest.raises(ValueError):
+        period_bounds("2024-02-10", "year")
+
+
+def test_refresh_rollups_aggregates_weeks_and_months(database):
+    _, connection = database
+
+    assert rollup(connection, "week", "EBBE", "pdP") == [
+        ("2023-10-02", "1", 2, 182.0, 90.0, 92.0),
+        ("2023-10-02", "2", 1, 94.0, 94.0, 94.0),
+        ("2023-10-09", "1", 1, 50.0, 50.0, 50.0),
+    ]
+    assert rollup(connection, "month", "EBBE", "pdP") == [
+        ("2023-10-01", "1", 3, 232.0, 50.0, 92.0),
+        ("2023-10-01", "2", 1, 94.0, 94.0, 94.0),
+    ]
+    # Missing rates (-1) are left out
+    assert rollup(connection, "month", "EBBE", "pdM") == []
+
+
+def test_refresh_rollups_follows_replaced_rows(database):
+    _, connection = database
+    with connection:
+        # Upserted over the stored row
+        insert_detection_rates(connection.cursor(),
+                               [rates("EBBE", 1, 70.0, "2023-10-09")])
+        refresh_rollups(connection, "2023-10-09", "2023-10-09")
+
+    assert rollup(connection, "week", "EBBE", "pdP")[-1] == (
+        "2023-10-09", "1", 1, 70.0, 70.0, 70.0)
+    assert rollup(connection, "month", "EBBE", "pdP")[0] == (
+        "2023-10-01", "1", 3, 252.0, 70.0, 92.0)
+
+
+def test_choose_resolution():
+    assert choose_resolution(("2023-01-01", "2023-12-31")) == RAW
+    assert choose_resolution(("2020-01-01", "2023-12-31")) == WEEK
+    assert choose_resolution(("2010-01-01", "2023-12-31")) == MONTH
+    # Clipped to the data
+    assert choose_resolution(("0000-01-01", "9999-12-31"),
+                             ("2023-01-01", "2023-06-30")) == RAW
+    assert choose_resolution(("0000-01-01", "9999-12-31")) == RAW
+
+
+def test_rollup_reads_average_antenna_types(database):
+    path, _ = database
+    cache = QueryCache(path)
+
+    dates, series = radar_series(cache, "detection_rates", "EBBE",
+                                 ("2023-10-05", "2023-10-31"), WEEK)
+    assert dates == ["2023-10-02", "2023-10-09"]
+    assert [stat for stat, _ in series] == ["pdP", "pdS", "pdPS", "pdPM"]
+    assert list(series[0][1]) == [92.0, 50.0]
+
+    assert sorted(stat_rows(cache, "pdP", ("2023-01-01", "2023-12-31"), MONTH)) == [
+        ("EBBE", 81.5, "2023-10-01"), ("EBLG", 99.0, "2023-11-01")]
@@ -0,0 +1,90 @@
+import sqlite3
+from decimal import Decimal
+
+from app.storage import (SCHEMA_VERSION, connect_for_ingest, create_schema,
+                         insert_biases, insert_detection_rates, load_ledger,
+                         migrate, schema_version, with_job_date)
+
+
+def test_create_schema_is_idempotent():
+    connection = sqlite3.connect(":memory:")
+    create_schema(connection)
+    create_schema(connection)
+    assert load_ledger(connection) == {}
+
+
+def test_insert_detection_rates_normalizes_missing_values():
+    connection = connect_for_ingest(":memory:")
+    rows = [("EBBE", 1, Decimal("95.5"), None, 80.0, None, 60.0)]
+    with connection:
+        insert_detection_rates(connection.cursor(),
+                               with_job_date(rows, "2023-10-01"))
+
+    stored = connection.execute("SELECT * FROM detection_rates").fetchall()
+    assert stored == [("EBBE", 1, 95.5, -1, 80.0, -1, 60.0, "2023-10-01")]
+
+
+def test_migrate_rewrites_job_dates_and_adds_indexes():
+    connection = sqlite3.connect(":memory:")
+    connection.execute(
+        "CREATE TABLE detection_rates (ds_name TEXT, pdP REAL, pdS REAL, "
+        "pdM REAL, pdPS REAL, pdPM REAL, Job_Date DATE)")
+    connection.executemany(
+        "INSERT INTO detection_rates (ds_name, Job_Date) VALUES (?, ?)",
+        [("EBBE", "02/10/2023"), ("EBBE", "2023-09-30 22:21:28.916824"),
+         ("EBBE", "2023-10-01")])
+
+    assert migrate(connection) == list(range(1, SCHEMA_VERSION + 1))
+    assert migrate(connection) == []
+    assert schema_version(connection) == SCHEMA_VERSION
+
+    dates = connection.execute(
+        "SELECT Job_Date FROM detection_rates WHERE ds_name = 'EBBE' "
+        "ORDER BY Job_Date").fetchall()
+    assert dates == [("2023-09-30",), ("2023-10-01",), ("2023-10-02",)]
+    # Tables written by the first generateFakeData.py had no antenna type
+    columns = [row[1] for row in
+               connection.execute("PRAGMA table_info(detection_rates)")]
+    assert "ds_type" in columns
+    plan = connection.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM detection_rates "
+        "WHERE ds_name = 'EBBE' ORDER BY Job_Date").fetchall()
+    assert "idx_detection_rates_radar_date" in plan[0][-1]
+
+
+def test_migrate_removes_duplicates_and_keys_rows():
+    connection = sqlite3.connect(":memory:")
+    connection.execute(
+        "CREATE TABLE detection_rates (ds_name TEXT, ds_type INT, pdP REAL, "
+        "pdS REAL, pdM REAL, pdPS REAL, pdPM REAL, Job_Date TEXT)")
+    connection.executemany(
+        "INSERT INTO detection_rates (ds_name, pdP, Job_Date) VALUES (?, ?, ?)",
+        [("EBBE", 90.0, "2023-10-01"), ("EBBE", 91.0, "2023-10-01"),
+         ("EBLG", 80.0, "2023-10-01")])
+    migrate(connection)
+
+    # The last written row wins
+    assert connection.execute(
+        "SELECT ds_name, pdP FROM detection_rates ORDER BY ds_name").fetchall() == [
+            ("EBBE", 91.0), ("EBLG", 80.0)]
+    assert connection.execute(
+        "SELECT count FROM rollups WHERE radar = 'EBBE' AND stat = 'pdP' "
+        "AND resolution = 'week'").fetchone() == (1,)
+
+
+def test_inserts_upsert_and_skip_unchanged_rows():
+    connection = connect_for_ingest(":memory:")
+    row = ("EBBE", "PSR", 0.1, 2.0, 0.0, 0.3, 1.0, 0.1, 0.0, 0.0, "2023-10-01")
+    with connection:
+        insert_biases(connection, [row, row[:1] + (None,) + row[2:]])
+
+    changes = connection.total_changes
+    with connection:
+        insert_biases(connection, [row, row[:1] + (None,) + row[2:]])
+    assert connection.total_changes == changes
+
+    with connection:
+        insert_biases(connection, [row[:2] + (0.5,) + row[3:]])
+    assert connection.execute(
+        "SELECT Antenna_Type, Time_Bias FROM biases ORDER BY Antenna_Type").fetchall() == [
+            (None, 0.1), ("PSR", 0.5)]
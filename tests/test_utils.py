@@ -1,4 +1,4 @@
-from app.utils import validate_date
+from app.utils import job_date_from_name, to_iso_date, validate_date
 
 
 def test_validate_date():
@@ -7,3 +7,15 @@ def test_validate_date():
     assert validate_date("01/13/2023") == False
     assert validate_date("01/10/3000") == False
     assert validate_date("random_string") == False
+
+
+def test_job_date_from_name():
+    assert job_date_from_name("job_verifsassuser_20231001") == "01/10/2023"
+    assert job_date_from_name("job_verifsassuser_01_10_2023") == "01/10/2023"
+    assert job_date_from_name("job_verifsassuser_2023-10-01_run2") == "01/10/2023"
+    assert job_date_from_name("job_verifsassuser_20231301") is None
+    assert job_date_from_name("job_verifsassuser_123") is None
+
+
+def test_to_iso_date():
+    assert to_iso_date("01/10/2023") == "2023-10-01"
@@ -0,0 +1,9 @@
+"""
+Production entry point of the dashboard, for preforking WSGI servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+See gunicorn.conf.py for the workers, threads and shared cache settings.
+"""
+
+from run_dash import server, warm_up  # noqa: F401